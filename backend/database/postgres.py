@@ -1,5 +1,7 @@
 import os
+import logging
 from sqlalchemy import create_engine
+from shared_instrumentation import QueryInstrumentation
 from sqlalchemy.orm import sessionmaker
 from shared_models.base import Base
 from shared_models import User, Price, Favourite, Flat, Filter
@@ -17,6 +19,14 @@ def _get_db_url():
 engine = create_engine(_get_db_url(), pool_pre_ping=True, echo=False, pool_use_lifo=True,
                        pool_size=10, max_overflow=20)
 
+query_stats = QueryInstrumentation(
+    logging.getLogger("backend.database"),
+    slow_query_ms=float(os.getenv("DB_SLOW_QUERY_MS", 500)),
+    explain_slow_queries=os.getenv(
+        "DB_EXPLAIN_SLOW_QUERIES", "false").lower() == "true",
+)
+query_stats.instrument(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Function to create all tables from Base's metadata
@@ -20,7 +20,8 @@ CREATE TABLE IF NOT EXISTS flats(
     series TEXT NOT NULL, -- series of the building
     location GEOMETRY(POINT, 4326), -- GEOMETRY is a type for geospatial data to store coordinates
     image_data BYTEA DEFAULT ''::bytea, -- BYTEA is a type for binary data
-    created_at TIMESTAMPTZ DEFAULT NOW() -- also can use CURRENT_TIMESTAMP for default value
+    created_at TIMESTAMPTZ DEFAULT NOW(), -- also can use CURRENT_TIMESTAMP for default value
+    last_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW() -- the last scrape that listed the flat
 );
 
 -- create a table to store price updates
@@ -88,6 +89,7 @@ CREATE INDEX idx_fav_flat_id ON favourites(flat_id);
 CREATE INDEX idx_fav_tg_user_id ON favourites(tg_user_id);
 CREATE INDEX idx_user_tg_user_id ON users(tg_user_id);
 create INDEX idx_flat_location ON flats USING GIST (location);
+CREATE INDEX idx_flat_last_seen_at ON flats(last_seen_at);
 CREATE INDEX idx_city_district ON filters (city, deal_type, district);
 CREATE INDEX idx_trends_type_end_time_start_time ON price_trends(type, start_time, end_time);
 
@@ -110,4 +112,93 @@ ALTER TABLE filters ADD CONSTRAINT check_room_range CHECK (lower(room_range) <=
 ALTER TABLE filters ADD CONSTRAINT check_price_range CHECK (lower(price_range) <= upper(price_range));
 ALTER TABLE filters ADD CONSTRAINT check_area_range CHECK (lower(area_range) <= upper(area_range));
 ALTER TABLE filters ADD CONSTRAINT check_floor_range CHECK (lower(floor_range) <= upper(floor_range));
-ALTER TABLE filters ADD CONSTRAINT uq_city_district UNIQUE (city, deal_type, district);
\ No newline at end of file
+ALTER TABLE filters ADD CONSTRAINT uq_city_district UNIQUE (city, deal_type, district);
+-- archive tables filled by the retention job, images are not archived
+CREATE TABLE IF NOT EXISTS flats_archive(
+    flat_id VARCHAR(255) PRIMARY KEY,
+    source VARCHAR(30) NOT NULL,
+    deal_type VARCHAR(30) NOT NULL,
+    url TEXT NOT NULL,
+    district VARCHAR(100) NOT NULL,
+    city VARCHAR(50),
+    street VARCHAR(150) NOT NULL,
+    rooms SMALLINT NOT NULL,
+    floors_total SMALLINT NOT NULL,
+    floor SMALLINT NOT NULL,
+    area DECIMAL(5, 2) NOT NULL,
+    series TEXT NOT NULL,
+    location GEOMETRY(POINT, 4326),
+    created_at TIMESTAMPTZ,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS prices_archive(
+    id INT PRIMARY KEY, -- id from the prices table
+    flat_id VARCHAR(255) NOT NULL,
+    price INT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX idx_flat_archive_source_deal_type ON flats_archive(source, deal_type);
+CREATE INDEX idx_price_archive_flat_id ON prices_archive(flat_id);
+
+-- one row per scheduled scrape run
+CREATE TABLE IF NOT EXISTS scrape_runs(
+    id SERIAL PRIMARY KEY,
+    job VARCHAR(50) NOT NULL,
+    source VARCHAR(30) NOT NULL,
+    deal_type VARCHAR(30) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ,
+    listings INT NOT NULL DEFAULT 0,
+    new_flats INT NOT NULL DEFAULT 0,
+    updated_flats INT NOT NULL DEFAULT 0,
+    skipped INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    notifications INT NOT NULL DEFAULT 0,
+    requests INT NOT NULL DEFAULT 0,
+    stage_seconds JSONB,
+    overlapped BOOLEAN NOT NULL DEFAULT FALSE,
+    overran_slot BOOLEAN NOT NULL DEFAULT FALSE,
+    error TEXT
+);
+
+CREATE INDEX idx_scrape_run_job_started_at ON scrape_runs(job, started_at);
+
+CREATE TABLE IF NOT EXISTS crawl_units(
+    id SERIAL PRIMARY KEY,
+    job VARCHAR(50) NOT NULL,
+    source VARCHAR(30) NOT NULL,
+    deal_type VARCHAR(30) NOT NULL,
+    unit JSONB NOT NULL,
+    run_id INT,
+    status VARCHAR(20) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    lease_owner VARCHAR(100),
+    lease_expires_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    error TEXT
+);
+
+CREATE INDEX idx_crawl_unit_job_status ON crawl_units(job, status);
+
+CREATE TABLE IF NOT EXISTS scheduler_leader(
+    name VARCHAR(50) PRIMARY KEY,
+    holder VARCHAR(100) NOT NULL,
+    token BIGINT NOT NULL,
+    lease_expires_at TIMESTAMPTZ NOT NULL,
+    elected_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS scrape_checkpoints(
+    job VARCHAR(50) NOT NULL,
+    unit TEXT NOT NULL,
+    page INT NOT NULL,
+    last_listing_id VARCHAR(255),
+    done BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (job, unit)
+);
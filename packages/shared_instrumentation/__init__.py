@@ -0,0 +1,4 @@
+from .query_stats import QueryInstrumentation, StatementStats, fingerprint, redact
+
+
+__all__ = ["QueryInstrumentation", "StatementStats", "fingerprint", "redact"]
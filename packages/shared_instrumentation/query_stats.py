@@ -0,0 +1,164 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency histogram bucket upper bounds in milliseconds, the last bucket is +Inf
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so that queries differing only in literals and parameters share a fingerprint."""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def redact(parameters: Any) -> Any:
+    """Replace parameter values with their type names, so slow query logs never contain user data."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@dataclass
+class StatementStats:
+    fingerprint: str
+    calls: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    buckets: List[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    explain: Optional[str] = None
+    explained_at: float = 0.0
+
+    def observe(self, elapsed_ms: float, rows: int) -> None:
+        self.calls += 1
+        self.rows += max(rows, 0)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+
+class QueryInstrumentation:
+    """
+    Collects per statement fingerprint latency histograms, row and call counts through
+    the SQLAlchemy cursor execute events and logs queries slower than a threshold.
+
+    The per query overhead is two clock reads and a couple of dict lookups, fingerprints
+    are cached per statement string. `EXPLAIN ANALYZE` sampling is off by default, is only
+    done for SELECT statements and at most once per fingerprint per `explain_interval` seconds.
+    """
+
+    def __init__(self, logger: logging.Logger, slow_query_ms: float = 500, explain_slow_queries: bool = False,
+                 explain_interval: float = 600, max_fingerprints: int = 1000):
+        self.logger = logger
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow_queries = explain_slow_queries
+        self.explain_interval = explain_interval
+        self.max_fingerprints = max_fingerprints
+        self.stats: dict[str, StatementStats] = {}
+        self._fingerprints: OrderedDict[str, str] = OrderedDict()
+        # the backend runs sync sessions in a thread pool
+        self._lock = threading.Lock()
+
+    def instrument(self, engine: Any) -> None:
+        """Attach to an Engine or AsyncEngine."""
+        sync_engine: Engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "before_cursor_execute",
+                     self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute",
+                     self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # kept on the statement's execution context, a failed statement leaves nothing behind on the connection
+        if context is not None:
+            context.query_start_time = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "query_start_time", None)
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            statement_stats = self._get_stats(statement)
+            if statement_stats is None:
+                return
+            statement_stats.observe(elapsed_ms, cursor.rowcount)
+
+        if elapsed_ms < self.slow_query_ms:
+            return
+
+        self.logger.warning(
+            f"Slow query ({elapsed_ms:.1f} ms): {statement_stats.fingerprint} - params {redact(parameters)}")
+
+        if self.explain_slow_queries and not executemany and self._should_explain(statement, statement_stats):
+            self._explain(conn, statement, parameters, statement_stats)
+
+    def _get_stats(self, statement: str) -> StatementStats | None:
+        key = self._fingerprints.get(statement)
+        if key is None:
+            key = fingerprint(statement)
+            self._fingerprints[statement] = key
+            if len(self._fingerprints) > self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+
+        statement_stats = self.stats.get(key)
+        if statement_stats is None:
+            # bound memory in case something generates unbounded statement shapes
+            if len(self.stats) >= self.max_fingerprints:
+                return None
+            statement_stats = self.stats[key] = StatementStats(key)
+        return statement_stats
+
+    def _should_explain(self, statement: str, statement_stats: StatementStats) -> bool:
+        # EXPLAIN ANALYZE executes the statement, never do it for writes
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return False
+        return time.monotonic() - statement_stats.explained_at >= self.explain_interval
+
+    def _explain(self, conn, statement: str, parameters: Any, statement_stats: StatementStats) -> None:
+        statement_stats.explained_at = time.monotonic()
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            cursor.close()
+        except Exception as e:
+            self.logger.error(
+                f"Failed to explain query {statement_stats.fingerprint}: {e}")
+            return
+        statement_stats.explain = plan
+        self.logger.warning(
+            f"Query plan for {statement_stats.fingerprint}:\n{plan}")
+
+    def snapshot(self) -> List[StatementStats]:
+        """Get the collected statistics sorted by total time spent."""
+        with self._lock:
+            return sorted(self.stats.values(), key=lambda x: x.total_ms, reverse=True)
+
+    def log_summary(self, top: int = 10) -> None:
+        for statement_stats in self.snapshot()[:top]:
+            self.logger.info(
+                f"{statement_stats.calls} calls, {statement_stats.total_ms:.1f} ms total, "
+                f"{statement_stats.total_ms / statement_stats.calls:.2f} ms avg, {statement_stats.max_ms:.1f} ms max, "
+                f"{statement_stats.rows} rows: {statement_stats.fingerprint[:200]}")
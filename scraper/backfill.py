@@ -0,0 +1,82 @@
+"""
+Backfill the flats of a source: walk all of its active listings regardless of their date.
+
+Usage:
+    python -m scraper.backfill --source pp --deal-type sell [--requests-per-second 0.5] [--restart]
+
+A new deployment or city starts with an empty history, a backfill loads what the source still lists so
+price changes and analytics do not start cold. Requests are throttled to `[backfill] requests_per_second`
+of the config, flats are written with the bulk loader and nobody is notified. PP listings bring their
+price history along. An interrupted backfill resumes from its checkpoints, `--restart` starts it over.
+"""
+import argparse
+import asyncio
+from dataclasses import replace
+from pathlib import Path
+
+from scraper.database.cache import known_flat_cache
+from scraper.database.checkpoints import scrape_checkpoints
+from scraper.database.postgres import postgres_instance
+from scraper.main import FlatsParser
+from scraper.parsers.base import BaseParser
+from scraper.parsers.city_24 import City24Parser
+from scraper.parsers.pp import PardosanasPortalsParser
+from scraper.parsers.ss import SludinajumuServissParser
+from scraper.parsers.varianti import VariantiParser
+from scraper.schemas.shared import DealType
+from scraper.utils.config import Config
+from scraper.utils.executor import parse_executor
+from scraper.utils.logger import logger
+
+DEAL_TYPES = {"sell": DealType.SELL, "rent": DealType.RENT}
+
+
+def create_parser(config: Config, source: str, deal_type: DealType) -> BaseParser:
+    # nothing is sent to telegram, the parsers get no bot
+    if source == "ss":
+        return SludinajumuServissParser(None, config.parsers.ss, deal_type, config.pipeline)
+    if source == "city24":
+        return City24Parser(None, config.parsers.city24, deal_type, config.pipeline)
+    if source == "pp":
+        return PardosanasPortalsParser(None, config.parsers.pp, deal_type, config.pipeline)
+    return VariantiParser(None, config.parsers.varianti, deal_type, config.pipeline)
+
+
+async def backfill(config: Config, source: str, deal_type: DealType, restart: bool) -> None:
+    parse_executor.configure(config.executor)
+    await postgres_instance.init_db()
+    known_flat_cache.configure(config.cache)
+    scrape_checkpoints.configure(config.checkpoints)
+    # flats that are stored with the same price are dropped before the bulk load
+    await known_flat_cache.warm()
+
+    parser = create_parser(config, source, deal_type)
+    logger.info(f"Backfilling {parser.job_name} at {config.backfill.requests_per_second} requests/s")
+    try:
+        stats = await parser.run_backfill(config.backfill, restart)
+    finally:
+        parse_executor.shutdown()
+
+    logger.info(parser.pipeline.summary())
+    logger.info(
+        f"Backfilled {parser.job_name} with {parser.counts.requests} requests: {stats.flats} flats "
+        f"({stats.flats_merged} written) and {stats.prices} prices ({stats.prices_merged} written)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load all active listings of a source, throttled and without notifications")
+    parser.add_argument("--source", required=True, choices=["ss", "city24", "pp", "varianti"])
+    parser.add_argument("--deal-type", required=True, choices=list(DEAL_TYPES))
+    parser.add_argument("--requests-per-second", type=float,
+                        help="overrides [backfill] requests_per_second of the config")
+    parser.add_argument("--restart", action="store_true",
+                        help="start over instead of resuming an interrupted backfill")
+    parser.add_argument("--config", type=Path, default=Path("/app/config.toml"))
+    args = parser.parse_args()
+
+    config = FlatsParser.load_config(args.config)
+    if args.requests_per_second:
+        config = replace(config, backfill=replace(config.backfill, requests_per_second=args.requests_per_second))
+
+    asyncio.run(backfill(config, args.source, DEAL_TYPES[args.deal_type], args.restart))
@@ -0,0 +1,136 @@
+"""
+Compare typed msgspec decoding of the JSON sources with `json.loads` into plain dicts.
+
+Usage:
+    python -m scraper.benchmarks.decode --fixtures path/to/responses [--iterations 50]
+
+The fixtures directory has one sub directory per source, `city24`, `pp` and `varianti`, holding saved
+response bodies (`*.json`) of the list endpoints. Both paths decode the body and read the fields the
+flat classes use, so the dict path pays for its lookups the same way the parsers did.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from scraper.parsers.flat.pp import PP_FILTER_MAP
+from scraper.schemas.city_24 import decode_flats
+from scraper.schemas.pp import decode_lots
+from scraper.schemas.varianti import decode_response
+
+
+def city24_dicts(data: bytes) -> List[Any]:
+    fields = []
+    for flat in json.loads(data):
+        attributes = flat["attributes"]
+        fields.append((flat["friendly_id"], flat["price"], flat["property_size"], flat["room_count"],
+                       attributes.get("FLOOR"), attributes.get("TOTAL_FLOORS"), attributes.get("HOUSE_TYPE"),
+                       flat["address"]["street_name"], flat["latitude"], flat["longitude"]))
+    return fields
+
+
+def city24_structs(data: bytes) -> List[Any]:
+    fields = []
+    for flat in decode_flats(data):
+        attributes = flat.attributes
+        fields.append((flat.friendly_id, flat.price, flat.property_size, flat.room_count,
+                       attributes.FLOOR, attributes.TOTAL_FLOORS, attributes.HOUSE_TYPE,
+                       flat.address.street_name, flat.latitude, flat.longitude))
+    return fields
+
+
+def pp_dicts(data: bytes) -> List[Any]:
+    fields = []
+    for flat in json.loads(data)["content"]["data"]:
+        # one scan of the filter values per attribute, as the flat class used to do
+        attributes = [next((attr["textValue"] for attr in flat["adFilterValues"]
+                            if attr["filter"]["id"] == value["id"]), value["default"])
+                      for value in PP_FILTER_MAP.values()]
+        prices = [(price["priceType"]["id"], price["value"])
+                  for price in flat["prices"]]
+        fields.append((flat["frontUrl"], flat["publishDate"],
+                      flat["publicLocation"]["address"], attributes, prices))
+    return fields
+
+
+def pp_structs(data: bytes) -> List[Any]:
+    fields = []
+    for flat in decode_lots(data).content.data:
+        index = {attr.filter.id: attr for attr in flat.ad_filter_values}
+        attributes = [index[value["id"]].text_value if value["id"] in index else value["default"]
+                      for value in PP_FILTER_MAP.values()]
+        prices = [(price.price_type.id, price.value) for price in flat.prices]
+        fields.append((flat.front_url, flat.publish_date,
+                      flat.public_location.address, attributes, prices))
+    return fields
+
+
+def varianti_dicts(data: bytes) -> List[Any]:
+    result = json.loads(data)["result"]
+    return [(flat["id"], flat["address_name"], flat["object"].get("price"), flat["object"].get("area"),
+             flat["object"].get("date_update"), flat["latitude"], flat["longitude"])
+            for flat in result["list"] or []]
+
+
+def varianti_structs(data: bytes) -> List[Any]:
+    result = decode_response(data).result
+    if result is None or result.list is None:
+        return []
+    return [(flat.id, flat.address_name, flat.object.price, flat.object.area,
+             flat.object.date_update, flat.latitude, flat.longitude)
+            for flat in result.list]
+
+
+SOURCES: Dict[str, tuple[Callable[[bytes], List[Any]], Callable[[bytes], List[Any]]]] = {
+    "city24": (city24_dicts, city24_structs),
+    "pp": (pp_dicts, pp_structs),
+    "varianti": (varianti_dicts, varianti_structs),
+}
+
+
+def measure(decode: Callable[[bytes], List[Any]], bodies: List[bytes], iterations: int) -> tuple[float, float, int]:
+    """Returns responses per second, listings per second and the peak traced memory of a single response."""
+    listings = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for body in bodies:
+            listings += len(decode(body))
+    elapsed = time.perf_counter() - start
+
+    peak = 0
+    for body in bodies:
+        tracemalloc.start()
+        decode(body)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return (len(bodies) * iterations) / elapsed, listings / elapsed, peak
+
+
+def main(fixtures: Path, iterations: int) -> None:
+    for source, (dicts, structs) in SOURCES.items():
+        bodies = [file.read_bytes()
+                  for file in sorted((fixtures / source).glob("*.json"))]
+        if not bodies:
+            print(f"{source}: no fixtures, skipping")
+            continue
+
+        print(f"{source}: {len(bodies)} responses")
+        for name, decode in (("json dicts", dicts), ("msgspec", structs)):
+            responses_per_second, listings_per_second, peak = measure(
+                decode, bodies, iterations)
+            print(f"{name:>12}: {responses_per_second:8.1f} responses/s, {listings_per_second:10.1f} listings/s, "
+                  f"peak {peak / 1024:8.1f} KiB per response")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark JSON decoding of the City24, PP and Varianti responses")
+    parser.add_argument("--fixtures", type=Path, required=True,
+                        help="directory with city24, pp and varianti sub directories of saved responses")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    main(args.fixtures, args.iterations)
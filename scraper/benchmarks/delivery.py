@@ -0,0 +1,105 @@
+"""
+Delivery throughput and tail latency of the notification path against the fake Telegram Bot API.
+
+Usage:
+    python -m scraper.benchmarks.delivery [--flats 200] [--chats 100] [--subscribers-per-flat 3]
+                                          [--photo-ratio 0.7] [--latency 0.05] [--jitter 0.05]
+
+Flats are queued with `TelegramBot.send_flat_msg_with_limiter` exactly like the notify stage does, for
+a few random chats each, and delivered through the real `RateLimiterQueue` and aiogram `Bot` to a
+`FakeTelegramServer` started in the same process. Latency is measured from queueing the message until
+the server accepts it. Messages rejected with 429 are lost by the rate limiter and reported as such.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from scraper.benchmarks.synthetic import SyntheticMarket, percentiles
+from scraper.benchmarks.telegram_server import FakeTelegramServer, FloodLimits
+from scraper.utils.limiter import RateLimiterQueue
+from scraper.utils.telegram import MessageType, TelegramBot
+
+# a jpeg thumbnail is about this large, the fake server does not decode it
+IMAGE_SIZE = 20 * 1024
+
+
+async def run(args: argparse.Namespace) -> None:
+    queued_at: Dict[str, float] = {}
+    latencies: List[float] = []
+
+    def on_delivery(method: str, params: Dict[str, Any]) -> None:
+        # the favourite button carries the flat id, each (flat, chat) pair is one message
+        markup = json.loads(params.get("reply_markup", "{}"))
+        for row in markup.get("inline_keyboard", []):
+            for button in row:
+                callback_data = button.get("callback_data") or ""
+                if callback_data.startswith("add_to_favorites:"):
+                    key = f"{callback_data.split(':', 1)[1]}:{params.get('chat_id')}"
+                    latencies.append(time.perf_counter() - queued_at[key])
+
+    server = FakeTelegramServer(args.latency, args.jitter, FloodLimits(args.global_limit, args.chat_interval),
+                                on_delivery=on_delivery)
+    os.environ["TELEGRAM_API_URL"] = await server.start(port=args.port)
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:benchmark")
+
+    rate_limiter = RateLimiterQueue(rate=args.rate, per=1, buffer=args.buffer)
+    rate_limiter.start()
+    telegram_bot = TelegramBot(rate_limiter)
+
+    market = SyntheticMarket(args.settings, args.seed)
+    chats = list(range(1, args.chats + 1))
+    start = time.perf_counter()
+    queued = 0
+    for _ in range(args.flats):
+        flat = market.flat()
+        flat.image_data = os.urandom(IMAGE_SIZE) if market.rng.random() < args.photo_ratio else None
+        for chat_id in market.rng.sample(chats, min(args.subscribers_per_flat, len(chats))):
+            queued_at[f"{flat.id}:{chat_id}"] = time.perf_counter()
+            await telegram_bot.send_flat_msg_with_limiter(flat, MessageType.FLATS, tg_user_id=chat_id)
+            queued += 1
+
+    deadline = time.perf_counter() + args.timeout
+    while (len(latencies) + sum(server.stats.rejected.values()) < queued
+           and time.perf_counter() < deadline):
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - start
+
+    stats = server.stats
+    rejected = sum(stats.rejected.values())
+    print(f"Queued {queued} messages for {args.chats} chats, {stats.delivered} delivered and {rejected} "
+          f"rejected with 429 in {elapsed:.1f}s")
+    print(f"  throughput: {stats.delivered / elapsed:.1f} msg/s, limiter budget {args.rate} msg/s "
+          f"+ {args.buffer}s buffer per message")
+    print(f"  latency from queueing: {percentiles(latencies)}")
+    if queued > stats.delivered + rejected:
+        print(f"  {queued - stats.delivered - rejected} messages still queued after {args.timeout}s")
+
+    await telegram_bot.bot.session.close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notification delivery benchmark against a fake bot api")
+    parser.add_argument("--settings", default="/app/settings.json")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--flats", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--subscribers-per-flat", type=int, default=3)
+    parser.add_argument("--photo-ratio", type=float, default=0.7,
+                        help="share of flats sent with a photo")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake api latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random extra fake api latency in seconds")
+    parser.add_argument("--global-limit", type=int, default=30, help="messages per second overall")
+    parser.add_argument("--chat-interval", type=float, default=1.0,
+                        help="seconds between two messages to the same chat")
+    parser.add_argument("--rate", type=int, default=30, help="rate limiter messages per second, as in main")
+    parser.add_argument("--buffer", type=float, default=0.2, help="rate limiter buffer, as in main")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="seconds to wait for the queue to drain")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
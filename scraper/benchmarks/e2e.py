@@ -0,0 +1,203 @@
+"""
+End-to-end scrape benchmark on recorded traffic.
+
+Usage:
+    python -m scraper.benchmarks.e2e record --archive path/to/archive [--sources ss,city24,pp,varianti]
+    python -m scraper.benchmarks.e2e replay --archive path/to/archive [--sources ...] [--runs 2]
+                                            [--subscribers 10] [--trace-memory]
+
+`record` scrapes the live sites once and stores every response, images included, in the archive.
+`replay` runs the same parsers through their full pipeline on the archive, against the database from the
+POSTGRES_* environment variables and a fake telegram bot, and reports throughput, per stage latency and
+peak memory. Date cut-offs are evaluated at the time of the recording.
+
+Both modes delete the stored flats of the selected sources first, so only point them at a local database.
+The first replay run stores every flat, the following runs measure the unchanged listings path.
+"""
+import argparse
+import asyncio
+import resource
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Type
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import Range
+
+import scraper.utils.meta as meta
+from scraper.database.cache import known_flat_cache
+from scraper.database.models.filter import Filter
+from scraper.database.models.flat import Flat
+from scraper.database.models.user import User
+from scraper.database.postgres import postgres_instance
+from scraper.main import FlatsParser
+from scraper.parsers.base import BaseParser
+from scraper.parsers.city_24 import City24Parser
+from scraper.parsers.pp import PardosanasPortalsParser
+from scraper.parsers.ss import SludinajumuServissParser
+from scraper.parsers.varianti import VariantiParser
+from scraper.benchmarks.replay import RecordingSession, ReplaySession
+from scraper.schemas.shared import DealType
+from scraper.utils.config import Config
+from scraper.utils.executor import parse_executor
+
+PARSERS: Dict[str, Type[BaseParser]] = {
+    "ss": SludinajumuServissParser,
+    "city24": City24Parser,
+    "pp": PardosanasPortalsParser,
+    "varianti": VariantiParser,
+}
+
+# telegram ids of the seeded benchmark users, far above real ids
+BENCHMARK_TG_USER_ID = 9_000_000_000
+
+
+class FakeTelegramBot:
+    """Counts the messages the parsers would send, nothing is kept or sent."""
+
+    def __init__(self):
+        self.new_flat_messages = 0
+        self.update_messages = 0
+
+    async def send_flat_msg_with_limiter(self, flat, type, tg_user_id: int, counter: str = None):
+        self.new_flat_messages += 1
+
+    async def send_flat_update_msg_with_limiter(self, flat, prev_prices, tg_user_id: int):
+        self.update_messages += 1
+
+    async def send_text_msg_with_limiter(self, text: str, tg_user_id: int):
+        pass
+
+
+def create_parsers(config: Config, sources: List[str], bot: FakeTelegramBot) -> List[BaseParser]:
+    return [PARSERS[source](bot, getattr(config.parsers, source), deal_type, config.pipeline)
+            for source in sources for deal_type in DealType]
+
+
+async def reset_flats(sources: List[str]) -> None:
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(Flat).where(Flat.source.in_(sources)))
+    known_flat_cache.prices.clear()
+
+
+async def seed_subscribers(parsers: List[BaseParser], count: int) -> None:
+    """Every benchmark user gets a filter matching any flat in every district of the parsed cities."""
+    everything = Range(0, 1_000_000_000, bounds="[]")
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            for index in range(count):
+                tg_user_id = BENCHMARK_TG_USER_ID + index
+                db.add(User(tg_user_id=tg_user_id, username="benchmark"))
+                for parser in parsers:
+                    for district in set(parser.districts.values()):
+                        db.add(Filter(deal_type=parser.deal_type.value, city=parser.city_name, district=district,
+                                      room_range=everything, price_range=everything, area_range=everything,
+                                      floor_range=everything, tg_user_id=tg_user_id))
+
+
+async def remove_subscribers() -> None:
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(User).where(User.tg_user_id >= BENCHMARK_TG_USER_ID))
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(parser: BaseParser, elapsed: float) -> None:
+    stages = {stage.name: stage for stage in parser.pipeline.stages}
+    listings = stages["parse"].processed
+    print(f"  {parser.source.value:>8} {parser.deal_type.value:<7} {elapsed:7.2f}s, {listings:6d} listings, "
+          f"{listings / elapsed if elapsed else 0:8.1f} listings/s, {stages['persist'].processed} stored")
+    for stage in parser.pipeline.stages:
+        latency_ms = stage.busy_seconds / stage.processed * 1000 if stage.processed else 0
+        print(f"           {stage.name:>8}: {stage.processed:6d} in, {latency_ms:8.2f} ms/item, "
+              f"{stage.blocked_seconds:6.2f}s blocked, {stage.failed} failed")
+
+
+async def record(config: Config, archive: Path, sources: List[str]) -> None:
+    bot = FakeTelegramBot()
+    parsers = create_parsers(config, sources, bot)
+    await reset_flats(sources)
+
+    for parser in parsers:
+        live_session = parser.create_session
+        parser.create_session = lambda live_session=live_session: RecordingSession(
+            archive, live_session())
+        await parser.scrape()
+    print(f"Recorded {sum(1 for _ in open(archive / 'index.jsonl'))} responses into {archive}")
+
+
+async def replay(config: Config, archive: Path, sources: List[str], runs: int, subscribers: int,
+                 trace_memory: bool) -> None:
+    bot = FakeTelegramBot()
+    parsers = create_parsers(config, sources, bot)
+    session = ReplaySession(archive)
+    meta.frozen_now = session.recorded_at
+    for parser in parsers:
+        parser.create_session = lambda: session
+
+    await reset_flats(sources)
+    await seed_subscribers(parsers, subscribers)
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        for run in range(1, runs + 1):
+            print(f"Run {run}/{runs}")
+            run_start = time.perf_counter()
+            for parser in parsers:
+                start = time.perf_counter()
+                await parser.scrape()
+                report(parser, time.perf_counter() - start)
+
+            print(f"  total {time.perf_counter() - run_start:.2f}s, {bot.new_flat_messages} new flat and "
+                  f"{bot.update_messages} update messages, {session.hits} responses replayed, "
+                  f"{session.misses} missing, peak rss {peak_rss_mib():.1f} MiB")
+            if trace_memory:
+                print(
+                    f"  traced peak {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MiB")
+                tracemalloc.reset_peak()
+    finally:
+        meta.frozen_now = None
+        await remove_subscribers()
+
+
+async def main(args: argparse.Namespace) -> None:
+    config = FlatsParser.load_config(args.config)
+    sources = args.sources.split(",")
+    parse_executor.configure(config.executor)
+    await postgres_instance.init_db()
+
+    try:
+        if args.mode == "record":
+            await record(config, args.archive, sources)
+        else:
+            await replay(config, args.archive, sources, args.runs, args.subscribers, args.trace_memory)
+    finally:
+        parse_executor.shutdown()
+        await postgres_instance.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Record scraper traffic and replay it through the full parser pipeline")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--archive", type=Path, required=True,
+                        help="directory of the recorded traffic")
+    parser.add_argument("--sources", default=",".join(PARSERS),
+                        help="comma separated sources")
+    parser.add_argument("--config", type=Path, default=Path("/app/config.toml"))
+    parser.add_argument("--runs", type=int, default=2,
+                        help="replay runs, the first one stores every flat")
+    parser.add_argument("--subscribers", type=int, default=0,
+                        help="benchmark users with filters matching every flat")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report the traced python heap peak, slows the run down")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
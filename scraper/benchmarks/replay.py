@@ -0,0 +1,156 @@
+"""
+Record and replay HTTP traffic of the parsers.
+
+`RecordingSession` sends requests with a real aiohttp session and stores every response in an archive,
+`ReplaySession` serves the archived responses without touching the network. Both implement the part of
+`aiohttp.ClientSession` the parsers use: `get`/`post` as async context managers returning a response
+with `status` and `read()`.
+
+Archive layout:
+    <archive>/index.jsonl    one line per response: key, method, url, params, status, body file
+    <archive>/bodies/<key>   raw response body
+    <archive>/meta.json      {"recorded_at": ISO datetime}
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from scraper.utils.logger import logger
+
+# parameters that change between runs, e.g. the start of the current day, are not part of the key
+VOLATILE_PARAMS = {"datePublished[gte]"}
+
+
+def request_key(method: str, url: str, params: Optional[Dict[str, Any]] = None, json_body: Any = None) -> str:
+    stable_params = {key: str(value) for key, value in (params or {}).items()
+                     if key not in VOLATILE_PARAMS}
+    payload = json.dumps([method.upper(), url, stable_params, json_body],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ArchivedResponse:
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+
+    async def read(self) -> bytes:
+        return self.body
+
+    async def __aenter__(self) -> "ArchivedResponse":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def __repr__(self) -> str:
+        return f"<ArchivedResponse {self.status}>"
+
+
+class _PendingRequest:
+    """Lets `async with session.get(...)` work for both sessions, like aiohttp's request context manager."""
+
+    def __init__(self, coroutine):
+        self.coroutine = coroutine
+
+    async def __aenter__(self) -> ArchivedResponse:
+        return await self.coroutine
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+class RecordingSession:
+    def __init__(self, archive: Path, session: aiohttp.ClientSession):
+        self.archive = archive
+        self.session = session
+        (archive / "bodies").mkdir(parents=True, exist_ok=True)
+        meta = archive / "meta.json"
+        if not meta.exists():
+            meta.write_text(json.dumps(
+                {"recorded_at": datetime.now(timezone.utc).isoformat()}))
+        self.recorded = 0
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _PendingRequest:
+        return _PendingRequest(self._record("GET", url, params=params, **kwargs))
+
+    def post(self, url: str, json: Any = None, params: Optional[Dict[str, Any]] = None, **kwargs) -> _PendingRequest:
+        return _PendingRequest(self._record("POST", url, params=params, json=json, **kwargs))
+
+    async def _record(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                      json: Any = None, **kwargs) -> ArchivedResponse:
+        async with self.session.request(method, url, params=params, json=json, **kwargs) as response:
+            body = await response.read()
+            status = response.status
+
+        key = request_key(method, url, params, json)
+        (self.archive / "bodies" / key).write_bytes(body)
+        with open(self.archive / "index.jsonl", "a", encoding="utf-8") as index:
+            index.write(json_dumps({"key": key, "method": method, "url": url, "params": params,
+                                    "status": status, "size": len(body)}) + "\n")
+        self.recorded += 1
+        return ArchivedResponse(status, body)
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def __aenter__(self) -> "RecordingSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+
+class ReplaySession:
+    def __init__(self, archive: Path):
+        self.archive = archive
+        self.responses: Dict[str, tuple[int, Path]] = {}
+        with open(archive / "index.jsonl", "r", encoding="utf-8") as index:
+            for line in index:
+                entry = json.loads(line)
+                self.responses[entry["key"]] = (
+                    entry["status"], archive / "bodies" / entry["key"])
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def recorded_at(self) -> datetime:
+        meta = json.loads((self.archive / "meta.json").read_text())
+        return datetime.fromisoformat(meta["recorded_at"])
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _PendingRequest:
+        return _PendingRequest(self._replay("GET", url, params=params))
+
+    def post(self, url: str, json: Any = None, params: Optional[Dict[str, Any]] = None, **kwargs) -> _PendingRequest:
+        return _PendingRequest(self._replay("POST", url, params=params, json_body=json))
+
+    async def _replay(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                      json_body: Any = None) -> ArchivedResponse:
+        response = self.responses.get(
+            request_key(method, url, params, json_body))
+        if response is None:
+            # not recorded, e.g. a page past the end, behaves like a missing page
+            self.misses += 1
+            logger.warning(f"No recorded response for {method} {url} {params or ''}")
+            return ArchivedResponse(404, b"")
+
+        self.hits += 1
+        status, body_path = response
+        return ArchivedResponse(status, body_path.read_bytes())
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "ReplaySession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+def json_dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
@@ -0,0 +1,112 @@
+"""
+Compare the single pass ss.lv list page extractor with the previous BeautifulSoup path.
+
+Usage:
+    python -m scraper.benchmarks.ss_extract [--fixtures path/to/pages] [--iterations 20]
+
+The fixtures directory holds saved ss.lv list pages (`*.html`, as served, UTF-8), by default the pages
+of the extractor tests in tests/scraper/fixtures/ss. Every page is first
+checked for equal output of both paths, then both are timed and their peak allocations measured.
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+from scraper.parsers.extract.ss import SsPage, SsRow, extract_list_page
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parents[2] / "tests" / "scraper" / "fixtures" / "ss"
+
+
+def extract_list_page_bs4(html: bytes) -> SsPage:
+    """The extraction as done before the single pass extractor, kept as the benchmark baseline."""
+    bs = BeautifulSoup(html, "lxml")
+    descriptions = bs.select("a.am")
+    streets = bs.select("td.msga2-o.pp6")
+    image_urls = bs.select("img.isfoto.foto_list")
+
+    page = SsPage()
+    for index, (description, cells) in enumerate(zip(descriptions, zip(*[iter(streets)] * 7))):
+        img_url = image_urls[index].get("src") if index < len(image_urls) else None
+        page.rows.append(SsRow(url=description.get("href"), raw_info=[
+                         cell.get_text() for cell in cells], img_url=img_url))
+
+    all_pages = bs.find_all("a", class_="navi")
+    page.pages = [int(page_num.get_text())
+                  for page_num in all_pages[1:-1] if page_num.get_text().strip().isdigit()]
+    return page
+
+
+def validate(name: str, html: bytes) -> bool:
+    expected = extract_list_page_bs4(html)
+    actual = extract_list_page(html)
+    valid = True
+
+    if expected.pages != actual.pages:
+        print(f"{name}: pages differ {expected.pages} != {actual.pages}")
+        valid = False
+    if len(expected.rows) != len(actual.rows):
+        print(
+            f"{name}: row count differs {len(expected.rows)} != {len(actual.rows)}")
+        return False
+
+    for expected_row, actual_row in zip(expected.rows, actual.rows):
+        if (expected_row.url, expected_row.raw_info) != (actual_row.url, actual_row.raw_info):
+            print(f"{name}: row differs {expected_row} != {actual_row}")
+            valid = False
+        elif expected_row.img_url != actual_row.img_url:
+            # the old path matched images by position, rows without a photo shifted all following images
+            print(
+                f"{name}: image of {actual_row.url} differs, {expected_row.img_url} (old) != {actual_row.img_url} (new)")
+    return valid
+
+
+def measure(extract: Callable[[bytes], SsPage], pages: List[bytes], iterations: int) -> tuple[float, int]:
+    """Returns pages per second and the peak traced memory of a single page in bytes."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - start
+
+    peak = 0
+    for html in pages:
+        tracemalloc.start()
+        extract(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return (len(pages) * iterations) / elapsed, peak
+
+
+def main(fixtures: Path, iterations: int) -> None:
+    files = sorted(fixtures.glob("*.html"))
+    if not files:
+        raise SystemExit(f"No *.html fixtures found in {fixtures}")
+
+    pages = [file.read_bytes() for file in files]
+    invalid = [file.name for file, html in zip(
+        files, pages) if not validate(file.name, html)]
+
+    print(f"{len(pages)} pages, {len(invalid)} with different output")
+    for name, extract in (("bs4", extract_list_page_bs4), ("single pass", extract_list_page)):
+        pages_per_second, peak = measure(extract, pages, iterations)
+        print(
+            f"{name:>12}: {pages_per_second:8.1f} pages/s, peak {peak / 1024:8.1f} KiB per page")
+
+    if invalid:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark ss.lv list page extraction")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES,
+                        help="directory with saved ss.lv list pages")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    main(args.fixtures, args.iterations)
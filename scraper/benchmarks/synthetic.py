@@ -0,0 +1,448 @@
+"""
+Synthetic users, filters and flats for load testing matching and delivery.
+
+Usage:
+    python -m scraper.benchmarks.synthetic generate [--users 10000] [--filters 50000] [--flats 100000]
+                                                    [--favourites 30000] [--seed 1]
+    python -m scraper.benchmarks.synthetic drive [--pages 40] [--page-size 50] [--new-ratio 0.5]
+                                                 [--changed-ratio 0.25] [--rate 30] [--drain-timeout 60]
+    python -m scraper.benchmarks.synthetic clean
+
+`generate` fills `users`, `filters`, `flats`, `prices` and `favourites` of the database from the POSTGRES_*
+environment variables. Districts and series come from settings.json, popular districts get more flats
+and filters, and area follows the rooms and series while the price follows area, district and series.
+
+`drive` pushes synthetic scrape pages through the real parser pipeline: a mix of new flats, stored flats
+with a changed price and unchanged ones. Matching runs against the generated filters and notifications
+go through a `RateLimiterQueue` to a fake telegram bot, which reports matching and delivery latencies.
+
+Synthetic rows are recognisable by their telegram user ids and flat urls, `clean` removes all of them.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+import asyncpg
+from sqlalchemy import delete, func, select
+
+from scraper.database.bulk import BulkFlat, BulkLoader
+from scraper.database.crud import get_matching_filters_tg_user_ids
+from scraper.database.models.flat import Flat as FlatORM
+from scraper.database.models.price import Price
+from scraper.database.models.user import User
+from scraper.database.postgres import postgres_instance
+from scraper.parsers.base import BaseParser, FlatUpdate
+from scraper.parsers.flat.base import Flat
+from scraper.schemas.shared import DealType
+from scraper.utils.config import PipelineConfig, Source
+from scraper.utils.limiter import RateLimiterQueue
+from scraper.utils.logger import logger
+
+# telegram ids of synthetic users, far above real ids and below the e2e benchmark users
+SYNTHETIC_TG_USER_ID = 8_000_000_000
+SYNTHETIC_URL = "https://synthetic.invalid/"
+
+SOURCES = [Source.SS, Source.CITY_24, Source.PP, Source.VARIANTI]
+RENT_SHARE = 0.55
+ROOM_WEIGHTS = {1: 0.2, 2: 0.38, 3: 0.3, 4: 0.1, 5: 0.02}
+SELL_PRICE_PER_M2 = 1300
+RENT_PRICE_PER_M2 = 9
+PREMIUM_DISTRICTS = {"Centrs", "Vecrīga", "Klīversala", "Ķīpsala", "Skanste", "Mežaparks", "Teika"}
+
+
+@dataclass(frozen=True)
+class SeriesProfile:
+    floors: tuple[int, ...]
+    area_per_room: float
+    price_factor: float
+    weight: float
+
+
+SERIES_PROFILES: Dict[str, SeriesProfile] = {
+    "Jaunbūve": SeriesProfile((5, 7, 9, 12), 28, 1.6, 12),
+    "Renovēta ēka": SeriesProfile((4, 5, 6), 26, 1.4, 4),
+    "Pirmskara ēka": SeriesProfile((3, 4, 5, 6), 27, 1.2, 8),
+    "Staļinka": SeriesProfile((4, 5, 6), 25, 1.1, 5),
+    "Hruščovka": SeriesProfile((5,), 17, 0.8, 10),
+    "Lietuviešu projekts": SeriesProfile((5, 9), 21, 0.9, 10),
+    "602": SeriesProfile((9, 12), 22, 0.95, 10),
+    "119": SeriesProfile((5, 9), 22, 0.95, 8),
+    "467": SeriesProfile((9,), 19, 0.85, 8),
+    "103": SeriesProfile((5, 9), 19, 0.85, 7),
+    "104": SeriesProfile((5, 9), 20, 0.85, 4),
+    "Čehu projekts": SeriesProfile((5, 9), 24, 1.0, 4),
+    "Mazģimeņu projekts": SeriesProfile((9,), 14, 0.8, 2),
+    "Specprojekts": SeriesProfile((5, 9, 12), 22, 0.95, 3),
+    "Brežņevka": SeriesProfile((5, 9), 19, 0.85, 2),
+    "Koka māja": SeriesProfile((1, 2), 22, 0.7, 2),
+    "Privātmāja": SeriesProfile((1, 2, 3), 30, 1.0, 1),
+}
+DEFAULT_SERIES_PROFILE = SeriesProfile((5, 9), 22, 1.0, 1)
+
+
+class SyntheticMarket:
+    """Draws flats and filters from the reference districts and series of settings.json."""
+
+    def __init__(self, settings_path: str, seed: int):
+        with open(settings_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.city = next(iter(data["cities"]["reference"].values()))
+
+        # a few districts hold most of the listings, popularity falls off like a power law
+        self.districts: List[str] = list(data["districts"]["reference"].values())
+        self.rng.shuffle(self.districts)
+        self.district_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(self.districts))]
+        self.district_price_factor = {
+            district: 1.6 if district in PREMIUM_DISTRICTS else self.rng.lognormvariate(0, 0.15)
+            for district in self.districts}
+
+        self.series: List[str] = list(data["flat_series"]["reference"].values())
+        self.series_weights = [SERIES_PROFILES.get(series, DEFAULT_SERIES_PROFILE).weight
+                               for series in self.series]
+        self.flats_created = 0
+
+    def district(self) -> str:
+        return self.rng.choices(self.districts, self.district_weights)[0]
+
+    def rooms(self) -> int:
+        return self.rng.choices(list(ROOM_WEIGHTS), list(ROOM_WEIGHTS.values()))[0]
+
+    def deal_type(self) -> DealType:
+        return DealType.RENT if self.rng.random() < RENT_SHARE else DealType.SELL
+
+    def price_per_m2(self, deal_type: DealType, district: str, series: str) -> float:
+        base = RENT_PRICE_PER_M2 if deal_type == DealType.RENT else SELL_PRICE_PER_M2
+        profile = SERIES_PROFILES.get(series, DEFAULT_SERIES_PROFILE)
+        return (base * self.district_price_factor[district] * profile.price_factor
+                * self.rng.lognormvariate(0, 0.15))
+
+    def flat(self, deal_type: Optional[DealType] = None) -> Flat:
+        self.flats_created += 1
+        deal_type = deal_type or self.deal_type()
+        source = self.rng.choice(SOURCES)
+        district = self.district()
+        series = self.rng.choices(self.series, self.series_weights)[0]
+        profile = SERIES_PROFILES.get(series, DEFAULT_SERIES_PROFILE)
+        rooms = self.rooms()
+        area = round(rooms * profile.area_per_room * self.rng.lognormvariate(0, 0.12) + 8, 1)
+        floors_total = self.rng.choice(profile.floors)
+        price = max(1, int(round(area * self.price_per_m2(deal_type, district, series),
+                                 -1 if deal_type == DealType.RENT else -2)))
+
+        # the seed keeps flats of different runs apart
+        flat = Flat(url=f"{SYNTHETIC_URL}{source.value}/{self.seed}/{self.flats_created}", district=district,
+                    source=source, deal_type=deal_type.value, city=self.city,
+                    street=f"Sintētiskā iela {self.seed}-{self.flats_created}", series=series, rooms=rooms,
+                    area=area, floor=self.rng.randint(1, floors_total), floors_total=floors_total,
+                    price=price, price_per_m2=round(price / area, 2))
+        flat.id = flat.create_id()
+        return flat
+
+    def price_history(self, flat: Flat, created_at: datetime) -> List[tuple[datetime, int]]:
+        """Earlier prices of the flat, a listing is mostly discounted over time."""
+        history = [(created_at, flat.price)]
+        price = flat.price
+        updated_at = created_at
+        while self.rng.random() < 0.35:
+            updated_at -= timedelta(days=self.rng.randint(3, 30))
+            price = max(1, round(price / self.rng.uniform(0.95, 1.02)))
+            history.append((updated_at, price))
+        return history
+
+    def filter(self, tg_user_id: int) -> tuple:
+        """A filter row in the column order of `FILTER_COLUMNS`."""
+        deal_type = self.deal_type()
+        district = self.district()
+        rooms_from = self.rooms()
+        rooms_to = rooms_from + self.rng.choice([0, 0, 1, 1, 2])
+
+        if self.rng.random() < 0.3:
+            area_range = (0, 1000)
+        else:
+            area_range = (rooms_from * 14, rooms_to * 35 + 20)
+
+        # the budget follows what flats of that size cost in the district
+        typical_area = (area_range[0] + min(area_range[1], 200)) / 2
+        budget = typical_area * self.price_per_m2(deal_type, district, "Lietuviešu projekts")
+        price_range = (round(budget * self.rng.choice([0, 0.5, 0.7])),
+                       round(budget * self.rng.uniform(1.0, 1.4)))
+        floor_range = (2, 100) if self.rng.random() < 0.3 else (1, 100)
+
+        return (deal_type.value, self.city, district, numrange(rooms_from, rooms_to), numrange(*price_range),
+                numrange(*area_range), numrange(*floor_range), tg_user_id, self.rng.random() < 0.9)
+
+
+FILTER_COLUMNS = ["deal_type", "city", "district", "room_range", "price_range", "area_range",
+                  "floor_range", "tg_user_id", "is_active"]
+
+
+def numrange(lower: float, upper: float) -> asyncpg.Range:
+    # same inclusive bounds as the filters created by the bot
+    return asyncpg.Range(Decimal(lower), Decimal(upper), upper_inc=True)
+
+
+async def copy_records(table: str, columns: List[str], records: List[tuple]) -> None:
+    async with postgres_instance.engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        driver = raw_connection.driver_connection
+        async with driver.transaction():
+            await driver.copy_records_to_table(table, records=records, columns=columns)
+
+
+async def generate(args: argparse.Namespace) -> None:
+    market = SyntheticMarket(args.settings, args.seed)
+    start = time.perf_counter()
+    tg_user_ids = [SYNTHETIC_TG_USER_ID + index for index in range(args.users)]
+
+    now = datetime.now(timezone.utc)
+    flat_ids: List[str] = []
+    async with BulkLoader(args.batch_size) as loader:
+        for _ in range(args.flats):
+            flat = market.flat()
+            created_at = now - timedelta(minutes=market.rng.randint(0, args.days * 24 * 60))
+            flat_ids.append(flat.id)
+            await loader.add(BulkFlat(
+                flat_id=flat.id, source=flat.source.value, deal_type=flat.deal_type, url=flat.url,
+                district=flat.district, city=flat.city, street=flat.street, rooms=flat.rooms,
+                floors_total=flat.floors_total, floor=flat.floor, area=flat.area, series=flat.series,
+                created_at=created_at, prices=market.price_history(flat, created_at)))
+    logger.info(f"Generated {loader.stats.flats} flats and {loader.stats.prices} prices")
+
+    await copy_records("users", ["tg_user_id", "username"],
+                       [(tg_user_id, f"synthetic{index}") for index, tg_user_id in enumerate(tg_user_ids)])
+
+    # every user has at least one filter, the rest are spread randomly
+    owners = tg_user_ids + [market.rng.choice(tg_user_ids)
+                            for _ in range(max(0, args.filters - len(tg_user_ids)))]
+    await copy_records("filters", FILTER_COLUMNS, [market.filter(tg_user_id) for tg_user_id in owners])
+
+    favourites = set()
+    if flat_ids and tg_user_ids:
+        # bounded attempts, duplicates are skipped
+        for _ in range(args.favourites * 2):
+            if len(favourites) >= args.favourites:
+                break
+            favourites.add((market.rng.choice(flat_ids), market.rng.choice(tg_user_ids)))
+    await copy_records("favourites", ["flat_id", "tg_user_id"], list(favourites))
+
+    logger.info(
+        f"Generated {len(tg_user_ids)} users, {len(owners)} filters and {len(favourites)} favourites "
+        f"in {time.perf_counter() - start:.1f}s")
+
+
+async def clean(args: argparse.Namespace) -> None:
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            # filters and favourites are removed by their cascades
+            await db.execute(delete(User).where(User.tg_user_id >= SYNTHETIC_TG_USER_ID,
+                                                User.tg_user_id < SYNTHETIC_TG_USER_ID + 1_000_000_000))
+            await db.execute(delete(FlatORM).where(FlatORM.url.startswith(SYNTHETIC_URL)))
+    logger.info("Removed synthetic users, filters, favourites, flats and prices")
+
+
+def percentiles(values: List[float]) -> str:
+    if len(values) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(values, n=100)
+    return f"p50 {cuts[49] * 1000:.1f} ms, p95 {cuts[94] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms"
+
+
+class LoadTestBot:
+    """Queues messages through the rate limiter like `TelegramBot` and records when they are delivered."""
+
+    def __init__(self, rate_limiter: RateLimiterQueue, listed_at: Dict[int, float], send_delay: float):
+        self.rate_limiter = rate_limiter
+        self.listed_at = listed_at
+        self.send_delay = send_delay
+        self.queued = 0
+        self.delivery_latencies: List[float] = []
+
+    async def _send(self, flat: Flat) -> None:
+        # the telegram api round trip
+        await asyncio.sleep(self.send_delay)
+        self.delivery_latencies.append(time.perf_counter() - self.listed_at[id(flat)])
+
+    async def send_flat_msg_with_limiter(self, flat, type, tg_user_id: int, counter: str = None):
+        self.queued += 1
+        await self.rate_limiter.add_request(lambda: self._send(flat))
+
+    async def send_flat_update_msg_with_limiter(self, flat, prev_prices, tg_user_id: int):
+        self.queued += 1
+        await self.rate_limiter.add_request(lambda: self._send(flat))
+
+    async def send_text_msg_with_limiter(self, text: str, tg_user_id: int):
+        pass
+
+
+class SyntheticParser(BaseParser):
+    """Feeds generated pages through the pipeline of a real parser, nothing is fetched from the network."""
+
+    def __init__(self, market: SyntheticMarket, pages: List[List[Flat]], telegram_bot: LoadTestBot,
+                 pipeline_config: PipelineConfig):
+        super().__init__(Source.SS, DealType.RENT, telegram_bot, pipeline_config)
+        self.city_name = market.city
+        self.pages = pages
+        self.listed_at = telegram_bot.listed_at
+        self.match_latencies: List[float] = []
+        self.matched_subscribers = 0
+
+    def create_session(self) -> aiohttp.ClientSession:
+        # flats have no images, the session is never used
+        return aiohttp.ClientSession()
+
+    def fetch_units(self) -> Iterable[int]:
+        return range(len(self.pages))
+
+    async def fetch(self, page: int):
+        for flat in self.pages[page]:
+            self.listed_at[id(flat)] = time.perf_counter()
+            yield flat
+
+    async def parse(self, flat: Flat) -> Optional[FlatUpdate]:
+        flat.validate()
+        return FlatUpdate(flat=flat)
+
+    async def match(self, update: FlatUpdate) -> Optional[FlatUpdate]:
+        # the deal type of the synthetic flat decides, not the one of the parser
+        start = time.perf_counter()
+        flat = update.flat
+        update.subscribers = await get_matching_filters_tg_user_ids(
+            self.city_name, flat.district, DealType(flat.deal_type), rooms=flat.rooms, area=flat.area,
+            price=flat.price, floor=flat.floor)
+        self.match_latencies.append(time.perf_counter() - start)
+        self.matched_subscribers += len(update.subscribers)
+        if not update.subscribers:
+            return None
+        return update
+
+
+async def load_stored_flats(limit: int) -> List[Flat]:
+    """Synthetic flats from the database with their latest price, to list them again."""
+    latest_price = (select(Price.price).where(Price.flat_id == FlatORM.flat_id)
+                    .order_by(Price.updated_at.desc()).limit(1).scalar_subquery())
+    query = (select(FlatORM, latest_price.label("price"))
+             .where(FlatORM.url.startswith(SYNTHETIC_URL)).order_by(func.random()).limit(limit))
+    async with postgres_instance.SessionLocal() as db:
+        rows = (await db.execute(query)).all()
+
+    flats = []
+    for stored, price in rows:
+        flats.append(Flat(url=stored.url, district=stored.district, source=Source(stored.source),
+                          deal_type=stored.deal_type, id=stored.flat_id, city=stored.city, street=stored.street,
+                          series=stored.series, rooms=stored.rooms, area=float(stored.area), floor=stored.floor,
+                          floors_total=stored.floors_total, price=price, price_per_m2=round(price / float(stored.area), 2)))
+    return flats
+
+
+def build_pages(market: SyntheticMarket, stored: List[Flat], args: argparse.Namespace) -> List[List[Flat]]:
+    listings = args.pages * args.page_size
+    new = round(listings * args.new_ratio)
+    changed = min(round(listings * args.changed_ratio), len(stored))
+    unchanged = min(listings - new - changed, len(stored) - changed)
+    if changed + unchanged < listings - new:
+        logger.warning(
+            f"Only {len(stored)} stored synthetic flats, run generate first for the full mix")
+
+    flats = [market.flat() for _ in range(new)]
+    for flat in stored[:changed]:
+        flat.price = max(1, round(flat.price * market.rng.uniform(0.9, 0.98)))
+        flat.price_per_m2 = round(flat.price / flat.area, 2)
+        flats.append(flat)
+    flats.extend(stored[changed:changed + unchanged])
+    market.rng.shuffle(flats)
+    return [flats[index:index + args.page_size] for index in range(0, len(flats), args.page_size)]
+
+
+async def drive(args: argparse.Namespace) -> None:
+    market = SyntheticMarket(args.settings, args.seed + 1)
+    stored = await load_stored_flats(args.pages * args.page_size)
+    pages = build_pages(market, stored, args)
+
+    rate_limiter = RateLimiterQueue(rate=args.rate, per=1, buffer=args.buffer)
+    rate_limiter.start()
+    bot = LoadTestBot(rate_limiter, {}, args.send_delay)
+    pipeline_config = PipelineConfig(queue_size=50, fetch_workers=1, parse_workers=2, dedupe_workers=4,
+                                     image_workers=1, persist_workers=4, match_workers=args.match_workers,
+                                     notify_workers=2)
+    parser = SyntheticParser(market, pages, bot, pipeline_config)
+
+    start = time.perf_counter()
+    await parser.scrape()
+    elapsed = time.perf_counter() - start
+    listings = sum(len(page) for page in pages)
+    matched = len(parser.match_latencies)
+
+    drain_start = time.perf_counter()
+    while rate_limiter.queue.qsize() and time.perf_counter() - drain_start < args.drain_timeout:
+        await asyncio.sleep(0.5)
+    # the message taken by the worker last is still in flight
+    await asyncio.sleep(args.send_delay + 1 / args.rate + args.buffer)
+
+    backlog = rate_limiter.queue.qsize()
+    print(f"Ingested {listings} listings in {elapsed:.2f}s, {listings / elapsed:.1f} listings/s")
+    print(f"  matching: {matched} flats, {parser.matched_subscribers / matched if matched else 0:.1f} "
+          f"subscribers per flat, {percentiles(parser.match_latencies)}")
+    print(f"  delivery: {bot.queued} queued, {len(bot.delivery_latencies)} delivered, "
+          f"{percentiles(bot.delivery_latencies)}")
+    if backlog:
+        print(f"  backlog: {backlog} messages left after {args.drain_timeout}s, "
+              f"~{math.ceil(backlog * (1 / args.rate + args.buffer))}s more at the current rate")
+    logger.info(parser.pipeline.summary())
+
+
+async def main(args: argparse.Namespace) -> None:
+    await postgres_instance.init_db()
+    try:
+        await args.command(args)
+    finally:
+        await postgres_instance.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic load for matching and delivery")
+    parser.add_argument("--settings", default="/app/settings.json")
+    parser.add_argument("--seed", type=int, default=1)
+    commands = parser.add_subparsers(required=True)
+
+    generate_parser = commands.add_parser("generate", help="fill the database with synthetic data")
+    generate_parser.set_defaults(command=generate)
+    generate_parser.add_argument("--users", type=int, default=10_000)
+    generate_parser.add_argument("--filters", type=int, default=50_000)
+    generate_parser.add_argument("--flats", type=int, default=100_000)
+    generate_parser.add_argument("--favourites", type=int, default=30_000)
+    generate_parser.add_argument("--days", type=int, default=90,
+                                 help="flats are created within the last days")
+    generate_parser.add_argument("--batch-size", type=int, default=5000)
+
+    drive_parser = commands.add_parser("drive", help="push synthetic scrape pages through the pipeline")
+    drive_parser.set_defaults(command=drive)
+    drive_parser.add_argument("--pages", type=int, default=40)
+    drive_parser.add_argument("--page-size", type=int, default=50)
+    drive_parser.add_argument("--new-ratio", type=float, default=0.5,
+                              help="share of listings that are new flats")
+    drive_parser.add_argument("--changed-ratio", type=float, default=0.25,
+                              help="share of stored flats listed with a lower price, the rest is unchanged")
+    drive_parser.add_argument("--match-workers", type=int, default=2)
+    drive_parser.add_argument("--rate", type=int, default=30, help="telegram messages per second")
+    drive_parser.add_argument("--buffer", type=float, default=0.2,
+                              help="extra delay between messages, as in main")
+    drive_parser.add_argument("--send-delay", type=float, default=0.05,
+                              help="simulated telegram api latency in seconds")
+    drive_parser.add_argument("--drain-timeout", type=float, default=60,
+                              help="seconds to wait for queued messages after the scrape")
+
+    clean_parser = commands.add_parser("clean", help="remove all synthetic rows")
+    clean_parser.set_defaults(command=clean)
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,203 @@
+"""
+A local stand-in for the Telegram Bot API, for delivery tests without the real API.
+
+Usage:
+    python -m scraper.benchmarks.telegram_server [--port 8081] [--latency 0.05] [--jitter 0.05]
+
+Point the scraper at it with TELEGRAM_API_URL=http://localhost:8081. It implements `sendMessage`,
+`sendPhoto`, `sendMediaGroup` and `answerCallbackQuery` (plus `getMe`, `setMyCommands` and an empty
+`getUpdates`) and enforces the documented flood limits: 30 messages per second overall and one message
+per second per chat. Requests over a limit get a 429 with `retry_after`, like the real API.
+Counters are served as JSON on GET /stats.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+from aiohttp import web
+
+from scraper.utils.logger import logger
+
+MESSAGE_METHODS = {"sendmessage", "sendphoto", "sendmediagroup"}
+
+
+@dataclass
+class FloodLimits:
+    global_per_second: int = 30
+    chat_interval: float = 1.0  # seconds between two messages to the same chat
+
+
+@dataclass
+class ServerStats:
+    requests: Counter = field(default_factory=Counter)
+    rejected: Counter = field(default_factory=Counter)
+    delivered: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"requests": dict(self.requests), "rejected": dict(self.rejected), "delivered": self.delivered}
+
+
+class FakeTelegramServer:
+    """
+    Serves the bot api methods the scraper uses. `on_delivery` is called with the method and the
+    request parameters of every accepted message, benchmarks use it to time the delivery.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.05, limits: Optional[FloodLimits] = None,
+                 on_delivery: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.limits = limits or FloodLimits()
+        self.on_delivery = on_delivery
+        self.stats = ServerStats()
+        self._sent: Deque[float] = deque()
+        self._chat_last_sent: Dict[str, float] = {}
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application(client_max_size=20 * 1024 * 1024)
+        self.app.router.add_post("/bot{token}/{method}", self.handle_method)
+        self.app.router.add_get("/stats", self.handle_stats)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Fake telegram api listening on http://{host}:{port}")
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.as_dict())
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._read_params(request)
+        self.stats.requests[method] += 1
+
+        if method in MESSAGE_METHODS:
+            retry_after = self._check_flood_limits(str(params.get("chat_id")))
+            if retry_after:
+                self.stats.rejected[method] += 1
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }, status=429)
+
+        # the round trip to the real api
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if method == "getupdates":
+            # long polling without updates
+            await asyncio.sleep(min(float(params.get("timeout", 0)), 10))
+
+        handler = getattr(self, f"_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": False, "error_code": 404, "description": "Not Found: method not found"},
+                                     status=404)
+        result = handler(params)
+        if method in MESSAGE_METHODS:
+            self.stats.delivered += 1
+            if self.on_delivery is not None:
+                self.on_delivery(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _read_params(self, request: web.Request) -> Dict[str, Any]:
+        # aiogram sends multipart forms, complex values like reply_markup are JSON encoded strings
+        if request.content_type == "application/json":
+            return await request.json()
+        form = await request.post()
+        return {key: value for key, value in form.items() if isinstance(value, str)}
+
+    def _check_flood_limits(self, chat_id: str) -> int:
+        """Seconds to wait when a message to the chat would break a limit, 0 if it can be sent."""
+        now = time.monotonic()
+        while self._sent and now - self._sent[0] >= 1:
+            self._sent.popleft()
+        if len(self._sent) >= self.limits.global_per_second:
+            return 1
+
+        last_sent = self._chat_last_sent.get(chat_id)
+        if last_sent is not None and now - last_sent < self.limits.chat_interval:
+            return max(1, round(self.limits.chat_interval - (now - last_sent)))
+
+        self._sent.append(now)
+        self._chat_last_sent[chat_id] = now
+        return 0
+
+    def _message(self, params: Dict[str, Any], **content) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {"message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, **content}
+
+    def _photo(self) -> list:
+        file_id = f"photo{self._message_id}"
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 303, "height": 202}]
+
+    def _sendmessage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._message(params, text=params.get("text", ""))
+
+    def _sendphoto(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = self._message(params, caption=params.get("caption", ""))
+        message["photo"] = self._photo()
+        return message
+
+    def _sendmediagroup(self, params: Dict[str, Any]) -> list:
+        media = params.get("media", "[]")
+        items = json.loads(media) if isinstance(media, str) else media
+        group_id = str(self._message_id + 1)
+        messages = []
+        for _ in items:
+            message = self._message(params, media_group_id=group_id)
+            message["photo"] = self._photo()
+            messages.append(message)
+        return messages
+
+    def _answercallbackquery(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    def _setmycommands(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    def _deletewebhook(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    def _getupdates(self, params: Dict[str, Any]) -> list:
+        return []
+
+    def _getme(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = FakeTelegramServer(args.latency, args.jitter,
+                                FloodLimits(args.global_limit, args.chat_interval))
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="base response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random extra latency in seconds")
+    parser.add_argument("--global-limit", type=int, default=30, help="messages per second overall")
+    parser.add_argument("--chat-interval", type=float, default=1.0,
+                        help="seconds between two messages to the same chat")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args))
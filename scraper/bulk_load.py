@@ -0,0 +1,87 @@
+"""
+Bulk load historical flats and prices from a JSON lines file.
+
+Usage:
+    python -m scraper.bulk_load --input flats.jsonl [--batch-size 5000]
+
+Every line is one flat:
+    {"source": "ss", "deal_type": "Pārdod", "url": "...", "district": "Centrs", "city": "Rīga",
+     "street": "Brīvības 1", "series": "Staļinka", "rooms": 2, "area": 54.5, "floor": 3,
+     "floors_total": 5, "latitude": 56.95, "longitude": 24.11, "created_at": "2024-05-01T10:00:00+00:00",
+     "prices": [{"price": 120000, "updated_at": "2024-05-01T10:00:00+00:00"}]}
+
+`flat_id` is optional, when missing it is computed with the same `Flat.create_id` the scrapers use,
+so `area` must have the same type (int or float) the source parser produces.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+
+from scraper.database.bulk import BulkFlat, BulkLoader
+from scraper.parsers.flat.base import Flat
+from scraper.utils.config import Source
+from scraper.utils.logger import logger
+
+
+def to_bulk_flat(record: dict) -> BulkFlat:
+    flat = Flat(url=record["url"], district=record["district"], source=Source(record["source"]),
+                deal_type=record["deal_type"], street=record["street"], series=record["series"],
+                rooms=record["rooms"], area=record["area"], floor=record["floor"],
+                floors_total=record["floors_total"])
+    created_at = datetime.fromisoformat(record["created_at"])
+    prices = [(datetime.fromisoformat(price["updated_at"]), int(price["price"]))
+              for price in record.get("prices", [])]
+
+    return BulkFlat(
+        flat_id=record.get("flat_id") or flat.create_id(),
+        source=flat.source.value,
+        deal_type=flat.deal_type,
+        url=flat.url,
+        district=flat.district,
+        city=record.get("city"),
+        street=flat.street,
+        rooms=flat.rooms,
+        floors_total=flat.floors_total,
+        floor=flat.floor,
+        area=flat.area,
+        series=flat.series,
+        created_at=created_at,
+        latitude=record.get("latitude") or 0,
+        longitude=record.get("longitude") or 0,
+        prices=prices,
+    )
+
+
+async def load(path: str, batch_size: int) -> None:
+    skipped = 0
+    async with BulkLoader(batch_size) as loader:
+        with open(path, "r", encoding="utf-8") as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    bulk_flat = to_bulk_flat(json.loads(line))
+                except Exception as e:
+                    logger.error(f"Skipping line {line_number}: {e}")
+                    skipped += 1
+                    continue
+                await loader.add(bulk_flat)
+
+    stats = loader.stats
+    logger.info(
+        f"Loaded {stats.flats} flats ({stats.flats_merged} written) and {stats.prices} prices "
+        f"({stats.prices_merged} written) in {stats.seconds:.1f}s, {stats.rows_per_second:.0f} rows/s, "
+        f"{skipped} lines skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk load flats and prices with COPY")
+    parser.add_argument("--input", required=True,
+                        help="path to a JSON lines file")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="flats per COPY batch and transaction")
+    args = parser.parse_args()
+
+    asyncio.run(load(args.input, args.batch_size))
@@ -13,6 +13,11 @@ from scraper.database.models.price import Price
 from scraper.database.models.favorite import Favourite
 from scraper.database.models.user import User
 from scraper.database.models.filter import Filter
+from scraper.database.models.archive import FlatArchive, PriceArchive
+from scraper.database.models.scrape_run import ScrapeRun
+from scraper.database.models.crawl_unit import CrawlUnit
+from scraper.database.models.leader import SchedulerLeader
+from scraper.database.models.scrape_checkpoint import ScrapeCheckpoint
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,186 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from scraper.database.cache import known_flat_cache
+from scraper.database.postgres import postgres_instance
+from scraper.utils.logger import logger
+
+FLAT_STAGING_COLUMNS = ["flat_id", "source", "deal_type", "url", "district", "city", "street", "rooms",
+                        "floors_total", "floor", "area", "series", "location", "image_data", "created_at",
+                        "last_seen_at"]
+PRICE_STAGING_COLUMNS = ["flat_id", "price", "updated_at"]
+
+CREATE_STAGING_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS flats_staging(
+    flat_id VARCHAR(255) NOT NULL,
+    source VARCHAR(30) NOT NULL,
+    deal_type VARCHAR(30) NOT NULL,
+    url TEXT NOT NULL,
+    district VARCHAR(100) NOT NULL,
+    city VARCHAR(50),
+    street VARCHAR(150) NOT NULL,
+    rooms SMALLINT NOT NULL,
+    floors_total SMALLINT NOT NULL,
+    floor SMALLINT NOT NULL,
+    area DOUBLE PRECISION NOT NULL,
+    series TEXT NOT NULL,
+    location TEXT, -- WKT, converted to geometry on merge
+    image_data BYTEA,
+    created_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ
+) ON COMMIT DELETE ROWS;
+
+CREATE TEMP TABLE IF NOT EXISTS prices_staging(
+    flat_id VARCHAR(255) NOT NULL,
+    price INT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL
+) ON COMMIT DELETE ROWS;
+"""
+
+# The same flat can appear several times in a batch, the latest record wins.
+# Existing flats are only overwritten by newer records, so importing history never clobbers live data.
+MERGE_FLATS = """
+INSERT INTO flats (flat_id, source, deal_type, url, district, city, street, rooms,
+                   floors_total, floor, area, series, location, image_data, created_at, last_seen_at)
+SELECT DISTINCT ON (flat_id)
+    flat_id, source, deal_type, url, district, city, street, rooms,
+    floors_total, floor, area::DECIMAL(5, 2), series, ST_GeomFromText(location, 4326),
+    COALESCE(image_data, ''::bytea), created_at, COALESCE(last_seen_at, created_at)
+FROM flats_staging
+ORDER BY flat_id, created_at DESC
+ON CONFLICT (flat_id) DO UPDATE SET
+    url = EXCLUDED.url,
+    city = EXCLUDED.city,
+    location = EXCLUDED.location,
+    image_data = CASE WHEN octet_length(EXCLUDED.image_data) > 0 THEN EXCLUDED.image_data ELSE flats.image_data END,
+    created_at = EXCLUDED.created_at,
+    last_seen_at = GREATEST(flats.last_seen_at, EXCLUDED.last_seen_at)
+WHERE flats.created_at IS NULL OR flats.created_at < EXCLUDED.created_at
+"""
+
+# Prices are deduplicated on (flat_id, price, updated_at), both within the batch and against stored prices
+MERGE_PRICES = """
+INSERT INTO prices (flat_id, price, updated_at)
+SELECT DISTINCT s.flat_id, s.price, s.updated_at
+FROM prices_staging s
+WHERE s.price > 0 AND NOT EXISTS (
+    SELECT 1 FROM prices p
+    WHERE p.flat_id = s.flat_id AND p.price = s.price AND p.updated_at = s.updated_at
+)
+"""
+
+
+@dataclass
+class BulkFlat:
+    """A flat row together with its price history, `flat_id` must come from `Flat.create_id`."""
+    flat_id: str
+    source: str
+    deal_type: str
+    url: str
+    district: str
+    city: Optional[str]
+    street: str
+    rooms: int
+    floors_total: int
+    floor: int
+    area: float
+    series: str
+    created_at: datetime
+    latitude: float = 0
+    longitude: float = 0
+    image_data: Optional[bytes] = None
+    # when a scrape listed the flat, historical imports leave it to `created_at`
+    last_seen_at: Optional[datetime] = None
+    prices: List[tuple[datetime, int]] = field(default_factory=list)
+
+
+@dataclass
+class BulkLoadStats:
+    flats: int = 0
+    prices: int = 0
+    flats_merged: int = 0
+    prices_merged: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.seconds == 0:
+            return 0.0
+        return (self.flats + self.prices) / self.seconds
+
+
+class BulkLoader:
+    """
+    Loads flats and prices with COPY into temporary staging tables and merges them into
+    `flats`/`prices` with set based SQL, one transaction per batch.
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self.stats = BulkLoadStats()
+        self._flats: List[tuple] = []
+        self._prices: List[tuple] = []
+        self._latest_prices: dict[str, tuple[datetime, int]] = {}
+
+    async def __aenter__(self) -> "BulkLoader":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.flush()
+
+    async def add(self, flat: BulkFlat) -> None:
+        self._flats.append((
+            flat.flat_id, flat.source, flat.deal_type, flat.url, flat.district, flat.city, flat.street,
+            flat.rooms, flat.floors_total, flat.floor, float(flat.area), flat.series,
+            f"POINT({flat.longitude} {flat.latitude})", flat.image_data, flat.created_at,
+            flat.last_seen_at,
+        ))
+        for updated_at, price in flat.prices:
+            self._prices.append((flat.flat_id, price, updated_at))
+            latest = self._latest_prices.get(flat.flat_id)
+            if latest is None or latest[0] <= updated_at:
+                self._latest_prices[flat.flat_id] = (updated_at, price)
+
+        if len(self._flats) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._flats:
+            return
+
+        start = time.perf_counter()
+        async with postgres_instance.engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            # asyncpg connection, COPY is not available through SQLAlchemy
+            driver = raw_connection.driver_connection
+            async with driver.transaction():
+                await driver.execute(CREATE_STAGING_TABLES)
+                await driver.copy_records_to_table(
+                    "flats_staging", records=self._flats, columns=FLAT_STAGING_COLUMNS)
+                await driver.copy_records_to_table(
+                    "prices_staging", records=self._prices, columns=PRICE_STAGING_COLUMNS)
+                flats_status = await driver.execute(MERGE_FLATS)
+                prices_status = await driver.execute(MERGE_PRICES)
+
+        elapsed = time.perf_counter() - start
+        self.stats.flats += len(self._flats)
+        self.stats.prices += len(self._prices)
+        # status strings look like "INSERT 0 123"
+        self.stats.flats_merged += int(flats_status.split()[-1])
+        self.stats.prices_merged += int(prices_status.split()[-1])
+        self.stats.batches += 1
+        self.stats.seconds += elapsed
+        logger.info(
+            f"Bulk loaded {len(self._flats)} flats and {len(self._prices)} prices in {elapsed:.2f}s "
+            f"({(len(self._flats) + len(self._prices)) / elapsed:.0f} rows/s)")
+
+        for flat_id, (_, price) in self._latest_prices.items():
+            known_flat_cache.update(flat_id, price)
+
+        self._flats.clear()
+        self._prices.clear()
+        self._latest_prices.clear()
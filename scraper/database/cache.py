@@ -0,0 +1,128 @@
+import random
+import sys
+from sqlalchemy import select
+
+from scraper.database.models.price import Price
+from scraper.database.postgres import postgres_instance
+from scraper.utils.config import CacheConfig
+from scraper.utils.logger import logger
+
+
+class KnownFlatCache:
+    """
+    In-process map of flat id -> latest stored price.
+
+    Listings that were already stored with the same price are skipped before any image download
+    or database query. The cache can only short-circuit unchanged flats, a miss always falls back
+    to the database, so a stale or evicted entry costs a query and never a lost update.
+    Flat ids are md5 hex digests, they are kept as 128 bit ints to halve the memory per entry.
+    """
+
+    def __init__(self, max_entries: int = 200_000, verify_sample_size: int = 500):
+        self.max_entries = max_entries
+        self.verify_sample_size = verify_sample_size
+        # dicts keep insertion order, writes re-insert, so the oldest entries are evicted first
+        self.prices: dict[int | str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, config: CacheConfig) -> None:
+        self.max_entries = config.max_entries
+        self.verify_sample_size = config.verify_sample_size
+
+    @staticmethod
+    def _key(flat_id: str) -> int | str:
+        try:
+            return int(flat_id, 16)
+        except ValueError:
+            return flat_id
+
+    @staticmethod
+    def _flat_id(key: int | str) -> str:
+        return format(key, "032x") if isinstance(key, int) else key
+
+    def is_unchanged(self, flat_id: str, price: int) -> bool:
+        """Check if the flat is already stored with the given price as its latest price."""
+        if self.prices.get(self._key(flat_id)) == price:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def update(self, flat_id: str, price: int) -> None:
+        key = self._key(flat_id)
+        self.prices.pop(key, None)
+        self.prices[key] = price
+        while len(self.prices) > self.max_entries:
+            del self.prices[next(iter(self.prices))]
+
+    def discard(self, flat_id: str) -> None:
+        self.prices.pop(self._key(flat_id), None)
+
+    async def warm(self) -> None:
+        """Load the latest price of the most recently updated flats with a single query."""
+        latest = (
+            select(Price.flat_id, Price.price, Price.updated_at)
+            .distinct(Price.flat_id)
+            .order_by(Price.flat_id, Price.updated_at.desc())
+            .subquery()
+        )
+        query = (
+            select(latest.c.flat_id, latest.c.price)
+            .order_by(latest.c.updated_at.desc())
+            .limit(self.max_entries)
+        )
+        async with postgres_instance.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+
+        self.prices.clear()
+        # insert the oldest first, so that they are the first to be evicted
+        for flat_id, price in reversed(rows):
+            self.prices[self._key(flat_id)] = price
+
+        logger.info(
+            f"Warmed known flat cache with {len(self.prices)} flats, ~{self.memory_usage() // 1024} KiB")
+
+    async def verify(self) -> int:
+        """Compare a random sample of entries with the database, fix and return the number of mismatches."""
+        if not self.prices:
+            return 0
+
+        sample = random.sample(list(self.prices.keys()),
+                               min(self.verify_sample_size, len(self.prices)))
+        flat_ids = [self._flat_id(key) for key in sample]
+        query = (
+            select(Price.flat_id, Price.price)
+            .distinct(Price.flat_id)
+            .where(Price.flat_id.in_(flat_ids))
+            .order_by(Price.flat_id, Price.updated_at.desc())
+        )
+        async with postgres_instance.engine.connect() as conn:
+            stored = dict((await conn.execute(query)).all())
+
+        mismatches = 0
+        for flat_id in flat_ids:
+            stored_price = stored.get(flat_id)
+            if stored_price == self.prices.get(self._key(flat_id)):
+                continue
+            mismatches += 1
+            if stored_price is None:
+                self.discard(flat_id)
+            else:
+                self.update(flat_id, stored_price)
+
+        log = logger.warning if mismatches else logger.info
+        log(f"Known flat cache check: {mismatches}/{len(flat_ids)} mismatches, {len(self.prices)} entries, "
+            f"{self.hits} hits, {self.misses} misses")
+        return mismatches
+
+    def memory_usage(self) -> int:
+        """Approximate memory used by the cache in bytes."""
+        if not self.prices:
+            return sys.getsizeof(self.prices)
+        # ints of the same size, prices are mostly small ints
+        sample_key = next(iter(self.prices))
+        return sys.getsizeof(self.prices) + len(self.prices) * sys.getsizeof(sample_key)
+
+
+known_flat_cache = KnownFlatCache()
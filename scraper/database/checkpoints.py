@@ -0,0 +1,134 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from scraper.database.crud import (delete_scrape_checkpoints, finish_scrape_checkpoint, get_scrape_checkpoints,
+                                   save_scrape_checkpoint)
+from scraper.database.models.scrape_checkpoint import ScrapeCheckpoint
+from scraper.parsers.pipeline import Ack
+from scraper.utils.config import CheckpointConfig
+from scraper.utils.logger import logger
+
+
+class UnitProgress:
+    """
+    The pages of one fetch unit on their way through the pipeline.
+
+    Every page gets an ack for its listings. Once the listings of a page and of all pages before it are
+    finished, `save` is called with that page, and `finish` once those of the whole unit are. A crash
+    therefore never skips listings that were still queued in a later stage, at worst a page is fetched again.
+    """
+
+    def __init__(self, save: Callable[[int, Optional[str]], Awaitable[None]], finish: Callable[[], Awaitable[None]]):
+        self.save = save
+        self.finish = finish
+        # (ack, page, last listing id) in fetch order, page None ends the unit
+        self.pages: Deque[tuple[Ack, Optional[int], Optional[str]]] = deque()
+        # the ack of the listings of the page being fetched
+        self.current = Ack(self._advance)
+        # pages can finish out of order, the checkpoint is advanced by one task at a time
+        self._lock = asyncio.Lock()
+
+    async def page_fetched(self, page: int, last_listing_id: Optional[str] = None) -> None:
+        await self._close_current(page, last_listing_id)
+
+    async def unit_fetched(self) -> None:
+        await self._close_current(None, None)
+
+    async def _close_current(self, page: Optional[int], last_listing_id: Optional[str]) -> None:
+        ack = self.current
+        self.pages.append((ack, page, last_listing_id))
+        self.current = Ack(self._advance)
+        await ack.close()
+
+    async def _advance(self) -> None:
+        async with self._lock:
+            last = None
+            while self.pages and self.pages[0][0].finished:
+                last = self.pages.popleft()
+            if last is None:
+                return
+            _, page, last_listing_id = last
+            if page is None:
+                await self.finish()
+            else:
+                await self.save(page, last_listing_id)
+
+
+class ScrapeCheckpoints:
+    """
+    How far the current run of every job got, per fetch unit and page.
+
+    The parsers save a checkpoint once all listings of a page went through the pipeline, see `UnitProgress`,
+    and mark a unit done when all its pages did. A run that ends, finished or failed, deletes its checkpoints,
+    they are only left behind when the process is stopped or killed during a run. A run that starts while
+    the checkpoints of an interrupted run are younger than `resume_window_minutes` skips the done units and
+    fetches the others from their last page on, listings that were already stored are dropped by the dedupe
+    stage. Older or complete checkpoints are discarded and the run starts over. Saving is best effort, a
+    failed write only costs a longer resume.
+    """
+
+    def __init__(self):
+        self.config: Optional[CheckpointConfig] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.config is not None and self.config.enabled
+
+    def configure(self, config: CheckpointConfig) -> None:
+        self.config = config
+
+    @staticmethod
+    def unit_key(unit: Any) -> str:
+        # districts are tuples, or lists when they come from the crawl queue
+        return json.dumps(list(unit) if isinstance(unit, tuple) else unit, ensure_ascii=False)
+
+    async def load(self, job: str, reset: bool = True,
+                   resume_window: Optional[timedelta] = None) -> Dict[str, ScrapeCheckpoint]:
+        """Checkpoints of an interrupted run to resume, by unit key, or none to start over."""
+        if not self.enabled:
+            return {}
+        try:
+            checkpoints = await get_scrape_checkpoints(job)
+            resume_window = resume_window or timedelta(minutes=self.config.resume_window_minutes)
+            cutoff = datetime.now(timezone.utc) - resume_window
+            if checkpoints and not all(checkpoint.done for checkpoint in checkpoints) and \
+                    max(checkpoint.updated_at for checkpoint in checkpoints) >= cutoff:
+                done = sum(checkpoint.done for checkpoint in checkpoints)
+                logger.info(f"Resuming {job}, {done} units done and {len(checkpoints) - done} partly fetched")
+                return {checkpoint.unit: checkpoint for checkpoint in checkpoints}
+            if checkpoints and reset:
+                await delete_scrape_checkpoints(job)
+        except Exception as e:
+            logger.error(f"Error loading the checkpoints of {job}: {e}")
+        return {}
+
+    async def reset(self, job: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            await delete_scrape_checkpoints(job)
+        except Exception as e:
+            logger.error(f"Error deleting the checkpoints of {job}: {e}")
+
+    async def save(self, job: str, unit: Any, page: int, last_listing_id: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        try:
+            await save_scrape_checkpoint(job, self.unit_key(unit), page, last_listing_id, False,
+                                         datetime.now(timezone.utc))
+        except Exception as e:
+            logger.error(f"Error saving the checkpoint of {job} on page {page}: {e}")
+
+    async def finish(self, job: str, unit: Any) -> None:
+        if not self.enabled:
+            return
+        try:
+            await finish_scrape_checkpoint(job, self.unit_key(unit), datetime.now(timezone.utc))
+        except Exception as e:
+            logger.error(f"Error saving the checkpoint of {job}: {e}")
+
+
+scrape_checkpoints = ScrapeCheckpoints()
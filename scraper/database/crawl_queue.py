@@ -0,0 +1,173 @@
+import asyncio
+import os
+import socket
+from datetime import timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Set
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from scraper.database.leader import leader_election
+from scraper.database.models.crawl_unit import CrawlUnit
+from scraper.database.postgres import postgres_instance
+from scraper.utils.config import CrawlQueueConfig
+from scraper.utils.logger import logger
+
+# finished units are kept this long for inspection
+FINISHED_UNIT_RETENTION = timedelta(days=1)
+
+
+class CrawlQueue:
+    """
+    Postgres backed queue of fetch units shared by all scraper replicas.
+
+    A scheduled run enqueues the job's units, e.g. its districts, and every replica with a free fetch
+    worker claims them one at a time with `FOR UPDATE SKIP LOCKED`. A claimed unit is leased for
+    `lease_seconds` and the lease is extended by a heartbeat while the replica works on it, the unit of
+    a crashed replica becomes claimable again when its lease expires, up to `max_attempts` times.
+    Replicas look for claimable units every `poll_seconds` and join the run of that job, the units carry the
+    id of the run in the ledger so the counts of all replicas end up in one row.
+    Times are taken from the database clock, the clocks of the replicas do not matter.
+    """
+
+    def __init__(self):
+        self.config: Optional[CrawlQueueConfig] = None
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        # ids of the units leased by this replica, their leases are extended by the heartbeat
+        self.held: Set[int] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.config is not None and self.config.enabled
+
+    def configure(self, config: CrawlQueueConfig) -> None:
+        self.config = config
+
+    def start(self, join: Callable[[str], Awaitable[None]]) -> None:
+        """Start the heartbeat and the poll for units of other replicas' runs, `join` runs a job by name."""
+        if not self.enabled or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._heartbeat(), name="crawl queue heartbeat"),
+                       asyncio.create_task(self._poll(join), name="crawl queue poll")]
+        logger.info(f"Sharing crawl work with other replicas as {self.worker_id}")
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def enqueue(self, job: str, source: str, deal_type: str, units: Iterable[Any],
+                      run_id: Optional[int] = None) -> int:
+        """Add the units of a new run of the job, nothing while units of its previous run are open."""
+        async with postgres_instance.SessionLocal() as db:
+            async with db.begin():
+                if not await leader_election.holds_token(db):
+                    logger.warning(f"Not adding a run of {job}, this replica is no longer the scheduler leader")
+                    return 0
+                # units whose last attempt expired are given up
+                await db.execute(update(CrawlUnit).where(
+                    CrawlUnit.job == job, CrawlUnit.status == "leased", CrawlUnit.lease_expires_at < func.now(),
+                    CrawlUnit.attempts >= self.config.max_attempts
+                ).values(status="failed", finished_at=func.now(), error="lease expired"))
+                open_units = await db.scalar(
+                    select(func.count()).select_from(CrawlUnit).where(CrawlUnit.job == job, self._open()))
+                if open_units:
+                    logger.info(f"{job} has {open_units} open crawl units, not adding a new run")
+                    return 0
+
+                await db.execute(delete(CrawlUnit).where(
+                    CrawlUnit.job == job, CrawlUnit.status.in_(("done", "failed")),
+                    CrawlUnit.finished_at < func.now() - FINISHED_UNIT_RETENTION))
+                rows = [dict(job=job, source=source, deal_type=deal_type, unit=unit, run_id=run_id, status="pending")
+                        for unit in units]
+                if rows:
+                    await db.execute(insert(CrawlUnit), rows)
+                return len(rows)
+
+    async def claim(self, job: str) -> AsyncIterator[CrawlUnit]:
+        """Claim units of the job until none are left."""
+        while True:
+            unit = await self._claim_one(job)
+            if unit is None:
+                return
+            self.held.add(unit.id)
+            yield unit
+
+    async def finish(self, unit: CrawlUnit, error: Optional[str] = None) -> None:
+        """Mark a unit done, or put it back for a retry after an error while attempts are left."""
+        self.held.discard(unit.id)
+        if error is None:
+            values = dict(status="done", finished_at=func.now(), lease_owner=None, lease_expires_at=None)
+        elif unit.attempts < self.config.max_attempts:
+            values = dict(status="pending", error=error, lease_owner=None, lease_expires_at=None)
+        else:
+            values = dict(status="failed", finished_at=func.now(), error=error)
+        try:
+            async with postgres_instance.SessionLocal() as db:
+                async with db.begin():
+                    # a replica that lost the lease must not overwrite the new owner's state
+                    await db.execute(update(CrawlUnit).where(
+                        CrawlUnit.id == unit.id, CrawlUnit.lease_owner == self.worker_id).values(**values))
+        except Exception as e:
+            logger.error(f"Error finishing crawl unit {unit.id} of {unit.job}: {e}")
+
+    def _claimable(self):
+        return and_(or_(CrawlUnit.status == "pending",
+                        and_(CrawlUnit.status == "leased", CrawlUnit.lease_expires_at < func.now())),
+                    CrawlUnit.attempts < self.config.max_attempts)
+
+    def _open(self):
+        return or_(and_(CrawlUnit.status == "leased", CrawlUnit.lease_expires_at >= func.now()), self._claimable())
+
+    async def _claim_one(self, job: str) -> Optional[CrawlUnit]:
+        lease = timedelta(seconds=self.config.lease_seconds)
+        async with postgres_instance.SessionLocal() as db:
+            async with db.begin():
+                claimable = (
+                    select(CrawlUnit.id)
+                    .where(CrawlUnit.job == job, self._claimable())
+                    .order_by(CrawlUnit.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                result = await db.execute(
+                    update(CrawlUnit)
+                    .where(CrawlUnit.id == claimable)
+                    .values(status="leased", lease_owner=self.worker_id, lease_expires_at=func.now() + lease,
+                            attempts=CrawlUnit.attempts + 1)
+                    .returning(CrawlUnit)
+                    .execution_options(synchronize_session=False))
+                return result.scalars().first()
+
+    async def _claimable_jobs(self) -> list[str]:
+        async with postgres_instance.SessionLocal() as db:
+            result = await db.execute(select(CrawlUnit.job).where(self._claimable()).distinct())
+            return list(result.scalars().all())
+
+    async def _heartbeat(self) -> None:
+        lease = timedelta(seconds=self.config.lease_seconds)
+        while True:
+            await asyncio.sleep(self.config.heartbeat_seconds)
+            if not self.held:
+                continue
+            try:
+                async with postgres_instance.SessionLocal() as db:
+                    async with db.begin():
+                        await db.execute(update(CrawlUnit).where(
+                            CrawlUnit.id.in_(list(self.held)), CrawlUnit.lease_owner == self.worker_id,
+                            CrawlUnit.status == "leased").values(lease_expires_at=func.now() + lease))
+            except Exception as e:
+                logger.error(f"Error extending crawl unit leases: {e}")
+
+    async def _poll(self, join: Callable[[str], Awaitable[None]]) -> None:
+        while True:
+            await asyncio.sleep(self.config.poll_seconds)
+            try:
+                for job in await self._claimable_jobs():
+                    await join(job)
+            except Exception as e:
+                logger.error(f"Error polling the crawl queue: {e}")
+
+
+crawl_queue = CrawlQueue()
@@ -1,17 +1,45 @@
 from datetime import datetime
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
-from sqlalchemy import cast
-from sqlalchemy.dialects.postgresql import NUMRANGE
+from sqlalchemy import Numeric, Row, bindparam, case, delete, func, null, update
+from sqlalchemy.dialects.postgresql import insert
 
 from scraper.database.models.flat import Flat
 from scraper.database.models.price import Price
 from scraper.database.models.favorite import Favourite
 from scraper.database.models.user import User
 from scraper.database.models.filter import Filter
+from scraper.database.models.scrape_run import ScrapeRun
+from scraper.database.models.scrape_checkpoint import ScrapeCheckpoint
 from scraper.database.postgres import postgres_instance
 from scraper.schemas.shared import DealType
 
+# Hot statements are built once, so that both the SQLAlchemy compiled cache
+# and the asyncpg prepared statement cache are hit on every call.
+FLAT_EXISTS_QUERY = (
+    select(Price.id)
+    .where(Price.flat_id == bindparam("flat_id"), Price.price == bindparam("price"))
+    .limit(1)
+)
+
+FLAT_PRICES_QUERY = (
+    select(Price.price, Price.updated_at)
+    .where(Price.flat_id == bindparam("flat_id"))
+    .order_by(Price.updated_at)
+)
+
+MATCHING_FILTERS_QUERY = select(Filter.tg_user_id).where(
+    Filter.city == bindparam("city"),
+    Filter.district == bindparam("district"),
+    Filter.is_active == True,
+    Filter.deal_type == bindparam("deal_type"),
+    # the values are elements of the ranges, the filters are stored with inclusive bounds
+    Filter.room_range.op("@>")(bindparam("rooms", type_=Numeric)),
+    Filter.price_range.op("@>")(bindparam("price", type_=Numeric)),
+    Filter.area_range.op("@>")(bindparam("area", type_=Numeric)),
+    Filter.floor_range.op("@>")(bindparam("floor", type_=Numeric))
+)
+
 
 async def upsert_flat(flat: Flat, price: int) -> None:
     """Insert or update a flat and add its price."""
@@ -24,6 +52,13 @@ async def upsert_flat(flat: Flat, price: int) -> None:
             await db.commit()
 
 
+async def mark_flats_seen(flat_ids: list[str], seen_at: datetime) -> None:
+    """Record that a scrape listed the flats, retention ages flats out on it."""
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(update(Flat).where(Flat.flat_id.in_(flat_ids)).values(last_seen_at=seen_at))
+
+
 async def upsert_price(flat_id: str, price: int, updated_at: datetime) -> None:
     """Insert or update a price for a flat."""
     async with postgres_instance.SessionLocal() as db:
@@ -36,15 +71,19 @@ async def upsert_price(flat_id: str, price: int, updated_at: datetime) -> None:
 
 async def flat_exists(flat_id: str, price: int) -> bool:
     """Check if a flat with the given id and price exists in the database."""
-    async with postgres_instance.SessionLocal() as db:
-        query = select(Price).where(
-            Price.flat_id == flat_id,
-            Price.price == price
-        )
-        result = await db.execute(query)
+    async with postgres_instance.engine.connect() as conn:
+        result = await conn.execute(FLAT_EXISTS_QUERY, {"flat_id": flat_id, "price": price})
         return result.scalar_one_or_none() is not None
 
 
+async def get_flat_prices(flat_id: str) -> list[Row]:
+    """Get the price history of a flat ordered by date, without loading the flat itself.
+    Rows expose `price` and `updated_at`, an empty list means the flat is not stored yet."""
+    async with postgres_instance.engine.connect() as conn:
+        result = await conn.execute(FLAT_PRICES_QUERY, {"flat_id": flat_id})
+        return result.all()
+
+
 async def get_flat(flat_id: str) -> Flat | None:
     """Get a flat by its id together with its prices."""
     async with postgres_instance.SessionLocal() as db:
@@ -132,22 +171,98 @@ async def get_matching_filters_tg_user_ids(
     floor: int
 ) -> list[int]:
     """Fetch telegram user ids for active filters that match the given city, district, deal type, and range conditions."""
+    async with postgres_instance.engine.connect() as conn:
+        result = await conn.execute(MATCHING_FILTERS_QUERY, {
+            "city": city,
+            "district": district,
+            "deal_type": deal_type.value,
+            "rooms": rooms,
+            "price": price,
+            "area": area,
+            "floor": floor,
+        })
+        return result.scalars().all()
 
-    async with postgres_instance.SessionLocal() as db:  # Open async session
-        query = select(Filter.tg_user_id).where(
-            Filter.city == city,
-            Filter.district == district,
-            Filter.is_active == True,
-            Filter.deal_type == deal_type.value,
-            # ✅ Check if `rooms` is inside `room_range`
-            Filter.room_range.op("@>")(cast((rooms, rooms), NUMRANGE)),
-            # ✅ Check if `price` is inside `price_range`
-            Filter.price_range.op("@>")(cast((price, price), NUMRANGE)),
-            # ✅ Check if `area` is inside `area_range`
-            Filter.area_range.op("@>")(cast((area, area), NUMRANGE)),
-            # ✅ Check if `floor` is inside `floor_range`
-            Filter.floor_range.op("@>")(cast((floor, floor), NUMRANGE))
-        )
 
+async def start_scrape_run(job: str, source: str, deal_type: str, started_at: datetime) -> int:
+    """Record the start of a scrape run and return its id."""
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            run = ScrapeRun(job=job, source=source, deal_type=deal_type, status="running", started_at=started_at)
+            db.add(run)
+        return run.id
+
+
+async def add_skipped_scrape_run(job: str, source: str, deal_type: str, skipped_at: datetime) -> None:
+    """Record a run that was not started because the previous run of the job was still going."""
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            db.add(ScrapeRun(job=job, source=source, deal_type=deal_type, status="skipped", started_at=skipped_at,
+                             finished_at=skipped_at, overlapped=True))
+
+
+def _added_counts(counts: dict[str, int]) -> dict:
+    return {name: getattr(ScrapeRun, name) + value for name, value in counts.items()}
+
+
+async def finish_scrape_run(run_id: int, counts: dict[str, int], **values) -> None:
+    """
+    Store the outcome of a scrape run, `values` are `ScrapeRun` columns.
+
+    `counts` (listings, new_flats, ...) are added to the ones of the replicas that joined the run.
+    """
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(update(ScrapeRun).where(ScrapeRun.id == run_id).values(**_added_counts(counts), **values))
+
+
+async def add_scrape_run_counts(run_id: int, counts: dict[str, int], finished_at: datetime) -> None:
+    """Add the counts of a replica that joined a run, a run that already finished ends with its last replica."""
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(update(ScrapeRun).where(ScrapeRun.id == run_id).values(
+                **_added_counts(counts),
+                finished_at=case((ScrapeRun.finished_at.is_(None), null()),
+                                 else_=func.greatest(ScrapeRun.finished_at, finished_at))))
+
+
+async def get_scrape_runs_since(since: datetime) -> list[ScrapeRun]:
+    """Get the scrape runs started after `since`, oldest first."""
+    async with postgres_instance.SessionLocal() as db:
+        query = select(ScrapeRun).where(ScrapeRun.started_at >= since).order_by(ScrapeRun.started_at)
         result = await db.execute(query)
         return result.scalars().all()
+
+
+async def get_scrape_checkpoints(job: str) -> list[ScrapeCheckpoint]:
+    """Get the checkpoints of every fetch unit of the job."""
+    async with postgres_instance.SessionLocal() as db:
+        result = await db.execute(select(ScrapeCheckpoint).where(ScrapeCheckpoint.job == job))
+        return result.scalars().all()
+
+
+async def save_scrape_checkpoint(job: str, unit: str, page: int, last_listing_id: str | None, done: bool,
+                                 updated_at: datetime) -> None:
+    """Insert or move forward the checkpoint of a fetch unit."""
+    values = dict(page=page, last_listing_id=last_listing_id, done=done, updated_at=updated_at)
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(insert(ScrapeCheckpoint).values(job=job, unit=unit, **values).on_conflict_do_update(
+                index_elements=[ScrapeCheckpoint.job, ScrapeCheckpoint.unit], set_=values))
+
+
+async def finish_scrape_checkpoint(job: str, unit: str, updated_at: datetime) -> None:
+    """Mark a fetch unit done, keeping its last page."""
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(insert(ScrapeCheckpoint).values(
+                job=job, unit=unit, page=0, done=True, updated_at=updated_at
+            ).on_conflict_do_update(index_elements=[ScrapeCheckpoint.job, ScrapeCheckpoint.unit],
+                                    set_=dict(done=True, updated_at=updated_at)))
+
+
+async def delete_scrape_checkpoints(job: str) -> None:
+    """Forget the progress of the job's previous run."""
+    async with postgres_instance.SessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(ScrapeCheckpoint).where(ScrapeCheckpoint.job == job))
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from scraper.database.models.leader import SchedulerLeader
+from scraper.database.postgres import postgres_instance
+from scraper.utils.config import LeaderConfig
+from scraper.utils.logger import logger
+
+LEADER_NAME = "scraper"
+# pg advisory lock key, "flat" in ascii
+LEADER_LOCK_KEY = 0x666C6174
+
+
+class LeaderElection:
+    """
+    Elects the one replica that runs the scheduler and polls telegram, the others wait as hot standbys.
+
+    A candidate holds a session advisory lock on a dedicated connection, the lock is released by postgres
+    as soon as the leader's connection or process dies. The lock alone does not tell a leader that it lost
+    its connection, so the leader also holds a lease in `scheduler_leader`, renewed over the same connection
+    every `renew_seconds`. A leader that could not renew for `lease_seconds` steps down on its own, and a new
+    leader takes over only after the old lease expired, or right away when the old leader released it on
+    stepping down or shutting down. Every election increments the fencing token,
+    writes made on behalf of the leader check it with `holds_token` so a deposed leader cannot make them.
+    """
+
+    def __init__(self):
+        self.config: Optional[LeaderConfig] = None
+        self.holder = f"{socket.gethostname()}-{os.getpid()}"
+        self.token: Optional[int] = None
+        self.is_leader = False
+        self._on_elected: Optional[Callable[[], Awaitable[None]]] = None
+        self._on_deposed: Optional[Callable[[], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.config is not None and self.config.enabled
+
+    def configure(self, config: LeaderConfig) -> None:
+        self.config = config
+
+    def start(self, on_elected: Callable[[], Awaitable[None]], on_deposed: Callable[[], Awaitable[None]]) -> None:
+        self._on_elected = on_elected
+        self._on_deposed = on_deposed
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="leader election")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def holds_token(self, db: AsyncSession) -> bool:
+        """Check in the caller's transaction that this replica is still the elected leader."""
+        if not self.enabled:
+            return True
+        token = await db.scalar(
+            select(SchedulerLeader.token).where(SchedulerLeader.name == LEADER_NAME).with_for_update(read=True))
+        return self.is_leader and token == self.token
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with postgres_instance.engine.connect() as conn:
+                    # the lock and the lease statements must not sit in an open transaction
+                    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                    try:
+                        await self._campaign(conn)
+                    finally:
+                        try:
+                            await self._step_down()
+                            await self._release_lease(conn)
+                        finally:
+                            # the connection goes back to the pool, it must not keep the lock
+                            await self._release_lock(conn)
+            except asyncio.CancelledError:
+                await self._step_down()
+                raise
+            except Exception as e:
+                logger.error(f"Leader election failed: {e}")
+            await self._step_down()
+            await asyncio.sleep(self.config.retry_seconds)
+
+    async def _campaign(self, conn: AsyncConnection) -> None:
+        while not await conn.scalar(select(func.pg_try_advisory_lock(LEADER_LOCK_KEY))):
+            await asyncio.sleep(self.config.retry_seconds)
+
+        # the previous leader may still think it leads until its lease runs out
+        while (token := await self._take_lease(conn)) is None:
+            await asyncio.sleep(self.config.retry_seconds)
+        self.token = token
+        self.is_leader = True
+        logger.info(f"Elected as the scheduler leader with token {token}")
+        await self._on_elected()
+
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.config.renew_seconds)
+            # a renew that hangs past the lease must not leave two leaders
+            timeout = max(self.config.lease_seconds - (time.monotonic() - renewed_at), 0.1)
+            try:
+                renewed = await asyncio.wait_for(self._renew_lease(conn), timeout)
+            except asyncio.TimeoutError:
+                renewed = False
+            if not renewed:
+                logger.warning(f"Lost the scheduler lease with token {token}")
+                return
+            renewed_at = time.monotonic()
+
+    async def _release_lease(self, conn: AsyncConnection) -> None:
+        """Expire the lease after stepping down, a standby takes over without waiting for it to run out."""
+        if self.token is None:
+            return
+        try:
+            await asyncio.wait_for(conn.execute(
+                update(SchedulerLeader)
+                .where(SchedulerLeader.name == LEADER_NAME, SchedulerLeader.holder == self.holder,
+                       SchedulerLeader.token == self.token)
+                .values(lease_expires_at=func.now())), self.config.retry_seconds)
+        except Exception as e:
+            logger.warning(f"Could not release the scheduler lease with token {self.token}: {e!r}")
+
+    async def _release_lock(self, conn: AsyncConnection) -> None:
+        try:
+            await asyncio.wait_for(conn.scalar(select(func.pg_advisory_unlock(LEADER_LOCK_KEY))),
+                                   self.config.retry_seconds)
+        except asyncio.CancelledError:
+            await conn.invalidate()
+            raise
+        except Exception as e:
+            # a connection that cannot unlock is closed instead of pooled, postgres then drops the lock
+            logger.warning(f"Closing the leader election connection, could not release the lock: {e!r}")
+            await conn.invalidate()
+
+    async def _take_lease(self, conn: AsyncConnection) -> Optional[int]:
+        lease = func.now() + timedelta(seconds=self.config.lease_seconds)
+        statement = insert(SchedulerLeader).values(
+            name=LEADER_NAME, holder=self.holder, token=1, lease_expires_at=lease, elected_at=func.now())
+        statement = statement.on_conflict_do_update(
+            index_elements=[SchedulerLeader.name],
+            set_=dict(holder=self.holder, token=SchedulerLeader.token + 1, lease_expires_at=lease,
+                      elected_at=func.now()),
+            where=or_(SchedulerLeader.lease_expires_at < func.now(), SchedulerLeader.holder == self.holder)
+        ).returning(SchedulerLeader.token)
+        return await conn.scalar(statement)
+
+    async def _renew_lease(self, conn: AsyncConnection) -> bool:
+        lease = func.now() + timedelta(seconds=self.config.lease_seconds)
+        result = await conn.execute(
+            update(SchedulerLeader)
+            .where(SchedulerLeader.name == LEADER_NAME, SchedulerLeader.holder == self.holder,
+                   SchedulerLeader.token == self.token)
+            .values(lease_expires_at=lease))
+        return result.rowcount == 1
+
+    async def _step_down(self) -> None:
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        logger.warning(f"Stepping down as the scheduler leader with token {self.token}")
+        try:
+            await self._on_deposed()
+        except Exception as e:
+            logger.error(f"Error stepping down as the scheduler leader: {e}")
+
+
+leader_election = LeaderElection()
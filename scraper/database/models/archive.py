@@ -0,0 +1,46 @@
+from geoalchemy2 import Geometry
+from sqlalchemy import DECIMAL, TIMESTAMP, Column, Index, Integer, SmallInteger, String, Text, func
+from scraper.database.postgres import postgres_instance
+
+
+class FlatArchive(postgres_instance.Base):
+    """Flats moved out of the hot `flats` table by the retention job. Image data is not archived."""
+    __tablename__ = "flats_archive"
+
+    flat_id = Column(String(255), primary_key=True)
+    source = Column(String(30), nullable=False)
+    deal_type = Column(String(30), nullable=False)
+    url = Column(Text, nullable=False)
+    district = Column(String(100), nullable=False)
+    city = Column(String(50), nullable=True)
+    street = Column(String(150), nullable=False)
+    rooms = Column(SmallInteger, nullable=False)
+    floors_total = Column(SmallInteger, nullable=False)
+    floor = Column(SmallInteger, nullable=False)
+    area = Column(DECIMAL(5, 2), nullable=False)
+    series = Column(Text, nullable=False)
+    location = Column(Geometry("POINT", srid=4326, spatial_index=False))
+    created_at = Column(TIMESTAMP(timezone=True))
+    archived_at = Column(TIMESTAMP(timezone=True),
+                         server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_flat_archive_source_deal_type",
+              source, deal_type),
+    )
+
+
+class PriceArchive(postgres_instance.Base):
+    """Price history of archived flats, ids are kept from the `prices` table."""
+    __tablename__ = "prices_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    flat_id = Column(String(255), nullable=False)
+    price = Column(Integer, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    archived_at = Column(TIMESTAMP(timezone=True),
+                         server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_price_archive_flat_id", flat_id),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import TIMESTAMP, Column, Index, Integer, String, Text, func
+from sqlalchemy.dialects.postgresql import JSONB
+from scraper.database.postgres import postgres_instance
+
+
+class CrawlUnit(postgres_instance.Base):
+    """A unit of fetch work of a scrape job, e.g. one district, claimed by any scraper replica."""
+    __tablename__ = "crawl_units"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job = Column(String(50), nullable=False)
+    source = Column(String(30), nullable=False)
+    deal_type = Column(String(30), nullable=False)
+    unit = Column(JSONB, nullable=False)  # the argument of the parser's `fetch`
+    # the scrape_runs row of the run that added the unit, replicas joining the run add their counts to it
+    run_id = Column(Integer, nullable=True)
+    status = Column(String(20), nullable=False)  # pending / leased / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String(100), nullable=True)
+    # the unit is retried by any replica once the lease expires without a heartbeat
+    lease_expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("idx_crawl_unit_job_status", job, status),
+    )
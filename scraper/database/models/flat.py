@@ -28,6 +28,8 @@ class Flat(postgres_instance.Base):
     image_data = Column(BYTEA, default=b"")  # Binary data for images
     created_at = Column(TIMESTAMP(timezone=True),
                         server_default=func.now())
+    # the last scrape that listed the flat, whether or not its price changed
+    last_seen_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
 
     # Relationship with prices table
     prices: Mapped[List["Price"]] = relationship("Price", back_populates="flat",
@@ -39,6 +41,7 @@ class Flat(postgres_instance.Base):
 
     __table_args__ = (
         Index("idx_flat_location", location, postgresql_using="GIST"),
+        Index("idx_flat_last_seen_at", last_seen_at),
         CheckConstraint("floor <= floors_total",
                         name="floor_vs_total_floor_check"),
         CheckConstraint("rooms > 0", name="rooms_check"),
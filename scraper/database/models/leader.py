@@ -0,0 +1,14 @@
+from sqlalchemy import TIMESTAMP, BigInteger, Column, String
+from scraper.database.postgres import postgres_instance
+
+
+class SchedulerLeader(postgres_instance.Base):
+    """The replica that owns the scheduler and telegram polling, with its lease and fencing token."""
+    __tablename__ = "scheduler_leader"
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(100), nullable=False)
+    # incremented on every election, writes of a deposed leader carry an older token
+    token = Column(BigInteger, nullable=False)
+    lease_expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    elected_at = Column(TIMESTAMP(timezone=True), nullable=False)
@@ -0,0 +1,14 @@
+from sqlalchemy import TIMESTAMP, Boolean, Column, Integer, String, Text
+from scraper.database.postgres import postgres_instance
+
+
+class ScrapeCheckpoint(postgres_instance.Base):
+    """How far a scrape job got in one fetch unit, a restarted run resumes from here."""
+    __tablename__ = "scrape_checkpoints"
+
+    job = Column(String(50), primary_key=True)
+    unit = Column(Text, primary_key=True)  # the fetch unit as JSON, e.g. a district
+    page = Column(Integer, nullable=False)  # the last page handed to the pipeline, in the source's numbering
+    last_listing_id = Column(String(255), nullable=True)
+    done = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False)
@@ -0,0 +1,33 @@
+from sqlalchemy import TIMESTAMP, Boolean, Column, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from scraper.database.postgres import postgres_instance
+
+
+class ScrapeRun(postgres_instance.Base):
+    """One run of a scheduled scrape job with its counts, added up over the replicas that fetched it."""
+    __tablename__ = "scrape_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job = Column(String(50), nullable=False)
+    source = Column(String(30), nullable=False)
+    deal_type = Column(String(30), nullable=False)
+    status = Column(String(20), nullable=False)  # running / finished / failed / skipped
+    started_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    listings = Column(Integer, nullable=False, default=0)
+    new_flats = Column(Integer, nullable=False, default=0)
+    updated_flats = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)  # unchanged listings
+    failed = Column(Integer, nullable=False, default=0)  # items dropped by errors in any stage
+    notifications = Column(Integer, nullable=False, default=0)
+    requests = Column(Integer, nullable=False, default=0)  # http requests to the source
+    stage_seconds = Column(JSONB, nullable=True)  # {stage: busy seconds} of the replica that started the run
+    # due while the previous run of the job was still going, the run is skipped
+    overlapped = Column(Boolean, nullable=False, default=False)
+    # still running when the next run of the job was due
+    overran_slot = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("idx_scrape_run_job_started_at", job, started_at),
+    )
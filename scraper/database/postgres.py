@@ -1,8 +1,39 @@
 import os
+import time
+import logging
+from dataclasses import dataclass
+from shared_instrumentation import QueryInstrumentation
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    wait_time: float = 0.0  # total seconds spent waiting for a connection
+    max_wait_time: float = 0.0
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how often and how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # per pool, every engine of the process has its own counters
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            self.stats.checkouts += 1
+            self.stats.wait_time += waited
+            self.stats.max_wait_time = max(self.stats.max_wait_time, waited)
 
 
 class PostgresDb:
@@ -11,7 +42,28 @@ class PostgresDb:
 
         # echo=True will print all SQL queries
         self.engine: Engine = create_async_engine(
-            self.url, pool_pre_ping=True, echo=False, pool_use_lifo=True)
+            self.url,
+            echo=False,
+            pool_use_lifo=True,
+            poolclass=InstrumentedQueuePool,
+            pool_size=int(os.getenv("POSTGRES_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("POSTGRES_MAX_OVERFLOW", 10)),
+            pool_recycle=int(os.getenv("POSTGRES_POOL_RECYCLE", 1800)),
+            # a ping costs a round trip per checkout, stale connections are handled by pool_recycle
+            pool_pre_ping=os.getenv(
+                "POSTGRES_POOL_PRE_PING", "false").lower() == "true",
+            # asyncpg prepares every statement, keep the hot ones cached per connection
+            connect_args={"prepared_statement_cache_size": int(
+                os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", 500))},
+        )
+
+        self.query_stats = QueryInstrumentation(
+            logging.getLogger("scraper.database"),
+            slow_query_ms=float(os.getenv("DB_SLOW_QUERY_MS", 500)),
+            explain_slow_queries=os.getenv(
+                "DB_EXPLAIN_SLOW_QUERIES", "false").lower() == "true",
+        )
+        self.query_stats.instrument(self.engine)
 
         self.SessionLocal: sessionmaker[AsyncSession] = sessionmaker(
             bind=self.engine,
@@ -36,6 +88,20 @@ class PostgresDb:
             # Create all tables defined in self.Base metadata
             await conn.run_sync(self.Base.metadata.create_all)
 
+    def pool_stats(self) -> dict[str, int | float]:
+        """Get the connection pool usage and checkout wait statistics."""
+        pool: InstrumentedQueuePool = self.engine.pool
+        stats = pool.stats
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": stats.checkouts,
+            "wait_time": round(stats.wait_time, 4),
+            "avg_wait_time": round(stats.wait_time / stats.checkouts, 6) if stats.checkouts else 0.0,
+            "max_wait_time": round(stats.max_wait_time, 4),
+        }
+
 
 # Create a singleton instance of PostgresDb
 postgres_instance = PostgresDb()
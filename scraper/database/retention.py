@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, exists, func, insert, select, update
+
+from scraper.database.models.flat import Flat
+from scraper.database.models.price import Price
+from scraper.database.models.favorite import Favourite
+from scraper.database.models.archive import FlatArchive, PriceArchive
+from scraper.database.cache import known_flat_cache
+from scraper.database.postgres import postgres_instance
+from scraper.utils.config import RetentionConfig, RetentionPolicy
+from scraper.utils.logger import logger
+
+ARCHIVED_FLAT_COLUMNS = ["flat_id", "source", "deal_type", "url", "district", "city", "street",
+                         "rooms", "floors_total", "floor", "area", "series", "location", "created_at"]
+
+
+class RetentionJob:
+    """
+    Archives expired flats together with their prices and drops image bytes of old flats.
+
+    Every batch runs in its own short transaction and locks rows with `SKIP LOCKED`,
+    so the scrapers can keep writing while the job is running.
+    """
+
+    def __init__(self, config: RetentionConfig):
+        self.config = config
+
+    async def run(self) -> None:
+        if not self.config.enabled:
+            return
+
+        for policy in self.config.policies:
+            try:
+                archived = await self.archive_expired_flats(policy)
+                logger.info(
+                    f"Archived {archived} flats for source {policy.source} and deal type {policy.deal_type}")
+            except Exception as e:
+                logger.error(
+                    f"Error archiving flats for source {policy.source} and deal type {policy.deal_type}: {e}")
+
+        try:
+            dropped = await self.drop_stale_images()
+            logger.info(f"Dropped image data for {dropped} flats")
+        except Exception as e:
+            logger.error(f"Error dropping stale images: {e}")
+
+    async def archive_expired_flats(self, policy: RetentionPolicy) -> int:
+        """Move flats that no scrape listed within the policy window to the archive tables."""
+        cutoff = datetime.now(timezone.utc) - \
+            timedelta(days=policy.max_age_days)
+        total = 0
+        while True:
+            archived = await self._archive_batch(policy, cutoff)
+            total += archived
+            if archived < self.config.batch_size:
+                return total
+
+    async def _archive_batch(self, policy: RetentionPolicy, cutoff: datetime) -> int:
+        query = (
+            select(Flat.flat_id)
+            .where(
+                Flat.deal_type == policy.deal_type,
+                # not the latest price, that is dated by the listing and an unchanged listing is still active
+                Flat.last_seen_at < cutoff,
+                # archiving would cascade delete user favourites
+                ~exists().where(Favourite.flat_id == Flat.flat_id)
+            )
+            .limit(self.config.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if policy.source != "*":
+            query = query.where(Flat.source == policy.source)
+
+        async with postgres_instance.SessionLocal() as db:
+            async with db.begin():
+                flat_ids = (await db.execute(query)).scalars().all()
+                if not flat_ids:
+                    return 0
+
+                await db.execute(
+                    insert(PriceArchive).from_select(
+                        ["id", "flat_id", "price", "updated_at"],
+                        select(Price.id, Price.flat_id, Price.price, Price.updated_at)
+                        .where(Price.flat_id.in_(flat_ids))
+                    )
+                )
+
+                # a flat can come back on the market and expire again
+                await db.execute(
+                    delete(FlatArchive).where(FlatArchive.flat_id.in_(flat_ids)))
+                await db.execute(
+                    insert(FlatArchive).from_select(
+                        ARCHIVED_FLAT_COLUMNS,
+                        select(*[getattr(Flat, column) for column in ARCHIVED_FLAT_COLUMNS])
+                        .where(Flat.flat_id.in_(flat_ids))
+                    )
+                )
+
+                # prices are removed by the ON DELETE CASCADE
+                await db.execute(delete(Flat).where(Flat.flat_id.in_(flat_ids)))
+
+        # a relisted flat must not be skipped as unchanged
+        for flat_id in flat_ids:
+            known_flat_cache.discard(flat_id)
+
+        return len(flat_ids)
+
+    async def drop_stale_images(self) -> int:
+        """Clear image bytes of old flats that are not in anyone's favourites."""
+        cutoff = datetime.now(timezone.utc) - \
+            timedelta(days=self.config.image_max_age_days)
+        total = 0
+        while True:
+            stale_ids = (
+                select(Flat.flat_id)
+                .where(
+                    Flat.created_at < cutoff,
+                    func.octet_length(Flat.image_data) > 0,
+                    ~exists().where(Favourite.flat_id == Flat.flat_id)
+                )
+                .limit(self.config.batch_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            async with postgres_instance.SessionLocal() as db:
+                async with db.begin():
+                    result = await db.execute(
+                        update(Flat)
+                        .where(Flat.flat_id.in_(stale_ids))
+                        .values(image_data=b"")
+                        .execution_options(synchronize_session=False)
+                    )
+            total += result.rowcount
+            if result.rowcount < self.config.batch_size:
+                return total
@@ -4,6 +4,7 @@ import asyncio
 import pytz
 from pathlib import Path
 
+from shared_instrumentation.query_stats import LATENCY_BUCKETS_MS
 from scraper.database.postgres import postgres_instance
 from scraper.schemas.shared import DealType
 from scraper.utils.limiter import RateLimiterQueue
@@ -15,7 +16,17 @@ from scraper.parsers.varianti import VariantiParser
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from scraper.utils.telegram import TelegramBot
 from scraper.parsers.pp import PardosanasPortalsParser
-from scraper.utils.config import Config, ParserConfigs, PpParserConfig, SsParserConfig, City24ParserConfig, TelegramConfig, VariantiParserConfig
+from scraper.database.retention import RetentionJob
+from scraper.database.cache import known_flat_cache
+from scraper.database.crawl_queue import crawl_queue
+from scraper.database.leader import leader_election
+from scraper.database.checkpoints import scrape_checkpoints
+from scraper.utils.executor import parse_executor
+from scraper.utils.profiler import scrape_profiler
+from scraper.utils.watchdog import loop_watchdog
+from scraper.utils.scheduler import FIXED_SCHEDULE_HOURS, AdaptiveScheduler
+from scraper.utils.metrics import MetricsServer, metrics
+from scraper.utils.config import CacheConfig, Config, ExecutorConfig, MetricsConfig, ParserConfigs, ProfilerConfig, WatchdogConfig, SchedulerConfig, CrawlQueueConfig, LeaderConfig, CheckpointConfig, BackfillConfig, PipelineConfig, PpParserConfig, RetentionConfig, RetentionPolicy, SsParserConfig, City24ParserConfig, TelegramConfig, VariantiParserConfig
 
 
 class FlatsParser(metaclass=SingletonMeta):
@@ -24,9 +35,10 @@ class FlatsParser(metaclass=SingletonMeta):
         self.tg_rate_limiter = RateLimiterQueue(rate=30, per=1, buffer=0.2)
         self.telegram_bot = TelegramBot(self.tg_rate_limiter)
         self.scheduler = AsyncIOScheduler()
+        self.metrics_server = MetricsServer(metrics)
 
-    def load_config(self):
-        config_path = Path("/app/config.toml")
+    @staticmethod
+    def load_config(config_path: Path = Path("/app/config.toml")) -> Config:
         with open(config_path, "r", encoding="utf-8") as file:
             data = toml.load(file)
 
@@ -40,13 +52,50 @@ class FlatsParser(metaclass=SingletonMeta):
             varianti=VariantiParserConfig(**parsers_data["varianti"])
         )
 
-        return Config(telegram=telegram, parsers=parsers, version=data["version"], name=data["name"])
+        retention_data = data["retention"]
+        retention = RetentionConfig(
+            enabled=retention_data["enabled"],
+            batch_size=retention_data["batch_size"],
+            image_max_age_days=retention_data["image_max_age_days"],
+            policies=[RetentionPolicy(**policy)
+                      for policy in retention_data.get("policies", [])]
+        )
+
+        cache = CacheConfig(**data["cache"])
+        pipeline = PipelineConfig(**data["pipeline"])
+        executor = ExecutorConfig(**data["executor"])
+        metrics_config = MetricsConfig(**data["metrics"])
+        profiler = ProfilerConfig(**data["profiler"])
+        watchdog = WatchdogConfig(**data["watchdog"])
+        scheduler = SchedulerConfig(**data["scheduler"])
+        crawl_queue_config = CrawlQueueConfig(**data["crawl_queue"])
+        leader = LeaderConfig(**data["leader"])
+        checkpoints = CheckpointConfig(**data["checkpoints"])
+        backfill = BackfillConfig(**data["backfill"])
+
+        return Config(telegram=telegram, parsers=parsers, retention=retention, cache=cache, pipeline=pipeline,
+                      executor=executor, metrics=metrics_config, profiler=profiler, watchdog=watchdog,
+                      scheduler=scheduler, crawl_queue=crawl_queue_config, leader=leader,
+                      checkpoints=checkpoints, backfill=backfill, version=data["version"], name=data["name"])
 
     async def run(self):
+        # the parse workers are started before the scrapers need them
+        parse_executor.configure(self.config.executor)
+        loop_watchdog.start(self.config.watchdog)
         self.tg_rate_limiter.start()
-        asyncio.create_task(self.telegram_bot.start_polling())
         await postgres_instance.init_db()
 
+        scrape_profiler.configure(self.config.profiler)
+        known_flat_cache.configure(self.config.cache)
+        crawl_queue.configure(self.config.crawl_queue)
+        leader_election.configure(self.config.leader)
+        scrape_checkpoints.configure(self.config.checkpoints)
+        await known_flat_cache.warm()
+
+        if self.config.metrics.enabled:
+            self.register_metrics()
+            await self.metrics_server.start(self.config.metrics.host, self.config.metrics.port)
+
         self.scheduler.configure(timezone=pytz.timezone("Europe/Riga"))
 
         admin_tg_id = os.getenv("ADMIN_TELEGRAM_ID")
@@ -55,70 +104,135 @@ class FlatsParser(metaclass=SingletonMeta):
                 f"Bot with version {self.config.version} started", admin_tg_id)
 
         ss_rent = SludinajumuServissParser(
-            self.telegram_bot, self.config.parsers.ss, DealType.RENT)
+            self.telegram_bot, self.config.parsers.ss, DealType.RENT, self.config.pipeline)
 
         ss_sell = SludinajumuServissParser(self.telegram_bot,
-                                           self.config.parsers.ss, DealType.SELL)
+                                           self.config.parsers.ss, DealType.SELL, self.config.pipeline)
 
         city24_rent = City24Parser(self.telegram_bot,
-                                   self.config.parsers.city24, DealType.RENT)
+                                   self.config.parsers.city24, DealType.RENT, self.config.pipeline)
 
         city24_sell = City24Parser(self.telegram_bot,
-                                   self.config.parsers.city24, DealType.SELL)
+                                   self.config.parsers.city24, DealType.SELL, self.config.pipeline)
 
         pp_rent = PardosanasPortalsParser(
-            self.telegram_bot, self.config.parsers.pp, DealType.RENT)
+            self.telegram_bot, self.config.parsers.pp, DealType.RENT, self.config.pipeline)
 
         pp_sell = PardosanasPortalsParser(
-            self.telegram_bot, self.config.parsers.pp, DealType.SELL)
+            self.telegram_bot, self.config.parsers.pp, DealType.SELL, self.config.pipeline)
 
         varianti_sell = VariantiParser(
-            self.telegram_bot, self.config.parsers.varianti, DealType.SELL)
+            self.telegram_bot, self.config.parsers.varianti, DealType.SELL, self.config.pipeline)
 
         varianti_rent = VariantiParser(
-            self.telegram_bot, self.config.parsers.varianti, DealType.RENT)
+            self.telegram_bot, self.config.parsers.varianti, DealType.RENT, self.config.pipeline)
 
         loop = asyncio.get_running_loop()
 
+        jobs = [("SS_Sell", ss_sell), ("SS_Rent", ss_rent), ("City24_Sell", city24_sell), ("City24_Rent", city24_rent),
+                ("PP_Sell", pp_sell), ("PP_Rent", pp_rent), ("Varianti_Sell", varianti_sell),
+                ("Varianti_Rent", varianti_rent)]
+        parsers_by_job = dict(jobs)
+
+        async def join_run(job: str) -> None:
+            # help with the units of a run another replica started
+            parser = parsers_by_job.get(job)
+            if parser is not None and parser.active_runs == 0:
+                await parser.run(enqueue=False)
+
+        crawl_queue.start(join_run)
+
+        if self.config.scheduler.adaptive:
+            adaptive_scheduler = AdaptiveScheduler(self.scheduler, self.config.scheduler)
+            for name, parser in jobs:
+                adaptive_scheduler.add(name, parser, loop)
+            await adaptive_scheduler.replan()
+            self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
+                adaptive_scheduler.replan(), loop), "interval", minutes=self.config.scheduler.replan_minutes,
+                name="Scheduler")
+        else:
+            for index, (name, parser) in enumerate(jobs):
+                parser.job = self.scheduler.add_job(
+                    lambda parser=parser: asyncio.run_coroutine_threadsafe(parser.run(), loop), "cron",
+                    hour=FIXED_SCHEDULE_HOURS, minute=3 * index, name=name)
+
+        retention = RetentionJob(self.config.retention)
+
+        # run at night, when the fewest flats are scraped
         self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            ss_sell.run(), loop), "cron", hour="9,12,15,18,21", minute=0, name="SS_Sell")
-
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            ss_rent.run(), loop), "cron", hour="9,12,15,18,21", minute=3, name="SS_Rent")
+            retention.run(), loop), "cron", hour=4, minute=0, name="Retention")
 
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            city24_sell.run(), loop), "cron", hour="9,12,15,18,21", minute=6, name="City24_Sell")
-
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            city24_rent.run(), loop), "cron", hour="9,12,15,18,21", minute=9, name="City24_Rent")
+        if leader_election.enabled:
+            # only the elected replica runs the jobs and polls telegram, the others are standbys
+            leader_election.start(self.lead, self.step_down)
+        else:
+            await self.lead()
 
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            pp_sell.run(), loop), "cron", hour="9,12,15,18,21", minute=12, name="PP_Sell")
-
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            pp_rent.run(), loop), "cron", hour="9,12,15,18,21", minute=15, name="PP_Rent")
-
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            varianti_sell.run(), loop), "cron", hour="9,12,15,18,21", minute=18, name="Varianti_Sell")
-
-        self.scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(
-            varianti_rent.run(), loop), "cron", hour="9,12,15,18,21", minute=21, name="Varianti_Rent")
-
-        self.scheduler.start()
+        try:
+            while True:
+                await asyncio.sleep(1)
+        finally:
+            # asyncio.run cancels this task on Ctrl-C or when the loop is stopped
+            await self.cleanup()
+
+    async def lead(self):
+        """Run the scheduled jobs and answer the bot's users."""
+        asyncio.create_task(self.telegram_bot.start_polling(), name="telegram polling")
+        if self.scheduler.running:
+            self.scheduler.resume()
+        else:
+            self.scheduler.start()
 
         for job in self.scheduler.get_jobs():
             logger.info(
                 f"Job {job.id} scheduled to run at {job.next_run_time}")
 
-        try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            self.cleanup()
+    async def step_down(self):
+        """Another replica leads, runs already started are finished."""
+        self.scheduler.pause()
+        await self.telegram_bot.stop_polling()
+
+    def register_metrics(self):
+        """Export the state kept outside of the metrics registry, read on every scrape of /metrics."""
+        metrics.gauge("telegram_queue_depth", "Telegram messages waiting in the rate limiter queue").set_function(
+            self.tg_rate_limiter.queue.qsize)
+
+        def db_pool_samples():
+            stats = postgres_instance.pool_stats()
+            return [("", {"state": state}, stats[state]) for state in ("size", "checked_out", "overflow")]
+
+        def db_pool_wait_samples():
+            return [("_total", {}, postgres_instance.pool_stats()["wait_time"])]
+
+        def db_query_samples():
+            # the histograms of all statement fingerprints added together
+            snapshot = postgres_instance.query_stats.snapshot()
+            counts = [sum(counts) for counts in zip(*(stats.buckets for stats in snapshot))] or \
+                [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            samples = []
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS + (None,), counts):
+                cumulative += count
+                samples.append(("_bucket", {"le": str(bound / 1000) if bound else "+Inf"}, cumulative))
+            samples.append(("_sum", {}, sum(stats.total_ms for stats in snapshot) / 1000))
+            samples.append(("_count", {}, cumulative))
+            return samples
+
+        metrics.callback("db_pool_connections", "Database pool connections by state", "gauge", db_pool_samples)
+        metrics.callback("db_pool_wait_seconds", "Time spent waiting for a database connection", "counter",
+                         db_pool_wait_samples)
+        metrics.callback("db_query_seconds", "Database query duration", "histogram", db_query_samples)
 
     async def cleanup(self):
-        self.scheduler.shutdown()
-        await self.telegram_bot.send_text_msg_with_limiter("Performed cleanup")
+        # first, a standby takes over once the lease is released
+        await leader_election.stop()
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        loop_watchdog.stop()
+        crawl_queue.stop()
+        await self.metrics_server.stop()
+        parse_executor.shutdown()
+        logger.info("Performed cleanup")
 
 
 if __name__ == "__main__":
@@ -1,23 +1,179 @@
 import json
-from typing import Dict
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 import asyncio
+import time
+import aiohttp
+from sqlalchemy import Row
 
-from scraper.schemas.shared import DealType
-from scraper.utils.config import PlatformMapping, Settings, Source
+from scraper.database.bulk import BulkFlat, BulkLoader, BulkLoadStats
+from scraper.database.cache import known_flat_cache
+from scraper.database.checkpoints import UnitProgress, scrape_checkpoints
+from scraper.database.crawl_queue import crawl_queue
+from scraper.database.models.crawl_unit import CrawlUnit
+from scraper.database.models.scrape_checkpoint import ScrapeCheckpoint
+from scraper.database.crud import (add_scrape_run_counts, add_skipped_scrape_run, finish_scrape_run,
+                                   get_flat_prices, get_matching_filters_tg_user_ids, mark_flats_seen,
+                                   start_scrape_run, upsert_flat)
+from scraper.database.postgres import postgres_instance
+from scraper.parsers.flat.base import Flat, utc_now
+from scraper.parsers.pipeline import Pipeline, Stage, Tracked
+from scraper.schemas.shared import UNKNOWN, DealType
+from scraper.utils.config import BackfillConfig, PipelineConfig, PlatformMapping, Settings, Source
+from scraper.utils.limiter import RequestThrottle
 from scraper.utils.logger import logger
+from scraper.utils.meta import find_flat_price
+from scraper.utils.metrics import (http_connection_wait_seconds, http_request_seconds, http_requests,
+                                   http_requests_in_flight, http_response_bytes, matched_subscribers)
+from scraper.utils.profiler import scrape_profiler
+from scraper.utils.telegram import MessageType, TelegramBot
 
-UNKNOWN = "Nezināms"
+
+# flats per `last_seen_at` update
+SEEN_BATCH_SIZE = 1000
+
+
+@dataclass
+class FlatUpdate:
+    """A parsed flat on its way through the pipeline stages."""
+    flat: Flat
+    img_url: Optional[str] = None
+    existing_prices: List[Row] = field(default_factory=list)
+    subscribers: List[int] = field(default_factory=list)
+    # earlier prices from the listing, only read in a backfill
+    price_history: List[tuple[datetime, int]] = field(default_factory=list)
+
+
+@dataclass
+class RunCounts:
+    """Outcomes of a scrape that the pipeline stages do not count on their own."""
+    new_flats: int = 0
+    updated_flats: int = 0
+    notifications: int = 0
+    requests: int = 0  # http requests to the source, pages and images
 
 
 class BaseParser:
-    def __init__(self, source: Source, deal_type: DealType):
+    """
+    Scrapes a source through a pipeline of fetch -> parse -> dedupe -> image -> persist -> match -> notify.
+
+    Subclasses provide the source specific parts: `create_session`, `fetch_units`, `fetch` and `parse`.
+    In a backfill (`run_backfill`) `fetch` walks all active listings instead of the recent ones, and the
+    flats go through fetch -> parse -> dedupe -> image -> load into the bulk loader, nobody is notified.
+    """
+
+    def __init__(self, source: Source, deal_type: DealType, telegram_bot: TelegramBot, pipeline_config: PipelineConfig):
         self.source = source
         self.deal_type = deal_type
+        self.telegram_bot = telegram_bot
+        self.pipeline_config = pipeline_config
         self.cities, self.districts, self.flat_series, self.platform_deal_type = self.get_settings()
-        self.semaphore = asyncio.Semaphore(15)
+        self.city_name: str = UNKNOWN
+        self.session: Optional[aiohttp.ClientSession] = None
+        # the pipeline of the last scrape, kept for its stage statistics
+        self.pipeline: Optional[Pipeline] = None
+        self.counts = RunCounts()
+        # listed flats whose `last_seen_at` is not written yet
+        self.seen_flat_ids: set[str] = set()
+        # checkpoints of the interrupted run this scrape resumes, by unit key
+        self.checkpoints: Dict[str, ScrapeCheckpoint] = {}
+        # the units being fetched, by unit key
+        self.progress: Dict[str, UnitProgress] = {}
+        # set for a backfill, the sources then skip their date filters
+        self.backfill: Optional[BackfillConfig] = None
+        self.throttle: Optional[RequestThrottle] = None
+        self.loader: Optional[BulkLoader] = None
+        # checkpoints of a backfill whose listings wait in the bulk loader, (unit, page or None when done, id)
+        self.unflushed_checkpoints: List[tuple[Any, Optional[int], Optional[str]]] = []
+        # the scheduler job running this parser, set by the scheduler, its name is used in the run ledger
+        self.job = None
+        self.active_runs = 0
+        # the ledger row of the run whose crawl units this replica fetched, set when it joined another run
+        self.joined_run_id: Optional[int] = None
+
+    @property
+    def job_name(self) -> str:
+        name = self.job.name if self.job is not None else f"{self.source.value}/{self.deal_type.value}"
+        # a backfill keeps its own checkpoints, next to the ones of the scheduled runs
+        return f"{name} backfill" if self.backfill is not None else name
+
+    async def run(self, enqueue: bool = True):
+        """
+        Start a run, with the crawl queue the units are added for all replicas unless `enqueue` is off.
+
+        Without `enqueue` the run joins the one that added the units, its counts go to that run's ledger row.
+        """
+        asyncio.create_task(self._scrape_and_report(enqueue), name=self.job_name)
+
+    async def run_backfill(self, config: BackfillConfig, restart: bool = False) -> BulkLoadStats:
+        """
+        Load all active listings of the source regardless of their date, e.g. for a new deployment or city.
+
+        Requests are throttled to `requests_per_second`, an interrupted backfill resumes from its checkpoints
+        unless `restart` is set. Flats are written with the bulk loader, without notifications, and a
+        checkpoint is only saved once the batch holding the listings of its page is written.
+        """
+        self.backfill = config
+        self.throttle = RequestThrottle(config.requests_per_second)
+        self.loader = BulkLoader(config.batch_size)
+        self.unflushed_checkpoints = []
+        if restart:
+            await scrape_checkpoints.reset(self.job_name)
+        try:
+            await self.scrape()
+        finally:
+            # what is loaded so far is kept when the backfill is stopped
+            await self.loader.flush()
+            await self.save_flushed_checkpoints()
+        return self.loader.stats
+
+    async def _scrape_and_report(self, enqueue: bool = True):
+        # checked and taken without an await in between, two runs of a job never overlap
+        if self.active_runs > 0:
+            if enqueue:
+                logger.warning(f"Skipping {self.job_name}, its previous run is still going")
+                await self._skip_run(utc_now())
+            return
+        self.active_runs += 1
+        # nothing of the previous run is counted when this one ends before scraping
+        self.pipeline = None
+        self.counts = RunCounts()
+        self.joined_run_id = None
+        started_at = utc_now()
+        run_id = await self._start_run(started_at) if enqueue else None
 
-    async def run(self):
-        asyncio.create_task(self.scrape())
+        error = None
+        try:
+            if crawl_queue.enabled and enqueue and not await self._enqueue(run_id):
+                # the units of the previous run are still open, this run helps with them and is recorded as skipped
+                logger.warning(f"Skipping {self.job_name}, joining its previous run that is still going on the replicas")
+                await self._finish_run(run_id, None, status="skipped", finished_at=started_at, overlapped=True)
+                run_id = None
+            async with scrape_profiler.profile(self.job_name):
+                await self.scrape()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Scraping {self.job_name} failed: {e}", extra={"repeat_key": type(e).__name__})
+        finally:
+            self.active_runs -= 1
+        if not crawl_queue.enabled:
+            # the run was not interrupted, units that failed are fetched again from the start by the next one.
+            # With the crawl queue other replicas may still fetch this run, the next enqueue resets it.
+            await scrape_checkpoints.reset(self.job_name)
+        if run_id is not None:
+            await self._finish_run(run_id, error)
+        elif self.joined_run_id is not None:
+            await self._add_to_run(self.joined_run_id)
+
+        logger.info(
+            f"Finished scraping {self.source.value} for {self.deal_type.value}, db pool: {postgres_instance.pool_stats()}")
+        postgres_instance.query_stats.log_summary()
+        try:
+            await known_flat_cache.verify()
+        except Exception as e:
+            logger.error(f"Error verifying known flat cache: {e}")
 
     def get_settings(self) -> tuple[Dict[str, str], Dict[str, str], Dict[str, str], str]:
         """Get the settings from the settings.json file.
@@ -72,5 +228,334 @@ class BaseParser:
 
         return mapped_dict
 
+    async def _start_run(self, started_at: datetime) -> Optional[int]:
+        try:
+            return await start_scrape_run(self.job_name, self.source.value, self.deal_type.value, started_at)
+        except Exception as e:
+            logger.error(f"Error recording the start of {self.job_name}: {e}")
+            return None
+
+    async def _skip_run(self, skipped_at: datetime) -> None:
+        try:
+            await add_skipped_scrape_run(self.job_name, self.source.value, self.deal_type.value, skipped_at)
+        except Exception as e:
+            logger.error(f"Error recording the skipped run of {self.job_name}: {e}")
+
+    async def _enqueue(self, run_id: Optional[int]) -> bool:
+        """Add the units of a new run to the crawl queue, false while those of the previous run are open."""
+        if not await crawl_queue.enqueue(self.job_name, self.source.value, self.deal_type.value,
+                                         self.fetch_units(), run_id):
+            return False
+        # a new run of the job, the units are fetched from their first page
+        await scrape_checkpoints.reset(self.job_name)
+        return True
+
+    def _run_counts(self) -> Dict[str, int]:
+        """Counts of the last scrape, added up over the replicas that fetch a run."""
+        counts = dict(new_flats=self.counts.new_flats, updated_flats=self.counts.updated_flats,
+                      notifications=self.counts.notifications, requests=self.counts.requests)
+        if self.pipeline is not None:
+            stages = {stage.name: stage for stage in self.pipeline.stages}
+            counts.update(listings=stages["parse"].processed, skipped=stages["dedupe"].dropped,
+                          failed=sum(stage.failed for stage in stages.values()))
+        return counts
+
+    async def _finish_run(self, run_id: Optional[int], error: Optional[str], **values) -> None:
+        """Store counts and stage timings of the last scrape in the run ledger, `values` override columns."""
+        if run_id is None:
+            return
+
+        finished_at = utc_now()
+        next_run_time = getattr(self.job, "next_run_time", None)
+        values = dict(status="failed" if error else "finished", finished_at=finished_at, error=error,
+                      overran_slot=next_run_time is not None and finished_at > next_run_time) | values
+        counts = self._run_counts()
+        if self.pipeline is not None:
+            # the stage timings are the ones of this replica
+            values.update(stage_seconds={stage.name: round(stage.busy_seconds, 2) for stage in self.pipeline.stages})
+        try:
+            await finish_scrape_run(run_id, counts, **values)
+        except Exception as e:
+            logger.error(f"Error recording the end of {self.job_name}: {e}")
+
+    async def _add_to_run(self, run_id: int) -> None:
+        """Add the counts of a run that joined another replica's run to that run's ledger row."""
+        try:
+            await add_scrape_run_counts(run_id, self._run_counts(), utc_now())
+        except Exception as e:
+            logger.error(f"Error adding the counts of {self.job_name} to run {run_id}: {e}")
+
     async def scrape(self) -> None:
+        self.pipeline = None
+        self.counts = RunCounts()
+        async with self.create_session() as session:
+            self.session = session
+            self.pipeline = self.create_pipeline()
+            # with the crawl queue only the enqueuing replica starts a run over, the queue skips done units
+            resume_window = timedelta(minutes=self.backfill.resume_window_minutes) if self.backfill else None
+            self.checkpoints = await scrape_checkpoints.load(
+                self.job_name, reset=not crawl_queue.enabled, resume_window=resume_window)
+            if crawl_queue.enabled:
+                units = crawl_queue.claim(self.job_name)
+            else:
+                units = [unit for unit in self.fetch_units() if not self.unit_done(unit)]
+            try:
+                await self.pipeline.run(units)
+            finally:
+                await self.flush_seen()
+        logger.info(self.pipeline.summary())
+
+    def create_pipeline(self) -> Pipeline:
+        config = self.pipeline_config
+        if self.backfill is not None:
+            return self.create_backfill_pipeline()
+        if crawl_queue.enabled:
+            # a unit is claimed when a fetch worker is about to be free, the rest is left to other replicas
+            fetch = Stage("fetch", self.fetch_claimed, config.fetch_workers, queue_size=1)
+        else:
+            fetch = Stage("fetch", self.fetch_checkpointed, config.fetch_workers, config.queue_size)
+        return Pipeline(self.job_name, [
+            fetch,
+            Stage("parse", self.parse, config.parse_workers, config.queue_size),
+            Stage("dedupe", self.dedupe, config.dedupe_workers, config.queue_size),
+            Stage("image", self.download_image,
+                  config.image_workers, config.queue_size),
+            Stage("persist", self.persist,
+                  config.persist_workers, config.queue_size),
+            Stage("match", self.match, config.match_workers, config.queue_size),
+            Stage("notify", self.notify, config.notify_workers, config.queue_size),
+        ], source=self.source.value, deal_type=self.deal_type.value)
+
+    def create_backfill_pipeline(self) -> Pipeline:
+        config = self.pipeline_config
+        stages = [
+            Stage("fetch", self.fetch_checkpointed, config.fetch_workers, config.queue_size),
+            Stage("parse", self.parse, config.parse_workers, config.queue_size),
+            Stage("dedupe", self.dedupe_backfill, config.dedupe_workers, config.queue_size),
+        ]
+        if self.backfill.download_images:
+            stages.append(Stage("image", self.download_image, config.image_workers, config.queue_size))
+        # the bulk loader is not safe for concurrent use
+        stages.append(Stage("load", self.load, 1, config.queue_size))
+        return Pipeline(self.job_name, stages, source=self.source.value, deal_type=self.deal_type.value)
+
+    def http_trace_config(self) -> aiohttp.TraceConfig:
+        """Request metrics of the parser's session, pass it in `trace_configs` when creating the session."""
+        in_flight = http_requests_in_flight.labels(self.source.value)
+        request_seconds = http_request_seconds.labels(self.source.value)
+        response_bytes = http_response_bytes.labels(self.source.value)
+        connection_wait = http_connection_wait_seconds.labels(self.source.value)
+
+        async def on_request_start(session, context, params):
+            if self.throttle is not None:
+                await self.throttle.wait()
+            context.start = time.perf_counter()
+            in_flight.inc()
+            self.counts.requests += 1
+
+        async def on_request_end(session, context, params):
+            in_flight.dec()
+            request_seconds.observe(time.perf_counter() - context.start)
+            http_requests.labels(self.source.value, params.response.status).inc()
+
+        async def on_request_exception(session, context, params):
+            in_flight.dec()
+            http_requests.labels(self.source.value, "error").inc()
+
+        async def on_response_chunk_received(session, context, params):
+            response_bytes.inc(len(params.chunk))
+
+        async def on_connection_queued_start(session, context, params):
+            context.queued_at = time.perf_counter()
+
+        async def on_connection_queued_end(session, context, params):
+            connection_wait.observe(time.perf_counter() - context.queued_at)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(on_connection_queued_end)
+        return trace_config
+
+    def create_session(self) -> aiohttp.ClientSession:
+        raise NotImplementedError
+
+    def fetch_units(self) -> Iterable[Any]:
+        """Independent units of work for the fetch stage, e.g. districts."""
+        raise NotImplementedError
+
+    def fetch(self, unit: Any) -> AsyncIterator[Any]:
+        """
+        Fetch all pages of a unit and yield its raw listings.
+
+        Call `checkpoint` after yielding the listings of a page, a resumed run starts on `resume_page`.
+        """
         raise NotImplementedError
+
+    async def fetch_checkpointed(self, unit: Any) -> AsyncIterator[Any]:
+        """Fetch a unit, its checkpoint advances as the listings of its pages leave the pipeline."""
+        key = scrape_checkpoints.unit_key(unit)
+        progress = UnitProgress(save=lambda page, last_listing_id: self.save_checkpoint(unit, page, last_listing_id),
+                                finish=lambda: self.finish_checkpoint(unit))
+        self.progress[key] = progress
+        try:
+            async with aclosing(self.fetch(unit)) as listings:
+                async for listing in listings:
+                    yield Tracked(listing, progress.current)
+            await progress.unit_fetched()
+        finally:
+            del self.progress[key]
+
+    def unit_done(self, unit: Any) -> bool:
+        checkpoint = self.checkpoints.get(scrape_checkpoints.unit_key(unit))
+        return checkpoint is not None and checkpoint.done
+
+    def resume_page(self, unit: Any) -> Optional[int]:
+        """The last page an interrupted run handed to the pipeline, None when the unit starts over."""
+        checkpoint = self.checkpoints.get(scrape_checkpoints.unit_key(unit))
+        if checkpoint is None or checkpoint.done:
+            return None
+        return checkpoint.page
+
+    async def checkpoint(self, unit: Any, page: int, last_listing_id: Optional[str] = None) -> None:
+        """
+        Mark the end of a page, call it from `fetch` after yielding the page's listings.
+
+        The checkpoint is saved once those listings are finished by the pipeline.
+        """
+        progress = self.progress.get(scrape_checkpoints.unit_key(unit))
+        if progress is not None:
+            await progress.page_fetched(page, last_listing_id)
+
+    async def save_checkpoint(self, unit: Any, page: int, last_listing_id: Optional[str]) -> None:
+        if self.loader is not None:
+            self.unflushed_checkpoints.append((unit, page, last_listing_id))
+            return
+        await scrape_checkpoints.save(self.job_name, unit, page, last_listing_id)
+
+    async def finish_checkpoint(self, unit: Any) -> None:
+        if self.loader is not None:
+            self.unflushed_checkpoints.append((unit, None, None))
+            return
+        await scrape_checkpoints.finish(self.job_name, unit)
+
+    async def save_flushed_checkpoints(self) -> None:
+        """Save the checkpoints of a backfill after a flush, their listings are all in the written batches."""
+        checkpoints, self.unflushed_checkpoints = self.unflushed_checkpoints, []
+        for unit, page, last_listing_id in checkpoints:
+            if page is None:
+                await scrape_checkpoints.finish(self.job_name, unit)
+            else:
+                await scrape_checkpoints.save(self.job_name, unit, page, last_listing_id)
+
+    async def fetch_claimed(self, unit: CrawlUnit) -> AsyncIterator[Any]:
+        """Fetch a unit claimed from the crawl queue and mark it done once all its pages are fetched."""
+        if unit.run_id is not None:
+            self.joined_run_id = unit.run_id
+        try:
+            async with aclosing(self.fetch_checkpointed(unit.unit)) as listings:
+                async for listing in listings:
+                    yield listing
+        except Exception as e:
+            await crawl_queue.finish(unit, error=str(e))
+            raise
+        except BaseException:
+            # cancelled, the lease runs out and the unit is retried
+            crawl_queue.held.discard(unit.id)
+            raise
+        await crawl_queue.finish(unit)
+
+    async def parse(self, listing: Any) -> Optional[FlatUpdate]:
+        """Create and validate a flat from a raw listing."""
+        raise NotImplementedError
+
+    async def dedupe(self, update: FlatUpdate) -> Optional[FlatUpdate]:
+        """Drop flats that are already stored with the same price."""
+        flat = update.flat
+        await self.mark_seen(flat.id)
+        if known_flat_cache.is_unchanged(flat.id, flat.price):
+            return None
+
+        # Two options here
+        # 1. existing_prices are empty -> flat is new
+        # 2. existing_prices are not empty -> flat is existing, but need to check if price has changed
+        update.existing_prices = await get_flat_prices(flat.id)
+        if update.existing_prices:
+            known_flat_cache.update(flat.id, update.existing_prices[-1].price)
+            if find_flat_price(flat.price, update.existing_prices):
+                return None
+        return update
+
+    async def dedupe_backfill(self, update: FlatUpdate) -> Optional[FlatUpdate]:
+        """Like `dedupe`, but flats with a price history are kept, the bulk load skips the prices already stored."""
+        if update.price_history:
+            await self.mark_seen(update.flat.id)
+            return update
+        return await self.dedupe(update)
+
+    async def mark_seen(self, flat_id: str) -> None:
+        """Remember that the flat is still listed, written in batches as most listings are unchanged."""
+        self.seen_flat_ids.add(flat_id)
+        if len(self.seen_flat_ids) >= SEEN_BATCH_SIZE:
+            await self.flush_seen()
+
+    async def flush_seen(self) -> None:
+        flat_ids, self.seen_flat_ids = list(self.seen_flat_ids), set()
+        if not flat_ids:
+            return
+        try:
+            await mark_flats_seen(flat_ids, utc_now())
+        except Exception as e:
+            logger.error(f"Error marking {len(flat_ids)} flats of {self.job_name} as seen: {e}")
+
+    async def download_image(self, update: FlatUpdate) -> FlatUpdate:
+        # only download the image once we know that the flat is new or its price has changed
+        update.flat.image_data = await update.flat.download_img(update.img_url, self.session)
+        return update
+
+    async def persist(self, update: FlatUpdate) -> FlatUpdate:
+        await upsert_flat(update.flat.to_orm(), update.flat.price)
+        known_flat_cache.update(update.flat.id, update.flat.price)
+        if update.existing_prices:
+            self.counts.updated_flats += 1
+        else:
+            self.counts.new_flats += 1
+        return update
+
+    async def load(self, update: FlatUpdate) -> None:
+        """Add a flat of a backfill to the bulk loader, its price is dated like in `persist`."""
+        flat = update.flat
+        batches = self.loader.stats.batches
+        await self.loader.add(BulkFlat(
+            flat_id=flat.id, source=flat.source.value, deal_type=flat.deal_type, url=flat.url,
+            district=flat.district, city=flat.city, street=flat.street, rooms=flat.rooms,
+            floors_total=flat.floors_total, floor=flat.floor, area=flat.area, series=flat.series,
+            created_at=flat.created_at, latitude=flat.latitude, longitude=flat.longitude,
+            image_data=flat.image_data, last_seen_at=utc_now(), prices=update.price_history + [(flat.created_at, flat.price)]))
+        # the load stage has one worker, pages finished before this flush are all in the written batch
+        if self.loader.stats.batches != batches:
+            await self.save_flushed_checkpoints()
+
+    async def match(self, update: FlatUpdate) -> Optional[FlatUpdate]:
+        flat = update.flat
+        update.subscribers = await get_matching_filters_tg_user_ids(
+            self.city_name, flat.district, self.deal_type, rooms=flat.rooms, area=flat.area, price=flat.price, floor=flat.floor)
+        matched_subscribers.labels(self.source.value, self.deal_type.value).inc(len(update.subscribers))
+        if not update.subscribers:
+            return None
+        return update
+
+    async def notify(self, update: FlatUpdate) -> None:
+        self.counts.notifications += len(update.subscribers)
+        for subscriber in update.subscribers:
+            try:
+                if not update.existing_prices:
+                    await self.telegram_bot.send_flat_msg_with_limiter(update.flat, MessageType.FLATS, tg_user_id=subscriber)
+                else:
+                    await self.telegram_bot.send_flat_update_msg_with_limiter(update.flat, update.existing_prices, tg_user_id=subscriber)
+            except Exception as e:
+                logger.error(e, extra={"repeat_key": type(e).__name__})
+                continue
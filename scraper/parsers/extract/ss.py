@@ -0,0 +1,128 @@
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from lxml import etree
+
+from scraper.parsers.flat.ss import SS_Flat
+from scraper.schemas.shared import DealType
+
+# every listing row has 7 data cells: street, rooms, area, floor, series, price per m2, price
+SS_ROW_CELLS = 7
+
+
+@dataclass(slots=True)
+class SsRow:
+    url: str
+    raw_info: List[str]
+    img_url: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SsPage:
+    rows: List[SsRow] = field(default_factory=list)
+    pages: List[int] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class SsParsedPage:
+    flats: List[tuple[SS_Flat, Optional[str]]] = field(
+        default_factory=list)  # created flat and its full size image url
+    pages: List[int] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+
+def _has_class(element: etree._Element, *classes: str) -> bool:
+    element_classes = element.get("class", "").split()
+    return all(cls in element_classes for cls in classes)
+
+
+def _parse_row(row: etree._Element) -> Optional[SsRow]:
+    url = None
+    img_url = None
+    cells = []
+    for element in row.iter("a", "img", "td"):
+        if element.tag == "td":
+            if _has_class(element, "msga2-o", "pp6"):
+                cells.append("".join(element.itertext()))
+        elif element.tag == "a":
+            if url is None and _has_class(element, "am"):
+                url = element.get("href")
+        elif img_url is None and _has_class(element, "isfoto", "foto_list"):
+            img_url = element.get("src")
+
+    if url is None or len(cells) != SS_ROW_CELLS:
+        return None
+    return SsRow(url=url, raw_info=cells, img_url=img_url)
+
+
+def extract_list_page(html: bytes) -> SsPage:
+    """
+    Extract listing rows and pagination from an ss.lv list page in a single streaming pass.
+
+    Rows are parsed as soon as their closing tag is seen and freed right after, so the full
+    document tree is never kept in memory. Cells are grouped by their own row, which keeps the
+    image and the description of a listing together even when some rows have no photo.
+    """
+    page = SsPage()
+    navi: List[str] = []
+
+    for _, element in etree.iterparse(BytesIO(html), events=("end",), tag=("a", "tr"), html=True,
+                                      recover=True, encoding="utf-8"):
+        if element.tag == "a":
+            if _has_class(element, "navi"):
+                navi.append("".join(element.itertext()).strip())
+            continue
+
+        # listing rows have ids like tr_55012345, banners use tr_bnr_*
+        row_id = element.get("id", "")
+        if not row_id.startswith("tr_") or row_id.startswith("tr_bnr"):
+            continue
+
+        row = _parse_row(element)
+        if row is not None:
+            page.rows.append(row)
+
+        element.clear(keep_tail=True)
+        # drop already processed rows from the parent as well
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    # first and last navigation links are the previous and next page arrows
+    for text in navi[1:-1]:
+        if text.isdigit():
+            page.pages.append(int(text))
+
+    return page
+
+
+def get_image_url(img_url: Optional[str]) -> Optional[str]:
+    if not img_url:
+        return None
+
+    return img_url.replace("th2", "800")
+
+
+def parse_list_page(html: bytes, district_name: str, deal_type: DealType, city_name: str,
+                    flat_series: Dict[str, str]) -> SsParsedPage:
+    """
+    Extract a list page and create its flats.
+
+    Runs in a worker process of the parse executor, so it only takes and returns picklable data.
+    Invalid rows are reported as errors instead of raising, one bad row does not lose the page.
+    """
+    page = extract_list_page(html)
+    parsed = SsParsedPage(pages=page.pages)
+    for row in page.rows:
+        flat = SS_Flat(f"https://www.ss.lv{row.url}", district_name, row.raw_info,
+                       deal_type, city_name)
+        try:
+            flat.create(flat_series)
+            flat.validate()
+        except Exception as e:
+            parsed.errors.append(f"{flat.url}: {e}")
+            continue
+        # only the created flat is sent back to the event loop
+        flat.compact()
+        parsed.flats.append((flat, get_image_url(row.img_url)))
+    return parsed
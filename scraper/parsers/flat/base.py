@@ -1,22 +1,43 @@
 import hashlib
+import sys
 import pyvips
 import aiohttp
 from zoneinfo import ZoneInfo
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 from scraper.utils.config import Source
 from fake_useragent import UserAgent
 
-from scraper.parsers.base import UNKNOWN
+from scraper.schemas.shared import UNKNOWN
 from scraper.schemas.shared import Coordinates
+from scraper.utils.executor import parse_executor
 from scraper.utils.logger import logger
 from scraper.database.models.flat import Flat as FlatORM
 from scraper.database.models.price import Price
 
 
-@dataclass
+def resize_image(img_data: bytes) -> bytes:
+    """Resize an image to the thumbnail size sent to telegram, runs in the parse executor."""
+    image = pyvips.Image.new_from_buffer(img_data, "")
+
+    # Automatically keeps aspect ratio
+    image = image.thumbnail_image(303)
+    return image.write_to_buffer(".jpg")
+
+
+def utc_now() -> datetime:
+    return datetime.now().astimezone(ZoneInfo("UTC"))
+
+
+@dataclass(slots=True)
 class Flat():
+    """
+    A parsed flat. Slotted, as thousands of them can wait in the pipeline and the telegram queue.
+
+    Subclasses hold the raw listing only until `compact` is called after the flat is created,
+    afterwards a flat carries just what is stored and rendered.
+    """
     url: str
     district: str
     source: Source
@@ -26,20 +47,28 @@ class Flat():
     rooms: Optional[int] = None
     city: Optional[str] = None
     street: Optional[str] = UNKNOWN
-    series: Optional[str] = UNKNOWN
+    series: Optional[str] = None
     area: Optional[float] = None
     floor: Optional[int] = None
     floors_total: Optional[int] = None
-    series: Optional[str] = None
     price_per_m2: Optional[float] = None
     latitude: Optional[float] = 0
     longitude: Optional[float] = 0
     image_data: Optional[bytes] = b""
-    created_at: Optional[datetime] = datetime.now().astimezone(ZoneInfo("UTC"))
+    created_at: Optional[datetime] = field(default_factory=utc_now)
 
     def create(self):
         pass
 
+    def compact(self):
+        """Intern the low cardinality values and drop the raw listing, call once the flat is created."""
+        self.district = sys.intern(self.district)
+        self.deal_type = sys.intern(self.deal_type)
+        if self.city is not None:
+            self.city = sys.intern(self.city)
+        if self.series is not None:
+            self.series = sys.intern(self.series)
+
     def validate(self):
         if self.floor < 1:
             raise ValueError(f"Floor {self.floor} less than 1")
@@ -74,20 +103,11 @@ class Flat():
         try:
             async with session.get(img_url, headers=headers) as response:
                 if response.status != 200:
-                    print(
-                        f"Failed to download image from {img_url} - {response.status}")
+                    logger.error(f"Failed to download image from {img_url} - {response.status}")
                     return None
 
-                # Get image content and open it
                 img_data = await response.read()
-                image = pyvips.Image.new_from_buffer(img_data, "")
-
-                # Automatically keeps aspect ratio
-                image = image.thumbnail_image(303)
-                resized_image_file = image.write_to_buffer(
-                    ".jpg")
-
-                return resized_image_file
+                return await parse_executor.run(resize_image, img_data)
         except Exception as e:
             logger.error(f"Error downloading image: {e} - {img_url}")
             return None
@@ -130,6 +150,7 @@ class Flat():
             series=self.series,
             location=f"POINT({self.longitude} {self.latitude})",
             image_data=self.image_data,
+            last_seen_at=utc_now(),
         )
 
     @staticmethod
@@ -1,6 +1,6 @@
 from typing import Dict
 
-from scraper.parsers.base import UNKNOWN
+from scraper.schemas.shared import UNKNOWN
 from scraper.parsers.flat.base import Flat
 from scraper.schemas.city_24 import Flat as City24Flat
 from scraper.utils.config import Source
@@ -9,27 +9,29 @@ from scraper.utils.meta import convert_dt_to_utc, try_parse_int
 
 
 class City24_Flat(Flat):
+    __slots__ = ("flat",)
+
     def __init__(self, district_name: str,  deal_type: DealType, flat: City24Flat, city: str):
-        super().__init__(url=self.format_url(flat["friendly_id"], deal_type), district=district_name,
+        super().__init__(url=self.format_url(flat.friendly_id, deal_type), district=district_name,
                          source=Source.CITY_24, deal_type=deal_type.value)
         self.flat = flat
         self.city = city
 
     def create(self, unified_flat_series: Dict[str, str]):
-        self.price_per_m2 = self.flat["price_per_unit"]
-        self.area = try_parse_int(self.flat["property_size"])
+        self.price_per_m2 = self.flat.price_per_unit
+        self.area = try_parse_int(self.flat.property_size)
         self.price = try_parse_int((self.price_per_m2 * self.area))
-        self.rooms = self.flat["room_count"]
+        self.rooms = self.flat.room_count
         self.street = self.get_street_name()
         self.floor, self.floors_total = self.get_floors()
         self.series = self.get_series_type(unified_flat_series)
         self.id = self.create_id()
         self.add_coordinates(self.get_coordinates())
-        self.created_at = convert_dt_to_utc(self.flat["date_published"])
+        self.created_at = convert_dt_to_utc(self.flat.date_published)
 
     def get_floors(self) -> tuple[int, int]:
-        floor = self.flat["attributes"]["FLOOR"]
-        floors_total = self.flat["attributes"]["TOTAL_FLOORS"]
+        floor = self.flat.attributes.FLOOR
+        floors_total = self.flat.attributes.TOTAL_FLOORS
 
         # handle different cases :)
         if floor is None or floors_total is None:
@@ -45,34 +47,40 @@ class City24_Flat(Flat):
         return floor, floors_total
 
     def get_street_name(self) -> str:
-        if self.flat["address"].get("house_number") is not None:
-            return f'{self.flat["address"]["street_name"] or UNKNOWN} {self.flat["address"]["house_number"]}'
-        return self.flat["address"]["street_name"] or UNKNOWN
+        address = self.flat.address
+        if address.house_number is not None:
+            return f'{address.street_name or UNKNOWN} {address.house_number}'
+        return address.street_name or UNKNOWN
 
     def get_series_type(self, unified_flat_series: Dict[str, str]) -> str:
-        if self.flat["attributes"].get("HOUSE_TYPE") is None or len(self.flat["attributes"]["HOUSE_TYPE"]) <= 0:
+        house_type = self.flat.attributes.HOUSE_TYPE
+        if house_type is None or len(house_type) <= 0:
             return UNKNOWN
 
-        if self.flat["attributes"]["HOUSE_TYPE"][0] in unified_flat_series:
-            return unified_flat_series[self.flat["attributes"]["HOUSE_TYPE"][0]]
+        if house_type[0] in unified_flat_series:
+            return unified_flat_series[house_type[0]]
 
         return UNKNOWN
 
     def get_coordinates(self) -> Coordinates:
-        latitude = self.flat["latitude"] or 0
-        longitude = self.flat["longitude"] or 0
+        latitude = self.flat.latitude or 0
+        longitude = self.flat.longitude or 0
         return Coordinates(latitude, longitude)
 
     def format_img_url(self) -> str:
-        if self.flat["main_image"] is None:
+        if self.flat.main_image is None:
             raise ValueError(
                 f"Main image is missing for flat {self.id} in {self.source.value} scraper")
-        if self.flat["main_image"]["url"] is None:
+        if self.flat.main_image.url is None:
             raise ValueError(
                 f"Main image url is missing for flat {self.id} in {self.source.value} scraper")
-        url = self.flat["main_image"]["url"]
+        url = self.flat.main_image.url
         return url.replace("{fmt:em}", "14")
 
+    def compact(self):
+        super().compact()
+        self.flat = None
+
     def format_url(self, id: str, deal_type: DealType) -> str:
         if deal_type == DealType.RENT:
             return f"https://www.city24.lv/real-estate/apartments-for-rent/riga/{id}"
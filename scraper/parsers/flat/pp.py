@@ -1,9 +1,10 @@
 
+from datetime import datetime
 from typing import Dict
 
 from scraper.utils.config import Source
-from scraper.parsers.base import UNKNOWN
-from scraper.schemas.pp import FilterValue, PriceType
+from scraper.schemas.shared import UNKNOWN
+from scraper.schemas.pp import AdFilterValue, FilterValue, PriceType
 from scraper.schemas.shared import Coordinates, DealType
 from scraper.parsers.flat.base import Flat
 from scraper.schemas.pp import Flat as PpFlat
@@ -19,10 +20,15 @@ PP_FILTER_MAP: Dict[str, FilterValue] = {
 
 
 class PP_Flat(Flat):
+    __slots__ = ("flat", "attributes", "full_price_type")
+
     def __init__(self, district_name: str,  deal_type: DealType, flat: PpFlat, city: str):
-        super().__init__(url=flat["frontUrl"], district=district_name,
+        super().__init__(url=flat.front_url, district=district_name,
                          source=Source.PP, deal_type=deal_type.value)
         self.flat = flat
+        # filter id -> attribute, built once instead of scanning the list for every field
+        self.attributes: Dict[int, AdFilterValue] = {
+            attr.filter.id: attr for attr in flat.ad_filter_values}
         self.city = city
         self.full_price_type = self.get_full_price_type(deal_type)
 
@@ -32,7 +38,7 @@ class PP_Flat(Flat):
         self.rooms = try_parse_int(
             self._get_text_attribute(PP_FILTER_MAP["rooms"]))
         self.price, self.price_per_m2 = self._get_prices(self.full_price_type)
-        self.street = self.flat["publicLocation"]["address"] or UNKNOWN
+        self.street = self.flat.public_location.address or UNKNOWN
         self.floor = try_parse_int(
             self._get_text_attribute(PP_FILTER_MAP["floor"]))
         self.floors_total = try_parse_int(self._get_text_attribute(
@@ -40,16 +46,16 @@ class PP_Flat(Flat):
         self.series = self._get_series_type(unified_flat_series)
         self.id = self.create_id()
         self.add_coordinates(self._get_coordinates())
-        self.created_at = convert_dt_to_utc(self.flat["publishDate"])
+        self.created_at = convert_dt_to_utc(self.flat.publish_date)
 
     def _get_prices(self, full_price_type: PriceType) -> tuple[int, float]:
         """Get the both full and per square prices of the flat"""
         full_price = next(
-            (price for price in self.flat["prices"] if price["priceType"]["id"] == full_price_type.value), None)
+            (price for price in self.flat.prices if price.price_type.id == full_price_type.value), None)
         # Here we need to try to tackle cases when one price is missing, either full or per square
         if full_price is None:
             raise ValueError("Price is missing")
-        num_full_price = try_parse_float(full_price["value"])
+        num_full_price = try_parse_float(full_price.value)
         if num_full_price == 0:
             raise ValueError("Price is 0")
         if self.area == 0 or self.area is None:
@@ -60,34 +66,39 @@ class PP_Flat(Flat):
 
     def _get_text_attribute(self, filter_value: FilterValue) -> str:
         """Get attributes from the flat filters"""
-        attr = next(
-            (attr for attr in self.flat["adFilterValues"] if attr["filter"]["id"] == filter_value["id"]), None)
+        attr = self.attributes.get(filter_value["id"])
         if attr is None:
             return filter_value["default"]
-        return attr["textValue"]
+        return attr.text_value
 
     def _get_series_type(self, unified_flat_series: Dict[str, str]) -> str:
-        attr = next(
-            (attr for attr in self.flat["adFilterValues"] if attr["filter"]["id"] == PP_FILTER_MAP["series"]["id"]), None)
-        if attr is None:
+        attr = self.attributes.get(PP_FILTER_MAP["series"]["id"])
+        if attr is None or attr.value is None:
             return PP_FILTER_MAP["series"]["default"]
 
-        if str(attr["value"]["id"]) in unified_flat_series:
-            return unified_flat_series[str(attr["value"]["id"])]
+        if str(attr.value.id) in unified_flat_series:
+            return unified_flat_series[str(attr.value.id)]
         return UNKNOWN
 
-    def get_historic_prices(self) -> list[tuple[str, float]]:
+    def get_historic_prices(self) -> list[tuple[datetime, int]]:
         targetPrice = next(
-            (price for price in self.flat["prices"] if price["priceType"]["id"] == self.full_price_type[0].value), None)
+            (price for price in self.flat.prices if price.price_type.id == self.full_price_type.value), None)
         if targetPrice is None:
             return []
-        return [(convert_dt_to_utc(price["timestamp"]), try_parse_int(price["value"])) for price in targetPrice["priceHistory"]]
+        return [(convert_dt_to_utc(price.timestamp), try_parse_int(price.value)) for price in targetPrice.price_history]
 
     def format_img_url(self) -> str:
-        extension = self.flat["thumbnail"]["extension"]
-        storage_id = self.flat["thumbnail"]["storageId"]
+        if self.flat.thumbnail is None:
+            raise ValueError("Thumbnail is missing")
+        extension = self.flat.thumbnail.extension
+        storage_id = self.flat.thumbnail.storage_id
         return f"https://img.pp.lv/storage/{storage_id[0:2]}/{storage_id[2:4]}/{storage_id}/32.{extension}"
 
+    def compact(self):
+        super().compact()
+        self.flat = None
+        self.attributes = None
+
     def get_full_price_type(self, deal_type: DealType) -> PriceType:
         """Get the full price type based on the deal type."""
         if deal_type == DealType.RENT:
@@ -95,6 +106,7 @@ class PP_Flat(Flat):
         return PriceType.SELL_FULL
 
     def _get_coordinates(self) -> Coordinates:
-        latitude = self.flat["publicLocation"]["coordinateY"] if self.flat["publicLocation"]["coordinateY"] is not None else 0
-        longitude = self.flat["publicLocation"]["coordinateX"] if self.flat["publicLocation"]["coordinateX"] is not None else 0
+        location = self.flat.public_location
+        latitude = location.coordinate_y if location.coordinate_y is not None else 0
+        longitude = location.coordinate_x if location.coordinate_x is not None else 0
         return Coordinates(latitude=latitude, longitude=longitude)
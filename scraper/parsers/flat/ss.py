@@ -8,8 +8,14 @@ from scraper.parsers.flat.base import Flat
 from scraper.schemas.shared import DealType
 from scraper.utils.meta import try_parse_float, try_parse_int
 
+NON_DIGITS = re.compile(r"[^\d]")
+NON_DECIMAL = re.compile(r"[^\d.]")
+STREET_ABBREVIATION = re.compile(r"\b[A-Za-z]{1,7}\.\s*")
+
 
 class SS_Flat(Flat):
+    __slots__ = ("raw_info",)
+
     def __init__(self, url: str, district_name: str, raw_info: list[str], deal_type: DealType, city: str):
         super().__init__(url=url, district=district_name,
                          source=Source.SS, deal_type=deal_type.value)
@@ -21,7 +27,7 @@ class SS_Flat(Flat):
             raise ValueError("Incorrect number of elements in raw_info")
         self.price = self.get_price()
         self.price_per_m2 = try_parse_float(
-            re.sub(r"[^\d.]", "", self.raw_info[5]))
+            NON_DECIMAL.sub("", self.raw_info[5]))
         self.rooms = self.get_rooms()
         self.street = self.get_street()
         self.area = try_parse_float(self.raw_info[2], 2)
@@ -30,10 +36,14 @@ class SS_Flat(Flat):
         self.id = self.create_id()
         self.created_at = datetime.now().astimezone(ZoneInfo("UTC"))
 
+    def compact(self):
+        super().compact()
+        self.raw_info = None
+
     def get_price(self) -> int:
         if self.deal_type == DealType.RENT.value:
-            return try_parse_int(re.sub(r"[^\d]", "", self.raw_info[6]))
-        return try_parse_int(re.sub(r"[^\d.]", "", self.raw_info[6]))
+            return try_parse_int(NON_DIGITS.sub("", self.raw_info[6]))
+        return try_parse_int(NON_DECIMAL.sub("", self.raw_info[6]))
 
     def get_rooms(self) -> int:
         rooms = try_parse_int(self.raw_info[1])
@@ -42,7 +52,7 @@ class SS_Flat(Flat):
         return rooms
 
     def get_street(self) -> str:
-        street = re.sub(r'\b[A-Za-z]{1,7}\.\s*', '', self.raw_info[0]).strip()
+        street = STREET_ABBREVIATION.sub("", self.raw_info[0]).strip()
         return street
 
     def get_floors(self, floors: str) -> tuple[int, int] | tuple[None, None]:
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Dict
 
-from scraper.parsers.base import UNKNOWN
+from scraper.schemas.shared import UNKNOWN
 from scraper.parsers.flat.base import Flat
 from scraper.schemas.varianti import Flat as FlatSchema
 from scraper.utils.config import Source
@@ -10,8 +10,10 @@ from scraper.utils.meta import convert_timestamp_to_utc, try_parse_int
 
 
 class Varianti_Flat(Flat):
+    __slots__ = ("flat",)
+
     def __init__(self, district_name: str,  deal_type: DealType, flat: FlatSchema, city: str):
-        super().__init__(url=self.format_url(flat["id"]), district=district_name,
+        super().__init__(url=self.format_url(flat.id), district=district_name,
                          source=Source.VARIANTI, deal_type=deal_type.value)
         self.flat = flat
         self.city = city
@@ -30,8 +32,8 @@ class Varianti_Flat(Flat):
         self.created_at = self.get_created_at()
 
     def get_created_at(self) -> datetime:
-        date_create = self.flat["object"]["date_create"]
-        date_update = self.flat["object"]["date_update"]
+        date_create = self.flat.object.date_create
+        date_update = self.flat.object.date_update
         if date_update is None:
             return convert_timestamp_to_utc(date_create)
         if date_update > date_create:
@@ -39,23 +41,19 @@ class Varianti_Flat(Flat):
         return convert_timestamp_to_utc(date_create)
 
     def get_object_num(self, key: str) -> int | float:
-        object = self.flat["object"]
-        if object.get(key) is None:
+        value = getattr(self.flat.object, key)
+        if value is None:
             raise ValueError(f"{key} is missing")
-        return object[key]
+        return value
 
     def get_street_name(self) -> str:
-        split_street = self.flat["address_name"].split(",")
+        split_street = self.flat.address_name.split(",")
         if len(split_street) != 3:
             return UNKNOWN
         return f"{split_street[1].strip()} {split_street[2].strip()}"
 
     def get_series_type(self, internal_series: Dict[str, str]) -> str:
-        # check if flat_building_type exists
-        object = self.flat["object"]
-        if object.get("flat_building_type") is None:
-            return UNKNOWN
-        series = object["flat_building_type"]
+        series = self.flat.object.flat_building_type
         if series is None:
             return UNKNOWN
 
@@ -65,14 +63,18 @@ class Varianti_Flat(Flat):
         return mathed_series
 
     def get_coordinates(self) -> Coordinates:
-        latitude = self.flat["latitude"] or 0
-        longitude = self.flat["longitude"] or 0
+        latitude = self.flat.latitude or 0
+        longitude = self.flat.longitude or 0
         return Coordinates(latitude, longitude)
 
     def get_img_url(self) -> str:
-        if self.flat["images"] is None or len(self.flat["images"]) <= 0:
+        if self.flat.images is None or len(self.flat.images) <= 0:
             raise ValueError("No images found")
-        return self.flat["images"][0]["small"]
+        return self.flat.images[0].small
+
+    def compact(self):
+        super().compact()
+        self.flat = None
 
     def format_url(self, id: str) -> str:
         return f"https://www.varianti.lv/lv/detail/{id}/"
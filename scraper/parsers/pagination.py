@@ -0,0 +1,82 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Generic, Optional, TypeVar
+
+from scraper.utils.logger import logger
+
+T = TypeVar("T")
+
+# a failed page is skipped, this many failures in a row end the scrape
+MAX_FAILED_PAGES = 3
+
+
+class PagePrefetcher(Generic[T]):
+    """
+    Fetches pages of a paginated API ahead of the consumer.
+
+    A fetcher task keeps up to `prefetch` decoded pages in a bounded queue while the previous pages
+    are processed, so the request for page N+1 overlaps with the processing of page N. `pages()`
+    yields the pages in order and stops after the page matching `is_last_page`. When the consumer
+    stops early (e.g. listings are too old), closing the generator cancels outstanding prefetches,
+    so it should be iterated inside `contextlib.aclosing`.
+
+    `fetch_page` returns None for a failed page, which is logged by the caller and skipped.
+    """
+
+    def __init__(self,
+                 fetch_page: Callable[[int], Awaitable[Optional[T]]],
+                 is_last_page: Callable[[T], bool],
+                 prefetch: int = 2):
+        self.fetch_page = fetch_page
+        self.is_last_page = is_last_page
+        self.prefetch = max(prefetch, 1)
+
+    async def pages(self, first_page: int = 1) -> AsyncIterator[tuple[int, T]]:
+        # one page is being processed, `prefetch` more can wait in the queue
+        queue: asyncio.Queue[tuple[int, Optional[T]]] = asyncio.Queue(
+            maxsize=self.prefetch)
+        fetcher = asyncio.create_task(self._fetch(queue, first_page))
+        try:
+            failed = 0
+            while True:
+                page, data = await queue.get()
+                if data is None:
+                    failed += 1
+                    if failed >= MAX_FAILED_PAGES:
+                        logger.error(
+                            f"{failed} pages in a row failed, stopping on page {page}")
+                        return
+                    continue
+
+                failed = 0
+                yield page, data
+                if self.is_last_page(data):
+                    return
+        finally:
+            if not fetcher.done():
+                fetcher.cancel()
+            try:
+                await fetcher
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Page fetcher failed: {e}")
+
+    async def _fetch(self, queue: asyncio.Queue, page: int) -> None:
+        failed = 0
+        while True:
+            try:
+                data = await self.fetch_page(page)
+            except Exception as e:
+                logger.error(f"Error fetching page {page}: {e}")
+                data = None
+            await queue.put((page, data))
+
+            if data is None:
+                failed += 1
+                if failed >= MAX_FAILED_PAGES:
+                    return
+            else:
+                failed = 0
+                if self.is_last_page(data):
+                    return
+            page += 1
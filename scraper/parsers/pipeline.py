@@ -0,0 +1,177 @@
+import asyncio
+import inspect
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Union
+
+from scraper.utils.logger import logger
+from scraper.utils.metrics import stage_items, stage_seconds
+
+StageHandler = Union[Callable[[Any], Awaitable[Any]],
+                     Callable[[Any], AsyncIterator[Any]]]
+
+
+class Ack:
+    """
+    Tracks the items derived from one source, e.g. the listings of a page, through the pipeline.
+
+    `on_done` is called once the ack is closed, i.e. no more items are added, and every item was dropped,
+    failed or finished by the last stage. Items still in the pipeline when it is cancelled are never done.
+    """
+
+    def __init__(self, on_done: Callable[[], Awaitable[None]]):
+        self.on_done = on_done
+        self.pending = 0
+        self.closed = False
+        self.finished = False
+
+    def add(self) -> None:
+        self.pending += 1
+
+    async def done(self) -> None:
+        self.pending -= 1
+        await self._check()
+
+    async def close(self) -> None:
+        self.closed = True
+        await self._check()
+
+    async def _check(self) -> None:
+        if self.closed and self.pending == 0 and not self.finished:
+            self.finished = True
+            await self.on_done()
+
+
+@dataclass
+class Tracked:
+    """Yielded by a generator stage to attach an ack to an item, the later stages get the bare item."""
+    item: Any
+    ack: Ack
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline step run by `workers` concurrent tasks that read from a queue of at most `queue_size` items.
+
+    The handler is either a coroutine function returning the item for the next stage (None drops it),
+    or an async generator function that can emit any number of items, e.g. every row of a fetched page.
+    """
+    name: str
+    handler: StageHandler
+    workers: int = 1
+    queue_size: int = 100
+    processed: int = 0
+    emitted: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    # time spent waiting for room in the next stage's queue
+    blocked_seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name}: {self.processed} in, {self.emitted} out, {self.dropped} dropped, {self.failed} failed, "
+                f"{self.busy_seconds:.1f}s busy, {self.blocked_seconds:.1f}s blocked")
+
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues.
+
+    A stage can only run ahead of the next one by its queue size, so the number of items in flight and
+    with it the memory held by pages, images and database sessions is capped by the configuration.
+    Errors are logged and drop the item, they never stop the pipeline.
+    Items yielded as `Tracked` carry their ack through the later stages, see `Ack`.
+    Per item stage timings and outcomes are exported as metrics labelled with `source` and `deal_type`.
+    """
+
+    def __init__(self, name: str, stages: List[Stage], source: str = "", deal_type: str = ""):
+        self.name = name
+        self.stages = stages
+        self.source = source
+        self.deal_type = deal_type
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterator[Any]]) -> None:
+        queues = [asyncio.Queue(maxsize=max(stage.queue_size, 1))
+                  for stage in self.stages]
+        # named after the pipeline and stage, so the loop watchdog can tell who blocks the loop
+        workers = [asyncio.create_task(self._work(index, queues), name=f"{self.name} {stage.name}")
+                   for index, stage in enumerate(self.stages) for _ in range(max(stage.workers, 1))]
+        try:
+            if hasattr(items, "__aiter__"):
+                async with aclosing(items):
+                    async for item in items:
+                        await queues[0].put((None, item))
+            else:
+                for item in items:
+                    await queues[0].put((None, item))
+            # once a stage is drained, everything it emitted is already queued for the next one
+            for queue in queues:
+                await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _work(self, index: int, queues: List[asyncio.Queue]) -> None:
+        stage = self.stages[index]
+        output = queues[index + 1] if index + 1 < len(queues) else None
+        is_generator = inspect.isasyncgenfunction(stage.handler)
+        seconds = stage_seconds.labels(self.source, self.deal_type, stage.name)
+        outcomes = {outcome: stage_items.labels(self.source, self.deal_type, stage.name, outcome)
+                    for outcome in ("processed", "dropped", "failed")}
+
+        async def emit(item: Any, ack: Optional[Ack]) -> None:
+            stage.emitted += 1
+            if isinstance(item, Tracked):
+                item, ack = item.item, item.ack
+            if output is None:
+                return
+            if ack is not None:
+                ack.add()
+            start = time.perf_counter()
+            await output.put((ack, item))
+            stage.blocked_seconds += time.perf_counter() - start
+
+        async def done(ack: Optional[Ack]) -> None:
+            if ack is None:
+                return
+            try:
+                await ack.done()
+            except Exception as e:
+                logger.error(f"{self.name} {stage.name} stage failed to acknowledge an item: {e}")
+
+        while True:
+            ack, item = await queues[index].get()
+            start = time.perf_counter()
+            try:
+                stage.processed += 1
+                if is_generator:
+                    async with aclosing(stage.handler(item)) as results:
+                        async for result in results:
+                            await emit(result, ack)
+                else:
+                    result = await stage.handler(item)
+                    # the last stage has nothing to hand over
+                    if result is not None:
+                        await emit(result, ack)
+                    elif output is not None:
+                        stage.dropped += 1
+                        outcomes["dropped"].inc()
+                # done before `task_done`, so `run` returns only after the acks of all items are done
+                await done(ack)
+            except Exception as e:
+                stage.failed += 1
+                outcomes["failed"].inc()
+                logger.error(f"{self.name} {stage.name} stage failed: {e}", extra={"repeat_key": type(e).__name__})
+                await done(ack)
+            finally:
+                elapsed = time.perf_counter() - start
+                stage.busy_seconds += elapsed
+                seconds.observe(elapsed)
+                outcomes["processed"].inc()
+                queues[index].task_done()
+
+    def summary(self) -> str:
+        return f"Pipeline {self.name} - " + "; ".join(stage.summary() for stage in self.stages)
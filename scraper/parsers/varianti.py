@@ -1,151 +1,164 @@
 
 import asyncio
-from typing import List
+from typing import AsyncIterator, Iterable, List, Optional
 import aiohttp
+import msgspec
 from fake_useragent import UserAgent
 
 from scraper.parsers.flat.varianti import Varianti_Flat
 from scraper.schemas.shared import DealType
-from scraper.utils.config import VariantiParserConfig, Source
-from scraper.database.crud import get_flat, get_matching_filters_tg_user_ids, upsert_flat
-from scraper.parsers.base import UNKNOWN, BaseParser
-from scraper.utils.telegram import MessageType, TelegramBot
-from scraper.schemas.varianti import Flat, VariantiRes
+from scraper.utils.config import PipelineConfig, VariantiParserConfig, Source
+from scraper.parsers.base import BaseParser, FlatUpdate
+from scraper.utils.telegram import TelegramBot
+from scraper.schemas.varianti import Flat, Result, VariantiRes, decode_response
 from scraper.utils.logger import logger
-from scraper.utils.meta import find_flat_price, get_start_of_day
+from scraper.utils.meta import convert_timestamp_to_utc, get_start_of_day
 
 
 class VariantiParser(BaseParser):
-    def __init__(self, telegram_bot: TelegramBot, config: VariantiParserConfig, deal_type: DealType):
-        super().__init__(Source.VARIANTI, deal_type)
+    def __init__(self, telegram_bot: TelegramBot, config: VariantiParserConfig, deal_type: DealType, pipeline_config: PipelineConfig):
+        super().__init__(Source.VARIANTI, deal_type, telegram_bot, pipeline_config)
         self.original_city_code = config.city_code
         self.city_name = self.cities[self.original_city_code]
-        self.telegram_bot = telegram_bot
         self.user_agent = UserAgent()
-        self.items_per_page = 100
-        self.semaphore = asyncio.Semaphore(4)
+        self.items_per_page = config.page_size
+        self.parallel_pages = config.parallel_pages
+        self.max_connections = config.max_connections
 
-    async def scrape(self) -> None:
-        """Scrape flats from varianti.lv asynchronously"""
+    def create_session(self) -> aiohttp.ClientSession:
         connector = aiohttp.TCPConnector(
-            limit_per_host=1, keepalive_timeout=30)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            tasks = [asyncio.ensure_future(self.scrape_district(session, platform_district_name, internal_district_name))
-                     for platform_district_name, internal_district_name in self.districts.items()]
-            await asyncio.gather(*tasks)
-
-    async def scrape_district(self, session: aiohttp.ClientSession, platform_district_name: str, internal_district_name: str):
-        """Scrape the entire city asynchronously, handling pagination."""
-        async with self.semaphore:
-            url = "https://api.varianti.lv/rest/list/ad"
-
-            params = {
-                "filters": {
-                    "address_country": 1,
-                    "deal_type": self.platform_deal_type,
-                    "address_district": int(platform_district_name),
-                    "is_promoted": False,
-                    "features": []
-                },
-                "page": 0,
-                "size": self.items_per_page,
-                "order":    {
-                    "asc": "false",
-                    "field": "DATE"
-                },
-            }
-
-            headers = {
-                "User-Agent": self.user_agent.random,
-                "Accept-Encoding": "gzip, deflate, br, zstd",
-                "Accept-Language": "en-US,en;q=0.9",
-            }
-
-            try:
-                async with session.post(url, json=params, headers=headers, timeout=10) as response:
-                    if response.status != 200:
-                        logger.error(
-                            f"Request failed with status code {response.status} and status text {response}")
-                        return
-
-                    varianti_res: VariantiRes = await response.json()
-
-                    if not varianti_res:
-                        logger.error(
-                            f"No data found for {self.original_city_code}")
-                        return
-
-                    if varianti_res["result"]["list"] is None:
-                        logger.info(
-                            f"No flats found for {self.original_city_code}")
-                        return
-
-                    if len(varianti_res["errorDescriptions"]):
-                        logger.error(
-                            f"Error fetching data for {self.original_city_code} - S {varianti_res['errorDescriptions']}")
-                        return
-
-                    await self.process_flats(varianti_res["result"]["list"], session, internal_district_name)
-
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                logger.error(
-                    f"Error fetching data for {self.original_city_code}: {e}")
-                return
-
-    async def process_flats(self, flats: List[Flat], session: aiohttp.ClientSession, district_name: str):
-        """Process and validate each flat"""
+            limit_per_host=self.max_connections, keepalive_timeout=30)
+        return aiohttp.ClientSession(connector=connector, trace_configs=[self.http_trace_config()])
+
+    def fetch_units(self) -> Iterable[tuple[str, str]]:
+        """Every district is fetched on its own, (platform district name, internal district name)"""
+        return self.districts.items()
+
+    async def fetch(self, district: tuple[str, str]) -> AsyncIterator[tuple[Flat, str]]:
+        """Fetch the entire district, handling pagination, and yield flats updated today."""
+        platform_district_name, internal_district_name = district
+        resume_page = self.resume_page(district) or 0
+        first_page = await self.fetch_page(platform_district_name, 0)
+        if first_page is None or first_page.list is None:
+            return
+
+        # a resumed run only needs the first page for the page count
+        recent_flats, page_is_old = self.get_recent_flats(first_page.list)
+        if resume_page == 0:
+            for flat in recent_flats:
+                yield flat, internal_district_name
+            await self.checkpoint(district, 0, self.last_listing_id(recent_flats))
+        if page_is_old:
+            return
+
+        total_pages = first_page.pages or 1
+        # pages are requested in parallel batches, the connector limit still caps requests per host
+        for batch_start in range(max(resume_page, 1), total_pages, self.parallel_pages):
+            pages = range(batch_start, min(
+                batch_start + self.parallel_pages, total_pages))
+            results = await asyncio.gather(*[self.fetch_page(platform_district_name, page)
+                                             for page in pages])
+            for page, result in zip(pages, results):
+                if result is None or result.list is None:
+                    continue
+                recent_flats, page_is_old = self.get_recent_flats(result.list)
+                for flat in recent_flats:
+                    yield flat, internal_district_name
+                await self.checkpoint(district, page, self.last_listing_id(recent_flats))
+                # flats are sorted by created date, a page with only old updates means the rest are old too
+                if page_is_old:
+                    logger.info(
+                        f"Stopping scraping {self.source.value} district {internal_district_name} on page {page}, flats are too old")
+                    return
+
+    async def fetch_page(self, platform_district_name: str, page: int) -> Optional[Result]:
+        url = "https://api.varianti.lv/rest/list/ad"
+
+        params = {
+            "filters": {
+                "address_country": 1,
+                "deal_type": self.platform_deal_type,
+                "address_district": int(platform_district_name),
+                "is_promoted": False,
+                "features": []
+            },
+            "page": page,
+            "size": self.items_per_page,
+            "order":    {
+                "asc": "false",
+                "field": "DATE"
+            },
+        }
+
+        headers = {
+            "User-Agent": self.user_agent.random,
+            "Accept-Encoding": "gzip, deflate, br, zstd",
+            "Accept-Language": "en-US,en;q=0.9",
+        }
+
+        try:
+            async with self.session.post(url, json=params, headers=headers, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(
+                        f"Request failed with status code {response.status} and status text {response}")
+                    return None
+
+                varianti_res: VariantiRes = decode_response(await response.read())
+
+                if varianti_res.result is None or varianti_res.result.list is None:
+                    logger.info(
+                        f"No flats found for {self.original_city_code} on page {page}")
+                    return None
+
+                if varianti_res.error_descriptions:
+                    logger.error(
+                        f"Error fetching data for {self.original_city_code} - S {varianti_res.error_descriptions}")
+                    return None
+
+                return varianti_res.result
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(
+                f"Error fetching data for {self.original_city_code} on page {page}: {e}")
+            return None
+        except msgspec.MsgspecError as e:
+            # e.g. an html error page sent with status 200
+            logger.error(f"Error decoding the response of {url} for page {page}: {e}")
+            return None
+
+    @staticmethod
+    def last_listing_id(flats: List[Flat]) -> Optional[str]:
+        return str(flats[-1].id) if flats else None
+
+    def get_recent_flats(self, flats: List[Flat]) -> tuple[List[Flat], bool]:
+        """Flats updated today, most recently updated first, and whether even the most recent one is old."""
+        if self.backfill is not None:
+            # a backfill walks every active listing
+            return self.sort_flats_by_date_update(flats), False
         # As flats are stupidly sorted by created date and not by updated date, we need to filter out old flats
-        sorted_flats = self.sort_flats_by_date_update(flats)
-        for flat in sorted_flats:
-            try:
-                need_break = await self.process_flat(flat, session, district_name)
-                if need_break:
-                    break
-            except Exception as e:
-                logger.error(f"Error processing flat: {e}")
-                continue
-
-    async def process_flat(self, flat_data: Flat, session: aiohttp.ClientSession, district_name: str) -> bool:
-        """Process and validate each flat"""
+        recent_flats = []
+        for flat in self.sort_flats_by_date_update(flats):
+            if self.is_old(flat):
+                break
+            recent_flats.append(flat)
+        return recent_flats, len(flats) > 0 and len(recent_flats) == 0
+
+    def is_old(self, flat: Flat) -> bool:
+        """Check if the latest of the created and updated time is older than today's start of day."""
+        timestamp = max(flat.object.date_update or 0,
+                        flat.object.date_create or 0)
+        return get_start_of_day() > int(convert_timestamp_to_utc(timestamp).timestamp())
+
+    async def parse(self, listing: tuple[Flat, str]) -> Optional[FlatUpdate]:
+        """Create and validate the flat"""
+        flat_data, district_name = listing
         flat = Varianti_Flat(district_name, self.deal_type,
                              flat_data, self.city_name)
-
         flat.create(self.flat_series)
         flat.validate()
-
-        if get_start_of_day() > int(flat.created_at.timestamp()):
-            logger.info(
-                f"Flat update time of {flat.created_at} is older than today's start of day"
-            )
-            return True
-
-        img_url = flat.get_img_url()
-        flat.image_data = await flat.download_img(img_url, session)
-
-        existing_flat = await get_flat(flat.id)
-
-        if existing_flat:
-            matched_price = find_flat_price(flat.price, existing_flat.prices)
-            if matched_price:
-                return False
-
-        flat_orm = flat.to_orm()
-
-        await upsert_flat(flat_orm, flat.price)
-
-        subscribers = await get_matching_filters_tg_user_ids(
-            self.city_name, district_name, self.deal_type, rooms=flat.rooms, area=flat.area, price=flat.price, floor=flat.floor)
-
-        for subscriber in subscribers:
-            try:
-                if existing_flat is None:
-                    await self.telegram_bot.send_flat_msg_with_limiter(flat, MessageType.FLATS, tg_user_id=subscriber)
-                elif existing_flat is not None and matched_price is None:
-                    await self.telegram_bot.send_flat_update_msg_with_limiter(flat, existing_flat.prices, tg_user_id=subscriber)
-            except Exception as e:
-                logger.error(e)
-                continue
-        return False
+        update = FlatUpdate(flat=flat, img_url=flat.get_img_url())
+        flat.compact()
+        return update
 
     def sort_flats_by_date_update(self, flats: List[Flat]) -> List[Flat]:
-        return sorted(flats, key=lambda x: x["object"].get("date_update", 0), reverse=True)
+        return sorted(flats, key=lambda x: x.object.date_update or 0, reverse=True)
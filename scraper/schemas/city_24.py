@@ -1,32 +1,56 @@
-from typing import TypedDict, Optional
+from typing import List, Optional, Union
+import msgspec
 
+from scraper.schemas.shared import decode_each
 
-class MainImageDict(TypedDict):
-    url: str
+# Only the fields used by the parser are declared, everything else in the response is skipped while decoding.
 
 
-class AddressDict(TypedDict, total=False):  # `total=False` makes fields optional
-    house_number: Optional[str]
-    street_name: str
-    district_name: str
+class MainImage(msgspec.Struct):
+    url: Optional[str] = None
 
 
-class AttributesDict(TypedDict, total=False):
-    HOUSE_TYPE: Optional[list[str]]
-    FLOOR: int
-    TOTAL_FLOORS: int
-    ON_LAST_FLOOR: bool
+class District(msgspec.Struct):
+    id: Union[int, str, None] = None
 
 
-class Flat(TypedDict, total=False):
-    main_image: MainImageDict
-    date_published: str
-    latitude: float
-    longitude: float
-    price: str
-    price_per_unit: float
-    property_size: str
+class Address(msgspec.Struct):
+    house_number: Optional[str] = None
+    street_name: Optional[str] = None
+    district: Optional[District] = None
+
+
+class Attributes(msgspec.Struct):
+    HOUSE_TYPE: Optional[List[str]] = None
+    FLOOR: Optional[int] = None
+    TOTAL_FLOORS: Optional[int] = None
+    ON_LAST_FLOOR: Optional[bool] = None
+
+
+class Flat(msgspec.Struct):
     friendly_id: str
-    address: AddressDict
-    room_count: int
-    attributes: AttributesDict
+    main_image: Optional[MainImage] = None
+    date_published: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    price: Union[int, float, str, None] = None
+    price_per_unit: Optional[float] = None
+    property_size: Union[int, float, str, None] = None
+    address: Address = msgspec.field(default_factory=Address)
+    room_count: Optional[int] = None
+    attributes: Attributes = msgspec.field(default_factory=Attributes)
+
+
+# lax mode accepts numbers sent as strings
+_page_decoder = msgspec.json.Decoder(List[Flat], strict=False)
+_raw_page_decoder = msgspec.json.Decoder(List[msgspec.Raw])
+_flat_decoder = msgspec.json.Decoder(Flat, strict=False)
+
+
+def decode_flats(data: bytes) -> List[Flat]:
+    """Decode a search response into typed flats in a single pass."""
+    try:
+        return _page_decoder.decode(data)
+    except msgspec.ValidationError:
+        # one listing with an unexpected shape should not cost the whole page
+        return decode_each(_raw_page_decoder.decode(data), _flat_decoder)
@@ -1,78 +1,109 @@
 from enum import Enum
-from typing import List, TypedDict, Union
+from typing import List, Optional, TypedDict, Union
+import msgspec
 
+from scraper.schemas.shared import decode_each
 
-class AdFilter(TypedDict, total=False):
-    id: int
-    name: str
+# Only the fields used by the parser are declared, everything else in the response is skipped while decoding.
+# Attributes are snake case, the API uses camel case.
 
 
-class FilterValue(TypedDict, total=False):
-    id: int
+class AdFilter(msgspec.Struct, rename="camel"):
+    id: Optional[int] = None
+    name: Optional[str] = None
 
 
-class AdFilterValue(TypedDict, total=False):
-    textValue: int | str
-    value: FilterValue
-    filter: AdFilter
+class AdFilterOption(msgspec.Struct, rename="camel"):
+    id: Optional[int] = None
 
 
-class Parent(TypedDict, total=False):
-    id: int
-    name: str
+class AdFilterValue(msgspec.Struct, rename="camel"):
+    text_value: Union[int, float, str, None] = None
+    value: Optional[AdFilterOption] = None
+    filter: AdFilter = msgspec.field(default_factory=AdFilter)
 
 
-class Region(TypedDict, total=False):
-    id: int
-    name: str
-    parent: Parent
+class Parent(msgspec.Struct, rename="camel"):
+    id: Optional[int] = None
+    name: Optional[str] = None
 
 
-class PublicLocation(TypedDict, total=False):
-    coordinateX: float
-    coordinateY: float
-    address: str
-    region: Region
+class Region(msgspec.Struct, rename="camel"):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    parent: Optional[Parent] = None
 
 
-class PriceType(TypedDict):
+class PublicLocation(msgspec.Struct, rename="camel"):
+    coordinate_x: Optional[float] = None
+    coordinate_y: Optional[float] = None
+    address: Optional[str] = None
+    region: Region = msgspec.field(default_factory=Region)
+
+
+class PriceTypeInfo(msgspec.Struct, rename="camel"):
     id: int
-    name: str
+    name: Optional[str] = None
 
 
-class PriceHistory(TypedDict):
-    value: str
+class PriceHistory(msgspec.Struct, rename="camel"):
+    value: Union[int, float, str]
     timestamp: str
-    priceType: PriceType
+    price_type: Optional[PriceTypeInfo] = None
 
 
-class Price(TypedDict, total=False):
-    value: str
-    priceType: PriceType
-    priceHistory: List[PriceHistory]
+class Price(msgspec.Struct, rename="camel"):
+    price_type: PriceTypeInfo
+    value: Union[int, float, str, None] = None
+    price_history: List[PriceHistory] = []
 
 
-class Thumbnail(TypedDict):
+class Thumbnail(msgspec.Struct, rename="camel"):
     extension: str
-    storageId: str
+    storage_id: str
+
+
+class Flat(msgspec.Struct, rename="camel"):
+    front_url: str
+    publish_date: str
+    public_location: PublicLocation = msgspec.field(
+        default_factory=PublicLocation)
+    ad_filter_values: List[AdFilterValue] = []
+    prices: List[Price] = []
+    thumbnail: Optional[Thumbnail] = None
+
+
+class Content(msgspec.Struct, rename="camel"):
+    data: List[Flat] = []
+    count: Optional[int] = None
+
+
+class LotsResponse(msgspec.Struct, rename="camel"):
+    content: Content = msgspec.field(default_factory=Content)
+
+
+class RawContent(msgspec.Struct, rename="camel"):
+    data: List[msgspec.Raw] = []
 
 
-class Flat(TypedDict, total=False):
-    publicLocation: PublicLocation
-    frontUrl: str
-    adFilterValues: List[AdFilterValue]
-    prices: List[Price]
-    publishDate: str
-    thumbnail: Thumbnail
+class RawLotsResponse(msgspec.Struct, rename="camel"):
+    content: RawContent = msgspec.field(default_factory=RawContent)
 
 
-class Content(TypedDict, total=False):
-    data: List[Flat]
-    count: int
+# lax mode accepts numbers sent as strings
+_page_decoder = msgspec.json.Decoder(LotsResponse, strict=False)
+_raw_page_decoder = msgspec.json.Decoder(RawLotsResponse)
+_flat_decoder = msgspec.json.Decoder(Flat, strict=False)
 
 
-class City24ResFlatsDict(TypedDict, total=False):
-    content: Content
+def decode_lots(data: bytes) -> LotsResponse:
+    """Decode a lots response into typed flats in a single pass."""
+    try:
+        return _page_decoder.decode(data)
+    except msgspec.ValidationError:
+        # one listing with an unexpected shape should not cost the whole page
+        raw = _raw_page_decoder.decode(data)
+        return LotsResponse(content=Content(data=decode_each(raw.content.data, _flat_decoder)))
 
 
 class FilterValue(TypedDict):
@@ -1,5 +1,14 @@
 from dataclasses import dataclass
 from enum import Enum
+from typing import List, TypeVar
+import msgspec
+
+from scraper.utils.logger import logger
+
+T = TypeVar("T")
+
+# placeholder for values a source does not provide
+UNKNOWN = "Nezināms"
 
 
 @dataclass
@@ -11,3 +20,14 @@ class Coordinates:
 class DealType(Enum):
     SELL = "Pārdod"
     RENT = "Izīrē"
+
+
+def decode_each(items: List[msgspec.Raw], decoder: msgspec.json.Decoder) -> List[T]:
+    """Decode raw listings one by one, skipping the ones that do not match the schema."""
+    decoded = []
+    for item in items:
+        try:
+            decoded.append(decoder.decode(item))
+        except msgspec.MsgspecError as e:
+            logger.warning(f"Skipping listing with unexpected shape: {e}")
+    return decoded
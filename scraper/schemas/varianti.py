@@ -1,53 +1,85 @@
-from typing import List, TypedDict
+from typing import List, Optional
+import msgspec
 
+from scraper.schemas.shared import decode_each
 
-class Image(TypedDict):
-    small: str
-    original: str
+# Only the fields used by the parser are declared, everything else in the response is skipped while decoding.
 
 
-class Object(TypedDict, total=False):
-    area: float
-    price: float
-    price_per_m: float
-    floor: int
-    floors_count: int
-    rooms_count: int
-    flat_building_type: int
-    date_create: int
-    date_update: int
+class Image(msgspec.Struct):
+    small: Optional[str] = None
+    original: Optional[str] = None
 
 
-class Address(TypedDict):
-    city_id: int
-    street: str
-    house: str
-    street_id: int
-    apartment: str
+class Object(msgspec.Struct):
+    area: Optional[float] = None
+    price: Optional[float] = None
+    price_per_m: Optional[float] = None
+    floor: Optional[int] = None
+    floors_count: Optional[int] = None
+    rooms_count: Optional[int] = None
+    flat_building_type: Optional[int] = None
+    date_create: Optional[int] = None
+    date_update: Optional[int] = None
 
 
-class Flat(TypedDict, total=False):
-    valid_from: int
+class Flat(msgspec.Struct):
     id: int
-    valid_till: int
-    address_name: str
-    address: Address
-    latitude: float
-    longitude: float
-    deal_type: int
-    category_type: int
-    object: Object
-    images: List[Image]
-
-
-class Result(TypedDict, total=False):
-    pages: int
-    total: int
-    list: List[Flat] | None
-
-
-class VariantiRes(TypedDict, total=False):
-    statusCode: str
-    errorCodes: List[str]
-    errorDescriptions: List[str]
-    result: Result
+    address_name: str = ""
+    valid_from: Optional[int] = None
+    valid_till: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    deal_type: Optional[int] = None
+    category_type: Optional[int] = None
+    object: Object = msgspec.field(default_factory=Object)
+    images: Optional[List[Image]] = None
+
+
+class Result(msgspec.Struct):
+    pages: Optional[int] = None
+    total: Optional[int] = None
+    list: Optional[List[Flat]] = None
+
+
+class VariantiRes(msgspec.Struct, rename="camel"):
+    status_code: Optional[str] = None
+    error_codes: Optional[List[str]] = None
+    error_descriptions: Optional[List[str]] = None
+    result: Optional[Result] = None
+
+
+class RawResult(msgspec.Struct):
+    pages: Optional[int] = None
+    total: Optional[int] = None
+    list: Optional[List[msgspec.Raw]] = None
+
+
+class RawVariantiRes(msgspec.Struct, rename="camel"):
+    status_code: Optional[str] = None
+    error_codes: Optional[List[str]] = None
+    error_descriptions: Optional[List[str]] = None
+    result: Optional[RawResult] = None
+
+
+# lax mode accepts numbers sent as strings
+_response_decoder = msgspec.json.Decoder(VariantiRes, strict=False)
+_raw_response_decoder = msgspec.json.Decoder(RawVariantiRes)
+_flat_decoder = msgspec.json.Decoder(Flat, strict=False)
+
+
+def decode_response(data: bytes) -> VariantiRes:
+    """Decode a list response into typed flats in a single pass."""
+    try:
+        return _response_decoder.decode(data)
+    except msgspec.ValidationError:
+        # one listing with an unexpected shape should not cost the whole page
+        raw = _raw_response_decoder.decode(data)
+        result = None
+        if raw.result is not None:
+            flats = None if raw.result.list is None else decode_each(
+                raw.result.list, _flat_decoder)
+            result = Result(pages=raw.result.pages,
+                            total=raw.result.total, list=flats)
+        return VariantiRes(status_code=raw.status_code, error_codes=raw.error_codes,
+                           error_descriptions=raw.error_descriptions, result=result)
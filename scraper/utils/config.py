@@ -26,6 +26,7 @@ class City24ParserConfig:
     name: str
     city_code: str  # Riga = 245396
     deal_type: Literal["sale", "rent"]
+    prefetch_pages: int = 2  # pages fetched ahead while the current one is processed
 
 
 @dataclass(frozen=True)
@@ -33,6 +34,7 @@ class PpParserConfig:
     name: str
     city_code: str
     deal_type: Literal["1", "5"]
+    prefetch_pages: int = 2  # pages fetched ahead while the current one is processed
 
 
 @dataclass(frozen=True)
@@ -40,6 +42,9 @@ class VariantiParserConfig:
     name: str
     city_code: str
     deal_type: Literal["sell", "rent"]
+    page_size: int = 50
+    parallel_pages: int = 3  # pages requested at once after the first one
+    max_connections: int = 2  # per host limit of the connector
 
 
 @dataclass
@@ -55,12 +60,130 @@ class TelegramConfig:
     sleep_time: float
 
 
+@dataclass(frozen=True)
+class RetentionPolicy:
+    source: str  # platform name or "*" for all sources
+    deal_type: str  # Pārdod / Izīrē
+    max_age_days: int  # flats without a price update for this long are archived
+
+
+@dataclass(frozen=True)
+class RetentionConfig:
+    enabled: bool
+    batch_size: int
+    image_max_age_days: int  # image bytes of older, non favourite flats are dropped
+    policies: List[RetentionPolicy]
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    max_entries: int  # flats kept in the known flat cache
+    verify_sample_size: int  # entries compared with the database after each run
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    queue_size: int  # items waiting between two stages
+    fetch_workers: int
+    parse_workers: int
+    dedupe_workers: int
+    image_workers: int
+    persist_workers: int
+    match_workers: int
+    notify_workers: int
+
+
+@dataclass(frozen=True)
+class ExecutorConfig:
+    processes: int  # worker processes for CPU heavy parsing, 0 runs it on the event loop
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    enabled: bool
+    host: str
+    port: int  # GET /metrics in the Prometheus text format
+
+
+@dataclass(frozen=True)
+class ProfilerConfig:
+    enabled: bool
+    sample_every_n_runs: int  # profile one in n runs of every job
+    interval_ms: float  # time between two stack samples
+    top_n: int  # functions in the summary
+    output_dir: str
+    jobs: List[str]  # job names to profile, all when empty
+
+
+@dataclass(frozen=True)
+class WatchdogConfig:
+    enabled: bool
+    interval_ms: float  # how often the loop lag is measured
+    threshold_ms: float  # lag at which the blocking stack is captured
+
+
+@dataclass(frozen=True)
+class SchedulerConfig:
+    adaptive: bool  # poll intervals learned from the run ledger, the fixed schedule otherwise
+    target_latency_minutes: float  # average time from publishing a flat to its notification
+    request_budget_per_day: int  # all jobs together, 0 for the cost of the fixed schedule
+    min_interval_minutes: float
+    max_interval_minutes: float
+    default_interval_minutes: float  # for jobs without enough history
+    min_runs: int  # finished runs needed to learn a job's rate
+    history_days: int
+    replan_minutes: float
+
+
+@dataclass(frozen=True)
+class CrawlQueueConfig:
+    enabled: bool  # share the fetch units of every run with the other replicas through postgres
+    lease_seconds: float  # a unit is retried when its replica misses heartbeats for this long
+    heartbeat_seconds: float
+    poll_seconds: float  # how often a replica looks for units of runs started elsewhere
+    max_attempts: int
+
+
+@dataclass(frozen=True)
+class LeaderConfig:
+    enabled: bool  # elect one replica to run the scheduler and telegram polling
+    lease_seconds: float  # a standby takes over at most this long after the leader is gone
+    renew_seconds: float
+    retry_seconds: float  # how often a standby tries to become the leader
+
+
+@dataclass(frozen=True)
+class CheckpointConfig:
+    enabled: bool  # record how far every fetch unit got, a restarted run resumes there
+    resume_window_minutes: float  # an interrupted run older than this starts over
+
+
+@dataclass(frozen=True)
+class BackfillConfig:
+    requests_per_second: float  # to the source, pages and images together
+    batch_size: int  # flats per bulk load, an interrupted backfill loses at most one batch
+    download_images: bool
+    resume_window_minutes: float  # an interrupted backfill older than this starts over
+
+
 @dataclass(frozen=True)
 class Config:
     name: str
     version: str
     parsers: ParserConfigs
     telegram: TelegramConfig
+    retention: RetentionConfig
+    cache: CacheConfig
+    pipeline: PipelineConfig
+    executor: ExecutorConfig
+    metrics: MetricsConfig
+    profiler: ProfilerConfig
+    watchdog: WatchdogConfig
+    scheduler: SchedulerConfig
+    crawl_queue: CrawlQueueConfig
+    leader: LeaderConfig
+    checkpoints: CheckpointConfig
+    backfill: BackfillConfig
 
 
 ################################ Platform Settings ################################
@@ -0,0 +1,65 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+from scraper.utils.config import ExecutorConfig
+from scraper.utils.logger import logger
+
+T = TypeVar("T")
+
+
+def _noop() -> None:
+    pass
+
+
+class ParseExecutor:
+    """
+    Runs CPU heavy work (page parsing, image resizing) in worker processes, so it scales with cores and
+    the event loop stays responsive for the telegram poller.
+
+    Without configured processes the work runs inline on the event loop, as before. Functions and
+    their arguments must be picklable, i.e. module level functions returning plain data.
+    Workers are started once on `configure` from a fork server, a clean process without threads. Forking
+    the application itself is not safe, the log listener thread and libvips may hold locks at that moment.
+    """
+
+    def __init__(self):
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.processes = 0
+
+    def configure(self, config: ExecutorConfig) -> None:
+        self.shutdown()
+        self.processes = config.processes
+        if self.processes <= 0:
+            return
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("forkserver"))
+        # start all workers now, the first parse should not wait for them
+        for future in [self.pool.submit(_noop) for _ in range(self.processes)]:
+            future.result()
+        logger.info(f"Parse executor started with {self.processes} processes")
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.pool is None:
+            return func(*args)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.pool, func, *args)
+        except BrokenProcessPool as e:
+            # a crashed worker breaks the whole pool, fall back to parsing inline
+            logger.error(
+                f"Parse executor is broken, running inline from now on: {e}")
+            self.shutdown()
+            return func(*args)
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+parse_executor = ParseExecutor()
@@ -2,6 +2,7 @@ import asyncio
 from typing import Callable
 
 from scraper.utils.logger import logger
+from scraper.utils.metrics import message_send_seconds, messages
 
 
 class RateLimiterQueue:
@@ -30,7 +31,7 @@ class RateLimiterQueue:
     def start(self):
         """Starts the rate limiter."""
         if self._task is None or self._task.done():
-            self._task = asyncio.create_task(self._worker())
+            self._task = asyncio.create_task(self._worker(), name="telegram rate limiter")
 
     async def add_request(self, request: Callable[[], asyncio.Future]):
         """
@@ -41,14 +42,33 @@ class RateLimiterQueue:
         """
 
         await self.queue.put(request)
+        messages.labels("queued").inc()
 
     async def _worker(self):
         """Background worker that processes requests from the queue at a controlled rate."""
         while True:
             try:
                 request = await self.queue.get()
-                await request()
+                with message_send_seconds.time():
+                    await request()
+                messages.labels("sent").inc()
             except Exception as e:
+                messages.labels("failed").inc()
                 logger.error(f"Failed to send message inside worker: {e}")
             finally:
                 await asyncio.sleep((self.per / self.rate) + self.buffer)
+
+
+class RequestThrottle:
+    """Spaces out requests to at most `rate` per second, callers wait in turn for their slot."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        # the slot is taken before sleeping, so concurrent callers queue up behind each other
+        slot = max(self._next_slot, loop.time())
+        self._next_slot = slot + self.interval
+        await asyncio.sleep(slot - loop.time())
@@ -1,16 +1,177 @@
+import asyncio
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 
 log_dir = "/var/log/app"
 os.makedirs(log_dir, exist_ok=True)
 
+# "json" for one JSON object per line, "text" for the plain format when running locally
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# repeats of a warning or error from the same line of code that are logged per window
+LOG_REPEAT_BURST = int(os.getenv("LOG_REPEAT_BURST", 10))
+LOG_REPEAT_WINDOW = float(os.getenv("LOG_REPEAT_WINDOW", 60))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one line of JSON, tracebacks are part of the message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.processName != "MainProcess":
+            entry["process"] = record.processName
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["message"] = f"{entry['message']}\n{record.exc_text}"
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Lets through `burst` warnings and errors per `window` seconds from each line of code and task.
+
+    The messages are f-strings, so the call site is the key, "Cannot map district with external id ..."
+    logged for every listing of a run becomes a few lines. The next record let through from that line
+    carries the number of suppressed ones. Info and debug records are not limited.
+    Call sites shared by all jobs are also told apart by the asyncio task, which is named after the job
+    and stage, and by the exception type, taken from `exc_info` or passed as `extra={"repeat_key": ...}`,
+    so an error does not hide a different one of another job. Tasks with a default name, e.g. the ones of
+    telegram updates, count as one task. Keys whose window ended are dropped once per window, together with
+    a suppressed count that was not reported yet.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        # (logger, path, line, task, repeat key) -> [window start, records in the window, suppressed records]
+        self._seen: Dict[Tuple[str, str, int, Optional[str], Optional[str]], list] = {}
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+
+        now = time.monotonic()
+        key = (record.name, record.pathname, record.lineno, self._task_name(), self._repeat_key(record))
+        with self._lock:
+            if now - self._pruned_at >= self.window:
+                self._prune(now)
+            seen = self._seen.get(key)
+            if seen is None or now - seen[0] >= self.window:
+                suppressed = seen[2] if seen is not None else 0
+                self._seen[key] = [now, 1, 0]
+            elif seen[1] < self.burst:
+                seen[1] += 1
+                suppressed = 0
+            else:
+                seen[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    def _prune(self, now: float) -> None:
+        self._seen = {key: seen for key, seen in self._seen.items() if now - seen[0] < self.window}
+        self._pruned_at = now
+
+    @staticmethod
+    def _task_name() -> Optional[str]:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            # not logged from the event loop's thread
+            return None
+        if task is None:
+            return None
+        name = task.get_name()
+        # default names are unique per task, e.g. every telegram update gets a new one
+        return "unnamed task" if name.startswith("Task-") else name
+
+    @staticmethod
+    def _repeat_key(record: logging.LogRecord) -> Optional[str]:
+        if record.exc_info and record.exc_info[0] is not None:
+            return record.exc_info[0].__name__
+        return getattr(record, "repeat_key", None)
+
+
+formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(formatter)
+
+# rotated instead of truncated on every start, so errors of the previous run are kept
+error_log_path = os.path.join(log_dir, "error.log")
+error_file_handler = logging.handlers.RotatingFileHandler(
+    error_log_path, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8")
+error_file_handler.setLevel(logging.ERROR)
+error_file_handler.setFormatter(formatter)
+
+# records are only put on a queue on the event loop, a thread formats and writes them
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+# merges the message and traceback before queueing, the listener's handlers do the formatting
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+repeat_filter = RepeatFilter(LOG_REPEAT_BURST, LOG_REPEAT_WINDOW)
+queue_handler.addFilter(repeat_filter)
+queue_listener = logging.handlers.QueueListener(
+    log_queue, stream_handler, error_file_handler, respect_handler_level=True)
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     handlers=[
-        logging.StreamHandler()
+        queue_handler
     ]
 )
+queue_listener.start()
+atexit.register(queue_listener.stop)
+
+
+def _log_directly_after_fork() -> None:
+    # the listener thread does not exist in forked parse workers, they write to the handlers themselves
+    root = logging.getLogger()
+    if queue_handler in root.handlers:
+        root.removeHandler(queue_handler)
+        repeat_filter._lock = threading.Lock()
+        for handler in (stream_handler, error_file_handler):
+            handler.addFilter(repeat_filter)
+            root.addHandler(handler)
+
+
+os.register_at_fork(after_in_child=_log_directly_after_fork)
 
 # handle sqlachemy logs
 sqlalchemy_logger = logging.getLogger("sqlalchemy.engine")
@@ -25,11 +186,3 @@ pyvips_logger.propagate = False
 pyvips_logger.handlers.clear()
 
 logger = logging.getLogger(__name__)
-
-error_log_path = os.path.join(log_dir, "error.log")
-error_file_handler = logging.FileHandler(error_log_path, mode="w")
-error_file_handler.setLevel(logging.ERROR)
-error_file_handler.setFormatter(logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
-
-logger.addHandler(error_file_handler)
@@ -1,5 +1,5 @@
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime, timezone, tzinfo
 from typing import List, Optional
 from zoneinfo import ZoneInfo
 from fake_useragent import UserAgent
@@ -40,9 +40,20 @@ def try_parse_float(value: str, ndigits: int = 1) -> float:
         return 0.0
 
 
+# set by the replay benchmark, so that date cut-offs are evaluated at the time the traffic was recorded
+frozen_now: Optional[datetime] = None
+
+
+def current_time(tz: tzinfo) -> datetime:
+    """The current time in the given timezone, or the frozen time when set."""
+    if frozen_now is not None:
+        return frozen_now.astimezone(tz)
+    return datetime.now(tz)
+
+
 def get_start_of_day() -> int:
     """Get the start of the current day in Unix timestamp."""
-    now = datetime.now(timezone.utc).replace(
+    now = current_time(timezone.utc).replace(
         hour=0, minute=0, second=0, microsecond=0)
     start_of_day = datetime(now.year, now.month, now.day)
     return int(start_of_day.timestamp())
@@ -86,7 +97,7 @@ def find_flat_price(curr_price: int, prev_prices: List[Price]) -> Optional[Price
 def valid_date_published(date_published_str: str) -> bool:
     """Check if date published is after start of the day in EET"""
 
-    now = datetime.now(ZoneInfo("Europe/Riga"))
+    now = current_time(ZoneInfo("Europe/Riga"))
     start_of_day = datetime(now.year, now.month, now.day,
                             0, 0, 0, tzinfo=ZoneInfo("Europe/Riga"))
     date_published = datetime.fromisoformat(date_published_str)
@@ -0,0 +1,144 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               disable_created_metrics, generate_latest)
+from prometheus_client.core import Metric
+
+from scraper.utils.logger import logger
+
+# seconds, the last bucket is +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# (name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class CallbackCollector:
+    """A metric whose samples are produced by a function when scraped, for stats kept elsewhere."""
+
+    def __init__(self, name: str, documentation: str, type: str, function: Callable[[], List[Sample]]):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.function = function
+
+    def collect(self) -> Iterable[Metric]:
+        try:
+            samples = self.function()
+        except Exception as e:
+            logger.error(f"Failed to collect metric {self.name}: {e}")
+            return []
+        metric = Metric(self.name, self.documentation, self.type)
+        for suffix, labels, value in samples:
+            metric.add_sample(f"{self.name}{suffix}", labels, value)
+        return [metric]
+
+
+class MetricsRegistry:
+    """
+    Metrics of the process on a prometheus_client registry, names get the `scraper_` prefix.
+
+    Label values must have a low cardinality (sources, deal types, stages), every combination
+    is kept for the lifetime of the process.
+    """
+
+    def __init__(self, prefix: str = "scraper"):
+        self.prefix = prefix
+        self.registry = CollectorRegistry()
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, name: str, factory: Callable[[str], object]):
+        name = f"{self.prefix}_{name}"
+        existing = self.metrics.get(name)
+        if existing is not None:
+            return existing
+        metric = self.metrics[name] = factory(name)
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Counter:
+        return self._register(name, lambda full_name: Counter(
+            full_name, documentation, label_names, registry=self.registry))
+
+    def gauge(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Gauge:
+        return self._register(name, lambda full_name: Gauge(
+            full_name, documentation, label_names, registry=self.registry))
+
+    def histogram(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda full_name: Histogram(
+            full_name, documentation, label_names, registry=self.registry, buckets=buckets))
+
+    def callback(self, name: str, documentation: str, type: str,
+                 function: Callable[[], List[Sample]]) -> CallbackCollector:
+        def register(full_name: str) -> CallbackCollector:
+            collector = CallbackCollector(full_name, documentation, type, function)
+            self.registry.register(collector)
+            return collector
+        return self._register(name, register)
+
+    def render(self) -> bytes:
+        return generate_latest(self.registry)
+
+
+class MetricsServer:
+    """Serves the registry on GET /metrics."""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render(),
+                            headers={"Content-Type": CONTENT_TYPE_LATEST, "X-Content-Type-Options": "nosniff"})
+
+
+# one series per counter and histogram child, without the *_created timestamps
+disable_created_metrics()
+
+metrics = MetricsRegistry()
+
+################################ Scraper metrics ################################
+
+http_requests = metrics.counter(
+    "http_requests", "HTTP requests to the listing sites, pages and images", ["source", "status"])
+http_response_bytes = metrics.counter(
+    "http_response_bytes", "Response body bytes received from the listing sites", ["source"])
+http_request_seconds = metrics.histogram(
+    "http_request_seconds", "HTTP request duration until the response headers", ["source"])
+http_requests_in_flight = metrics.gauge(
+    "http_requests_in_flight", "HTTP requests waiting for a response", ["source"])
+http_connection_wait_seconds = metrics.histogram(
+    "http_connection_wait_seconds", "Time requests wait for a free connection of the session pool", ["source"])
+
+stage_seconds = metrics.histogram(
+    "stage_seconds", "Time a pipeline stage spends on one item, fetch covers a whole unit",
+    ["source", "deal_type", "stage"])
+stage_items = metrics.counter(
+    "stage_items", "Items handled by a pipeline stage by outcome", ["source", "deal_type", "stage", "outcome"])
+matched_subscribers = metrics.counter(
+    "matched_subscribers", "Subscribers matched to new or updated flats", ["source", "deal_type"])
+
+messages = metrics.counter(
+    "telegram_messages", "Telegram messages by status: queued, sent or failed", ["status"])
+message_send_seconds = metrics.histogram(
+    "telegram_message_send_seconds", "Time to send one telegram message")
+
+loop_lag_seconds = metrics.histogram(
+    "event_loop_lag_seconds", "How late the loop watchdog wakes up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+loop_stalls = metrics.counter(
+    "event_loop_stalls", "Event loop stalls over the watchdog threshold by the blocking task", ["task"])
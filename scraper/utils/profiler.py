@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from scraper.utils.config import ProfilerConfig
+from scraper.utils.logger import logger
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """
+    Samples the stack of the event loop thread from a background thread.
+
+    A running coroutine is called from the frame awaiting it, so the samples show the whole await
+    chain of the task that holds the loop, down to `Task.__step`. Samples where the loop waits in
+    `select` are the idle share of the run.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="scrape-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[Stack] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            # root first, as in the folded stack format
+            self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class ScrapeProfiler:
+    """
+    Profiles one in `sample_every_n_runs` runs of every scrape job with a sampling profiler.
+
+    Each profiled run writes `<job>-<time>.folded`, collapsed stacks for flamegraph.pl or speedscope,
+    and `<job>-<time>.txt` with the hottest functions to the output directory. The cost is a stack walk
+    of the loop thread per sample, work done in the parse executor processes is not sampled.
+    """
+
+    def __init__(self):
+        self.config: Optional[ProfilerConfig] = None
+        self.runs: Dict[str, int] = Counter()
+        self._active = False
+
+    def configure(self, config: ProfilerConfig) -> None:
+        self.config = config
+        if config.enabled:
+            os.makedirs(config.output_dir, exist_ok=True)
+            logger.info(
+                f"Profiling one in {config.sample_every_n_runs} runs every {config.interval_ms} ms to {config.output_dir}")
+
+    def should_profile(self, job: str) -> bool:
+        config = self.config
+        if config is None or not config.enabled or self._active:
+            return False
+        if config.jobs and job not in config.jobs:
+            return False
+        self.runs[job] += 1
+        return (self.runs[job] - 1) % max(config.sample_every_n_runs, 1) == 0
+
+    @asynccontextmanager
+    async def profile(self, job: str) -> AsyncIterator[None]:
+        if not self.should_profile(job):
+            yield
+            return
+
+        self._active = True
+        sampler = _Sampler(threading.get_ident(), self.config.interval_ms / 1000)
+        started_at = datetime.now()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            elapsed = time.perf_counter() - start
+            await asyncio.to_thread(sampler.join)
+            self._active = False
+            try:
+                await asyncio.to_thread(self.write, job, started_at, elapsed, sampler.samples)
+            except Exception as e:
+                logger.error(f"Error writing the profile of {job}: {e}")
+
+    def write(self, job: str, started_at: datetime, elapsed: float, samples: Counter) -> None:
+        name = f"{job.replace('/', '_')}-{started_at.strftime('%Y%m%d-%H%M%S')}"
+        path = os.path.join(self.config.output_dir, name)
+
+        with open(f"{path}.folded", "w", encoding="utf-8") as file:
+            for stack, count in samples.most_common():
+                file.write(f"{';'.join(stack)} {count}\n")
+
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in samples.items():
+            own[stack[-1]] += count
+            # recursive functions are counted once per sample
+            for label in set(stack):
+                total[label] += count
+
+        sample_count = sum(samples.values())
+        lines = [f"Profile of {job} started {started_at:%Y-%m-%d %H:%M:%S}, {elapsed:.1f}s, "
+                 f"{sample_count} samples every {self.config.interval_ms} ms",
+                 "",
+                 f"Top {self.config.top_n} functions by own samples:",
+                 f"{'own %':>7} {'total %':>8}  function"]
+        for label, count in own.most_common(self.config.top_n):
+            lines.append(f"{count / sample_count * 100:7.1f} {total[label] / sample_count * 100:8.1f}  {label}")
+        with open(f"{path}.txt", "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        logger.info(f"Wrote the profile of {job} to {path}.folded and {path}.txt")
+
+
+scrape_profiler = ScrapeProfiler()
@@ -0,0 +1,161 @@
+import asyncio
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from apscheduler.job import Job
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from scraper.database.crud import get_scrape_runs_since
+from scraper.database.models.scrape_run import ScrapeRun
+from scraper.parsers.base import BaseParser
+from scraper.parsers.flat.base import utc_now
+from scraper.utils.config import SchedulerConfig
+from scraper.utils.logger import logger
+
+# the fixed schedule, used when the adaptive scheduler is off and as its default crawl budget
+FIXED_SCHEDULE_HOURS = "9,12,15,18,21"
+FIXED_RUNS_PER_DAY = len(FIXED_SCHEDULE_HOURS.split(","))
+
+MINUTES_PER_DAY = 24 * 60
+
+
+@dataclass
+class StreamStats:
+    """What the run ledger tells about one job: how fast listings arrive and what a run costs."""
+    job: str
+    runs: int
+    arrival_rate: float  # new flats per minute
+    requests_per_run: float
+    last_started_at: Optional[datetime] = None
+
+
+def stream_stats(runs: Iterable[ScrapeRun], max_gap: timedelta) -> Dict[str, StreamStats]:
+    """
+    Estimate the arrival rate of every job from its finished runs, oldest first.
+
+    A run finds the flats that arrived since the previous finished run, so the rate is the new flats
+    over the time covered by the runs. Gaps longer than `max_gap` (downtime) are not counted, the
+    listings of a source do not reach that far back.
+    """
+    by_job: Dict[str, List[ScrapeRun]] = {}
+    for run in runs:
+        if run.status == "finished":
+            by_job.setdefault(run.job, []).append(run)
+
+    stats = {}
+    for job, job_runs in by_job.items():
+        new_flats = 0
+        minutes = 0.0
+        for previous, run in zip(job_runs, job_runs[1:]):
+            gap = run.started_at - previous.started_at
+            if gap <= max_gap:
+                new_flats += run.new_flats
+                minutes += gap.total_seconds() / 60
+        requests = [run.requests for run in job_runs if run.requests]
+        stats[job] = StreamStats(
+            job=job, runs=len(job_runs), arrival_rate=new_flats / minutes if minutes else 0.0,
+            requests_per_run=sum(requests) / len(requests) if requests else 0.0,
+            last_started_at=job_runs[-1].started_at)
+    return stats
+
+
+def plan_intervals(stats: Dict[str, StreamStats], config: SchedulerConfig) -> Dict[str, float]:
+    """
+    Poll intervals in minutes for the jobs with enough history.
+
+    A flat waits half an interval on average, so intervals of twice the target latency meet it. When that
+    costs more than the request budget, the budget is spread to minimise the latency of all flats:
+    interval ~ sqrt(requests per run / arrival rate), busy and cheap streams are polled more often.
+    Streams without new flats are polled at the longest interval.
+    """
+    learned = {job: stream for job, stream in stats.items()
+               if stream.runs >= config.min_runs and stream.requests_per_run > 0}
+    if not learned:
+        return {}
+
+    budget = config.request_budget_per_day or \
+        sum(stream.requests_per_run for stream in learned.values()) * FIXED_RUNS_PER_DAY
+
+    def cost(job: str, interval: float) -> float:
+        return learned[job].requests_per_run * MINUTES_PER_DAY / interval
+
+    # polling faster than twice the target latency is not needed
+    shortest = min(max(config.min_interval_minutes, 2 * config.target_latency_minutes), config.max_interval_minutes)
+    longest = config.max_interval_minutes
+    intervals = {job: longest for job, stream in learned.items() if stream.arrival_rate <= 0}
+    free = {job: stream for job, stream in learned.items() if stream.arrival_rate > 0}
+    while free:
+        left = budget - sum(cost(job, interval) for job, interval in intervals.items())
+        scale = MINUTES_PER_DAY * sum(math.sqrt(stream.requests_per_run * stream.arrival_rate)
+                                      for stream in free.values()) / max(left, 1)
+        proposed = {job: scale * math.sqrt(stream.requests_per_run / stream.arrival_rate)
+                    for job, stream in free.items()}
+        # streams outside the bounds are fixed at them and the rest of the budget is spread again
+        bounded = {job: min(max(interval, shortest), longest) for job, interval in proposed.items()
+                   if not shortest <= interval <= longest}
+        if not bounded:
+            intervals.update(proposed)
+            break
+        intervals.update(bounded)
+        for job in bounded:
+            del free[job]
+    return intervals
+
+
+class AdaptiveScheduler:
+    """
+    Runs every scrape job on an interval learned from the run ledger.
+
+    Jobs without enough history run every `default_interval_minutes`. Every `replan_minutes` the arrival
+    rates and request costs of the last `history_days` are read and the intervals changed, a job keeps
+    its phase, its next run is counted from its last start.
+    """
+
+    def __init__(self, scheduler: AsyncIOScheduler, config: SchedulerConfig):
+        self.scheduler = scheduler
+        self.config = config
+        self.jobs: Dict[str, Job] = {}
+        self.intervals: Dict[str, float] = {}
+
+    def add(self, name: str, parser: BaseParser, loop: asyncio.AbstractEventLoop) -> Job:
+        interval = self.config.default_interval_minutes
+        # spread the first runs over the first interval, like the minute offsets of the fixed schedule
+        start_date = utc_now() + timedelta(minutes=3 * len(self.jobs))
+        parser.job = self.scheduler.add_job(
+            self._submit(parser, loop), "interval", minutes=interval, start_date=start_date, name=name)
+        self.jobs[name] = parser.job
+        self.intervals[name] = interval
+        return parser.job
+
+    def _submit(self, parser: BaseParser, loop: asyncio.AbstractEventLoop) -> Callable[[], None]:
+        return lambda: asyncio.run_coroutine_threadsafe(parser.run(), loop)
+
+    async def replan(self) -> None:
+        since = utc_now() - timedelta(days=self.config.history_days)
+        try:
+            runs = await get_scrape_runs_since(since)
+        except Exception as e:
+            logger.error(f"Error reading the run ledger for the scheduler: {e}")
+            return
+
+        stats = stream_stats(runs, timedelta(minutes=2 * self.config.max_interval_minutes))
+        intervals = plan_intervals(stats, self.config)
+        for name, job in self.jobs.items():
+            interval = intervals.get(name, self.config.default_interval_minutes)
+            current = self.intervals[name]
+            # small changes are not worth moving the schedule
+            if abs(interval - current) < current * 0.1:
+                continue
+
+            stream = stats.get(name)
+            last_started_at = stream.last_started_at if stream is not None else None
+            job.reschedule("interval", minutes=interval, start_date=last_started_at or utc_now())
+            self.intervals[name] = interval
+            if stream is not None:
+                logger.info(
+                    f"Polling {name} every {interval:.0f} min, was {current:.0f} min: "
+                    f"{stream.arrival_rate * 60:.2f} new flats/h, {stream.requests_per_run:.0f} requests/run")
+            else:
+                logger.info(f"Polling {name} every {interval:.0f} min, not enough history")
@@ -1,20 +1,28 @@
 from enum import Enum
 import os
 import asyncio
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from typing import List
+from zoneinfo import ZoneInfo
 
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import BufferedInputFile
 from aiogram.filters import Command
 from aiogram.types import BotCommand
-from scraper.database.crud import add_favorite, remove_favorite, get_favourites
+from scraper.database.crud import add_favorite, get_scrape_runs_since, remove_favorite, get_favourites
+from scraper.database.models.scrape_run import ScrapeRun
 from scraper.database.models.price import Price
 from scraper.parsers.flat.base import Flat
 from scraper.utils.logger import logger
 from scraper.utils.limiter import RateLimiterQueue
 
 
+RIGA = ZoneInfo("Europe/Riga")
+
+
 class MessageType(Enum):
     FLATS = "flats"
     FAVOURITES = "favourites"
@@ -23,9 +31,13 @@ class MessageType(Enum):
 class TelegramBot:
     def __init__(self, rate_limiter: RateLimiterQueue):
         self.token = os.getenv("TELEGRAM_TOKEN")
-        self.bot = Bot(token=self.token)
+        # a local bot api server or a stand-in for benchmarks, the public api by default
+        api_url = os.getenv("TELEGRAM_API_URL")
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None
+        self.bot = Bot(token=self.token, session=session)
         self.dp = Dispatcher()
         self.rate_limiter = rate_limiter
+        self.admin_tg_id = os.getenv("ADMIN_TELEGRAM_ID")
 
         # Register handlers
         self.dp.callback_query.register(
@@ -35,6 +47,7 @@ class TelegramBot:
         self.dp.message.register(
             self.send_favorites, Command("favorites"))
         self.dp.message.register(self.handle_start, Command("start"))
+        self.dp.message.register(self.handle_stats, Command("stats"))
 
     async def set_bot_commands(self):
         commands = [
@@ -51,6 +64,17 @@ class TelegramBot:
         text = "Sveiki! Esmu bots, kas jums palīdzēs saņemt nekustamā īpašuma sludinājumu paziņojumus un sekot līdzi cenu izmaiņām!"
         await self.send_text_msg_with_limiter(text, message.from_user.id)
 
+    async def handle_stats(self, message: types.Message):
+        """Handles the admin only /stats command with a summary of the recent scrape runs."""
+        if self.admin_tg_id is None or str(message.from_user.id) != self.admin_tg_id:
+            return
+        try:
+            now = datetime.now(timezone.utc)
+            runs = await get_scrape_runs_since(now - timedelta(days=14))
+            await self.send_text_msg_with_limiter(self.runs_to_msg(runs, now), message.from_user.id)
+        except Exception as e:
+            logger.error(f"Error sending scrape run stats: {e}")
+
     async def handle_add_to_favorites(self, call: types.CallbackQuery):
         """Handles adding a flat to favorites."""
         try:
@@ -237,6 +261,54 @@ class TelegramBot:
         )
         return text
 
+    def runs_to_msg(self, runs: List[ScrapeRun], now: datetime) -> str:
+        """Summarises the last run of every job and compares the last 7 days with the 7 days before."""
+        if not runs:
+            return "No scrape runs in the last 14 days"
+
+        def duration(run: ScrapeRun) -> float:
+            return (run.finished_at - run.started_at).total_seconds()
+
+        def minutes(seconds: float) -> str:
+            return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
+
+        def average(values: List[float]) -> float:
+            return sum(values) / len(values) if values else 0.0
+
+        runs_by_job = defaultdict(list)
+        for run in runs:
+            runs_by_job[run.job].append(run)
+
+        week_ago = now - timedelta(days=7)
+        lines = []
+        for job, job_runs in sorted(runs_by_job.items()):
+            # skipped runs only count as overruns
+            started = [run for run in job_runs if run.status != "skipped"] or job_runs
+            last = started[-1]
+            finished = [run for run in started if run.finished_at is not None and run.status != "skipped"]
+            recent = [duration(run) for run in finished if run.started_at >= week_ago]
+            previous = [duration(run) for run in finished if run.started_at < week_ago]
+
+            if last.finished_at is None:
+                lines.append(f"{job}: running since {last.started_at.astimezone(RIGA).strftime('%d.%m %H:%M')}")
+            else:
+                lines.append(
+                    f"{job}: {last.status} {last.started_at.astimezone(RIGA).strftime('%d.%m %H:%M')} in "
+                    f"{minutes(duration(last))}, {last.listings} listings, {last.new_flats} new, "
+                    f"{last.updated_flats} updated, {last.skipped} skipped, {last.failed} failed, "
+                    f"{last.notifications} messages")
+
+            trend = ""
+            if recent and previous:
+                change = (average(recent) - average(previous)) / average(previous) * 100 if average(previous) else 0
+                trend = f" ({'+' if change >= 0 else ''}{change:.0f}% vs {minutes(average(previous))} the week before)"
+            overruns = sum(run.overran_slot or run.overlapped for run in job_runs if run.started_at >= week_ago)
+            failures = sum(run.status == "failed" for run in job_runs if run.started_at >= week_ago)
+            lines.append(f"  7d: avg {minutes(average(recent))}{trend}, {failures} failed, {overruns} overran")
+
+        # the job names contain underscores, a code block keeps Markdown from parsing them
+        return "```\n" + "\n".join(lines) + "\n```"
+
     def flat_to_msg(self, flat: Flat, counter: int = None) -> str:
         """Generates the message text for a flat."""
         text = (
@@ -260,6 +332,14 @@ class TelegramBot:
         await self.set_bot_commands()
         await self._start_polling()
 
+    async def stop_polling(self):
+        """Stop polling, e.g. when another replica took over the bot."""
+        try:
+            await self.dp.stop_polling()
+        except RuntimeError:
+            # not polling
+            pass
+
     async def _start_polling(self):
         """Starts polling the bot asynchronously."""
         try:
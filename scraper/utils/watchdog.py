@@ -0,0 +1,107 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Optional
+
+from scraper.utils.config import WatchdogConfig
+from scraper.utils.logger import logger
+from scraper.utils.metrics import loop_lag_seconds, loop_stalls
+
+# frames of the blocking stack kept in the log, innermost last
+STACK_LIMIT = 20
+
+
+@dataclass
+class Stall:
+    task: str
+    stack: str
+
+
+class LoopWatchdog:
+    """
+    Measures the event loop lag and finds the code that blocks the loop.
+
+    A task on the loop sleeps for `interval_ms` and records how late it wakes up. A thread checks
+    that task's heartbeat, once it is `threshold_ms` overdue the loop is blocked and the thread takes
+    the stack of the loop thread, i.e. of the blocking call, and the name of the running task.
+    Tasks of scrape jobs are named after the job and pipeline stage. The stall is logged when the loop
+    is responsive again, together with how long it was blocked.
+    """
+
+    def __init__(self):
+        self.config: Optional[WatchdogConfig] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self._heartbeat = 0.0
+        self._stall: Optional[Stall] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self, config: WatchdogConfig) -> None:
+        self.config = config
+        if not config.enabled or self._task is not None:
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._measure(), name="loop watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog started, stalls over {config.threshold_ms} ms are logged")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        interval = self.config.interval_ms / 1000
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(interval)
+            lag = max(self.loop.time() - start - interval, 0.0)
+            loop_lag_seconds.observe(lag)
+            self._heartbeat = time.monotonic()
+
+            stall = self._stall
+            if stall is not None:
+                self._stall = None
+                loop_stalls.labels(stall.task).inc()
+                logger.warning(
+                    f"Event loop was blocked for {lag:.3f}s by {stall.task}, blocking call:\n{stall.stack}")
+
+    def _watch(self) -> None:
+        interval = self.config.interval_ms / 1000
+        threshold = self.config.threshold_ms / 1000
+        while not self._stop_event.wait(interval):
+            if self._stall is not None or time.monotonic() - self._heartbeat < interval + threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = self._running_task_name()
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+            self._stall = Stall(task, stack)
+
+    def _running_task_name(self) -> str:
+        try:
+            task = asyncio.current_task(self.loop)
+        except Exception:
+            task = None
+        if task is None:
+            # a plain callback, e.g. an aiohttp protocol or a scheduler call
+            return "callback"
+        name = task.get_name()
+        # default names are unique per task, keep the metric labels bounded
+        return "unnamed task" if name.startswith("Task-") else name
+
+
+loop_watchdog = LoopWatchdog()
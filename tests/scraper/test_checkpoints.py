@@ -0,0 +1,129 @@
+"""
+Resuming scrape runs from their checkpoints, with the checkpoint table kept in memory.
+
+    python -m unittest discover -s tests -t .
+"""
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+from scraper.database import checkpoints
+from scraper.database.checkpoints import scrape_checkpoints
+from scraper.database.models.scrape_checkpoint import ScrapeCheckpoint
+from scraper.parsers import base
+from scraper.parsers.base import BaseParser
+from scraper.parsers.pipeline import Pipeline, Stage
+from scraper.schemas.shared import DealType
+from scraper.utils.config import CheckpointConfig, PipelineConfig, Source
+
+PIPELINE = PipelineConfig(queue_size=10, fetch_workers=2, parse_workers=1, dedupe_workers=1, image_workers=1,
+                          persist_workers=1, match_workers=1, notify_workers=1)
+UNITS = ["centre", "teika"]
+PAGES = 3
+
+
+class CheckpointTable:
+    """The scrape_checkpoints rows of one job."""
+
+    def __init__(self):
+        self.rows: dict[str, ScrapeCheckpoint] = {}
+
+    async def get(self, job):
+        return list(self.rows.values())
+
+    async def save(self, job, unit, page, last_listing_id, done, updated_at):
+        self.rows[unit] = ScrapeCheckpoint(job=job, unit=unit, page=page, last_listing_id=last_listing_id,
+                                           done=done, updated_at=updated_at)
+
+    async def finish(self, job, unit, updated_at):
+        self.rows[unit].done = True
+        self.rows[unit].updated_at = updated_at
+
+    async def delete(self, job):
+        self.rows.clear()
+
+
+class FakeParser(BaseParser):
+    """Fetches `PAGES` pages of one listing per unit, `failing_unit` fails after its first page."""
+
+    def __init__(self, failing_unit=None, blocking_unit=None):
+        with mock.patch.object(BaseParser, "get_settings", return_value=({}, {}, {}, "sell")):
+            super().__init__(Source.SS, DealType.SELL, mock.Mock(), PIPELINE)
+        self.failing_unit = failing_unit
+        self.blocking_unit = blocking_unit
+        self.fetched: list[tuple[str, int]] = []
+
+    @asynccontextmanager
+    async def create_session(self):
+        yield None
+
+    def fetch_units(self):
+        return UNITS
+
+    async def fetch(self, unit):
+        page = self.resume_page(unit) or 1
+        while page <= PAGES:
+            self.fetched.append((unit, page))
+            yield f"{unit}-{page}"
+            await self.checkpoint(unit, page, f"{unit}-{page}")
+            if unit == self.failing_unit:
+                raise ValueError("the page layout changed")
+            if unit == self.blocking_unit and page == 2:
+                await asyncio.Event().wait()
+            page += 1
+
+    async def parse(self, listing):
+        return listing
+
+    def create_pipeline(self) -> Pipeline:
+        return Pipeline(self.job_name, [
+            Stage("fetch", self.fetch_checkpointed, PIPELINE.fetch_workers, PIPELINE.queue_size),
+            Stage("parse", self.parse, PIPELINE.parse_workers, PIPELINE.queue_size),
+        ])
+
+
+class ResumeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.table = CheckpointTable()
+        patches = [
+            mock.patch.object(checkpoints, "get_scrape_checkpoints", self.table.get),
+            mock.patch.object(checkpoints, "save_scrape_checkpoint", self.table.save),
+            mock.patch.object(checkpoints, "finish_scrape_checkpoint", self.table.finish),
+            mock.patch.object(checkpoints, "delete_scrape_checkpoints", self.table.delete),
+            mock.patch.object(BaseParser, "_start_run", mock.AsyncMock(return_value=None)),
+            mock.patch.object(base.known_flat_cache, "verify", mock.AsyncMock()),
+            mock.patch.object(base.postgres_instance, "pool_stats", mock.Mock(return_value={})),
+            mock.patch.object(scrape_checkpoints, "config", CheckpointConfig(enabled=True, resume_window_minutes=60)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_finished_run_with_failed_unit_does_not_resume(self):
+        parser = FakeParser(failing_unit="teika")
+        await parser._scrape_and_report()
+        self.assertEqual(parser.pipeline.stages[0].failed, 1)
+        self.assertEqual(self.table.rows, {})
+
+        parser = FakeParser()
+        await parser._scrape_and_report()
+        self.assertEqual(sorted(parser.fetched), [(unit, page) for unit in UNITS for page in range(1, PAGES + 1)])
+
+    async def test_interrupted_run_resumes(self):
+        parser = FakeParser(blocking_unit="teika")
+        run = asyncio.create_task(parser._scrape_and_report())
+        while not (self.table.rows.get('"centre"') and self.table.rows['"centre"'].done and
+                   self.table.rows.get('"teika"') and self.table.rows['"teika"'].page == 2):
+            await asyncio.sleep(0.01)
+        run.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await run
+
+        parser = FakeParser()
+        await parser._scrape_and_report()
+        self.assertEqual(parser.fetched, [("teika", 2), ("teika", 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
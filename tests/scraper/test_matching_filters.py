@@ -0,0 +1,57 @@
+"""
+The statement that finds the subscribers of a flat, checked without a database.
+
+The filters keep their ranges with inclusive bounds, a flat matches when each of its values is an element
+of the filter's range. Before, the values were sent as the half open range `[x,x)`, which is empty, so
+every filter contained it and the room, price, area and floor ranges matched every flat.
+
+    python -m unittest discover -s tests -t .
+"""
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+from sqlalchemy import Numeric
+from sqlalchemy.dialects import postgresql
+
+from scraper.database import crud
+from scraper.database.crud import MATCHING_FILTERS_QUERY, get_matching_filters_tg_user_ids
+from scraper.schemas.shared import DealType
+
+RANGES = {"rooms": "room_range", "price": "price_range", "area": "area_range", "floor": "floor_range"}
+
+
+class MatchingFiltersQueryTest(unittest.TestCase):
+    def test_values_are_elements_of_the_ranges(self):
+        compiled = MATCHING_FILTERS_QUERY.compile(dialect=postgresql.dialect())
+        sql = str(compiled)
+        for param, column in RANGES.items():
+            with self.subTest(param=param):
+                self.assertIn(f"filters.{column} @> %({param})s", sql)
+                self.assertIsInstance(compiled.binds[param].type, Numeric)
+        self.assertNotIn("numrange", sql.lower())
+
+
+class GetMatchingFiltersTest(unittest.IsolatedAsyncioTestCase):
+    async def test_flat_values_are_bound(self):
+        result = mock.Mock()
+        result.scalars.return_value.all.return_value = [42]
+        conn = mock.Mock(execute=mock.AsyncMock(return_value=result))
+
+        @asynccontextmanager
+        async def connect():
+            yield conn
+
+        with mock.patch.object(crud.postgres_instance, "engine", mock.Mock(connect=connect)):
+            tg_user_ids = await get_matching_filters_tg_user_ids(
+                "Rīga", "Centrs", DealType.SELL, rooms=3, price=120000, area=64, floor=5)
+
+        self.assertEqual(tg_user_ids, [42])
+        statement, params = conn.execute.call_args.args
+        self.assertIs(statement, MATCHING_FILTERS_QUERY)
+        self.assertEqual(params, {"city": "Rīga", "district": "Centrs", "deal_type": DealType.SELL.value,
+                                  "rooms": 3, "price": 120000, "area": 64, "floor": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+The single pass ss.lv extractor checked against trimmed ss.lv list pages in fixtures/ss.
+
+Every `<page>.html` has a `<page>.json` with the rows and page numbers it must produce. The rows are also
+compared with the previous BeautifulSoup extraction, which paired images with rows by position.
+
+    python -m unittest discover -s tests -t .
+"""
+import json
+import unittest
+from pathlib import Path
+
+from scraper.benchmarks.ss_extract import extract_list_page_bs4
+from scraper.parsers.extract.ss import extract_list_page, parse_list_page
+from scraper.schemas.shared import DealType
+
+FIXTURES = Path(__file__).parent / "fixtures" / "ss"
+FLAT_SERIES = {series: series for series in
+               ["Staļina", "Specpr.", "Hrušč.", "Jaun.", "P. kara", "LT proj.", "602.", "103."]}
+
+
+def load_fixture(name: str) -> tuple[bytes, dict]:
+    html = (FIXTURES / f"{name}.html").read_bytes()
+    expected = json.loads((FIXTURES / f"{name}.json").read_text(encoding="utf-8"))
+    return html, expected
+
+
+class ExtractListPageTest(unittest.TestCase):
+    def test_rows_and_pages(self):
+        for path in sorted(FIXTURES.glob("*.html")):
+            with self.subTest(page=path.stem):
+                html, expected = load_fixture(path.stem)
+                page = extract_list_page(html)
+                self.assertEqual(page.pages, expected["pages"])
+                self.assertEqual([{"url": row.url, "raw_info": row.raw_info, "img_url": row.img_url}
+                                  for row in page.rows], expected["rows"])
+
+    def test_same_rows_as_beautifulsoup(self):
+        for path in sorted(FIXTURES.glob("*.html")):
+            with self.subTest(page=path.stem):
+                html = path.read_bytes()
+                page = extract_list_page(html)
+                baseline = extract_list_page_bs4(html)
+                self.assertEqual(page.pages, baseline.pages)
+                self.assertEqual([(row.url, row.raw_info) for row in page.rows],
+                                 [(row.url, row.raw_info) for row in baseline.rows])
+
+    def test_images_stay_with_their_row(self):
+        # the third listing has no photo, positional pairing gave the following rows the wrong images
+        page = extract_list_page((FIXTURES / "sell_centre_page1.html").read_bytes())
+        baseline = extract_list_page_bs4((FIXTURES / "sell_centre_page1.html").read_bytes())
+        self.assertIsNone(page.rows[2].img_url)
+        self.assertTrue(page.rows[3].img_url.endswith("/65230011.th2.jpg"))
+        self.assertTrue(baseline.rows[3].img_url.endswith("/65230018.th2.jpg"))
+
+        # with a photo in every row both agree
+        html = (FIXTURES / "rent_teika_page2.html").read_bytes()
+        self.assertEqual([row.img_url for row in extract_list_page(html).rows],
+                         [row.img_url for row in extract_list_page_bs4(html).rows])
+
+    def test_banner_rows_are_skipped(self):
+        page = extract_list_page((FIXTURES / "sell_centre_page1.html").read_bytes())
+        self.assertEqual(len(page.rows), 5)
+        self.assertTrue(all(row.url.startswith("/msg/") for row in page.rows))
+
+
+class ParseListPageTest(unittest.TestCase):
+    def test_sell_page(self):
+        html = (FIXTURES / "sell_purvciems_single_page.html").read_bytes()
+        parsed = parse_list_page(html, "Purvciems", DealType.SELL, "Rīga", FLAT_SERIES)
+
+        self.assertEqual(parsed.pages, [])
+        # the exchange offer has no price
+        self.assertEqual(len(parsed.errors), 1)
+        self.assertIn("lbcef.html", parsed.errors[0])
+        flat, img_url = parsed.flats[0]
+        self.assertEqual((flat.street, flat.rooms, flat.area, flat.floor, flat.floors_total, flat.series, flat.price),
+                         ("Dzelzavas 7", 2, 47.0, 3, 9, "602.", 55000))
+        self.assertEqual(flat.url, "https://www.ss.lv/msg/lv/real-estate/flats/riga/purvciems/kabde.html")
+        self.assertEqual(img_url, "https://i.ss.lv/gallery/7/1302/310021/63301122.800.jpg")
+        self.assertIsNone(parsed.flats[1][1])
+
+    def test_rent_page(self):
+        html = (FIXTURES / "rent_teika_page2.html").read_bytes()
+        parsed = parse_list_page(html, "Teika", DealType.RENT, "Rīga", FLAT_SERIES)
+
+        self.assertEqual(parsed.errors, [])
+        self.assertEqual([flat.price for flat, _ in parsed.flats], [400, 350, 550, 750])
+        # floors written the other way around are swapped
+        self.assertEqual((parsed.flats[0][0].floor, parsed.flats[0][0].floors_total), (3, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()